@@ -0,0 +1,219 @@
+# Incrementally maintained application statistics
+#
+# /api/stats reads a handful of AppStats counter rows instead of counting and
+# averaging the measurement table on every poll. Counters are adjusted in
+# the same transaction as the rows they describe:
+#   - objects added or deleted through the ORM session (after_flush)
+#   - bulk `db.insert(Model)` executemany and `Query.delete()` statements
+#     (do_orm_execute), as used by the write-behind flusher and user deletion
+# Updates to existing rows are not tracked; no endpoint changes a
+# measurement's method or accuracy in place.
+#
+# `rebuild_stats` recomputes every counter with one aggregate query;
+# `flask --app main rebuild-stats` runs it.
+from datetime import datetime, timezone
+
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session
+
+from database_models import db, AppStats, Measurement, WeatherReading, UserSession
+from upsert import upsert
+
+MEASUREMENT_COUNT = 'measurements.count'
+ACCURACY_SUM = 'measurements.accuracy.sum'
+ACCURACY_COUNT = 'measurements.accuracy.count'
+LAST_MEASUREMENT = 'measurements.last_timestamp'
+METHOD_PREFIX = 'measurements.method.'
+WEATHER_COUNT = 'weather.count'
+SESSION_COUNT = 'sessions.count'
+
+_ROW_COUNTERS = {WeatherReading: WEATHER_COUNT, UserSession: SESSION_COUNT}
+_TRACKED = (Measurement, WeatherReading, UserSession)
+_FLOAT_KEYS = {ACCURACY_SUM}
+
+_stats = AppStats.__table__
+
+
+def _method_key(method):
+    return METHOD_PREFIX + (method if method is not None else 'unknown')
+
+
+def _timestamp_text(value):
+    """Naive-UTC ISO text; fixed width so counters compare as strings."""
+    if value is None:
+        return None
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.isoformat(timespec='microseconds')
+
+
+class _Delta:
+    """Counter adjustments accumulated for one flush or statement."""
+
+    def __init__(self):
+        self.counts = {}
+        self.last_timestamp = None
+        self.recompute_last = False
+
+    def add(self, key, amount):
+        if amount:
+            self.counts[key] = self.counts.get(key, 0) + amount
+
+    def measurements(self, sign, count, method, accuracy_sum, accuracy_count):
+        self.add(MEASUREMENT_COUNT, sign * count)
+        self.add(_method_key(method), sign * count)
+        self.add(ACCURACY_SUM, sign * (accuracy_sum or 0.0))
+        self.add(ACCURACY_COUNT, sign * accuracy_count)
+
+    def inserted_measurement(self, method, accuracy, timestamp):
+        self.measurements(1, 1, method, accuracy, int(accuracy is not None))
+        text = _timestamp_text(timestamp)
+        if text is not None and (self.last_timestamp is None or text > self.last_timestamp):
+            self.last_timestamp = text
+
+    def apply(self, connection):
+        for key, amount in self.counts.items():
+            cast_type = db.Float if key in _FLOAT_KEYS else db.Integer
+            upsert(connection, _stats, ('stat_key',), dict(stat_key=key, stat_value=str(amount)),
+                   dict(stat_value=db.cast(db.cast(_stats.c.stat_value, cast_type) + amount, db.Text)))
+        if self.recompute_last:
+            latest = connection.execute(select(func.max(Measurement.timestamp))).scalar()
+            _set(connection, LAST_MEASUREMENT, _timestamp_text(latest) or '')
+        elif self.last_timestamp is not None:
+            upsert(connection, _stats, ('stat_key',), dict(stat_key=LAST_MEASUREMENT, stat_value=self.last_timestamp),
+                   dict(stat_value=self.last_timestamp), where=_stats.c.stat_value < self.last_timestamp)
+
+
+def _set(connection, key, value):
+    upsert(connection, _stats, ('stat_key',), dict(stat_key=key, stat_value=value), dict(stat_value=value))
+
+
+def _after_flush(session, flush_context):
+    delta = _Delta()
+    for obj in session.new:
+        if isinstance(obj, Measurement):
+            delta.inserted_measurement(obj.calculation_method, obj.accuracy, obj.timestamp)
+        elif type(obj) in _ROW_COUNTERS:
+            delta.add(_ROW_COUNTERS[type(obj)], 1)
+    for obj in session.deleted:
+        if isinstance(obj, Measurement):
+            delta.measurements(-1, 1, obj.calculation_method, obj.accuracy, int(obj.accuracy is not None))
+            delta.recompute_last = True
+        elif type(obj) in _ROW_COUNTERS:
+            delta.add(_ROW_COUNTERS[type(obj)], -1)
+    if delta.counts or delta.recompute_last or delta.last_timestamp:
+        delta.apply(session.connection())
+
+
+def _on_orm_execute(orm_execute_state):
+    if not (orm_execute_state.is_insert or orm_execute_state.is_delete):
+        return None
+    mapper = orm_execute_state.bind_mapper
+    model = mapper.class_ if mapper is not None else None
+    if model not in _TRACKED:
+        return None
+
+    connection = orm_execute_state.session.connection()
+    delta = _Delta()
+    if orm_execute_state.is_insert:
+        rows = orm_execute_state.parameters
+        rows = rows if isinstance(rows, list) else [rows] if rows else []
+        if not rows:
+            # INSERT..SELECT or values() forms: counts are not known up front
+            return None
+        if model is Measurement:
+            default_method = Measurement.__table__.c.calculation_method.default.arg
+            for row in rows:
+                delta.inserted_measurement(row.get('calculation_method', default_method),
+                                           row.get('accuracy'), row.get('timestamp'))
+        else:
+            delta.add(_ROW_COUNTERS[model], len(rows))
+    else:
+        where = orm_execute_state.statement.whereclause
+        if model is Measurement:
+            query = select(Measurement.calculation_method, func.count(),
+                           func.sum(Measurement.accuracy), func.count(Measurement.accuracy))
+            if where is not None:
+                query = query.where(where)
+            for method, count, accuracy_sum, accuracy_count in connection.execute(
+                    query.group_by(Measurement.calculation_method)):
+                delta.measurements(-1, count, method, accuracy_sum, accuracy_count)
+            delta.recompute_last = bool(delta.counts)
+        else:
+            query = select(func.count()).select_from(model)
+            if where is not None:
+                query = query.where(where)
+            delta.add(_ROW_COUNTERS[model], -connection.execute(query).scalar())
+
+    result = orm_execute_state.invoke_statement()
+    delta.apply(connection)
+    return result
+
+
+def register_stats_listeners():
+    """Keeps AppStats counters in step with every ORM session."""
+    if not event.contains(Session, 'after_flush', _after_flush):
+        event.listen(Session, 'after_flush', _after_flush)
+        event.listen(Session, 'do_orm_execute', _on_orm_execute)
+
+
+def rebuild_stats():
+    """Recomputes every counter from the tables and stores them; returns read_stats()."""
+    per_method = db.session.execute(
+        select(Measurement.calculation_method, func.count(), func.sum(Measurement.accuracy),
+               func.count(Measurement.accuracy), func.max(Measurement.timestamp))
+        .group_by(Measurement.calculation_method)
+    ).all()
+    weather_count, session_count = db.session.execute(
+        select(select(func.count()).select_from(WeatherReading).scalar_subquery(),
+               select(func.count()).select_from(UserSession).scalar_subquery())
+    ).one()
+
+    values = {
+        MEASUREMENT_COUNT: sum(row[1] for row in per_method),
+        ACCURACY_SUM: float(sum(row[2] or 0.0 for row in per_method)),
+        ACCURACY_COUNT: sum(row[3] for row in per_method),
+        LAST_MEASUREMENT: max((_timestamp_text(row[4]) for row in per_method if row[4] is not None), default=''),
+        WEATHER_COUNT: weather_count,
+        SESSION_COUNT: session_count,
+    }
+    for method, count, _, _, _ in per_method:
+        values[_method_key(method)] = count
+
+    connection = db.session.connection()
+    connection.execute(_stats.update().where(_stats.c.stat_key.startswith(METHOD_PREFIX)).values(stat_value='0'))
+    for key, value in values.items():
+        _set(connection, key, str(value))
+    db.session.commit()
+    return read_stats()
+
+
+def stats_seeded():
+    return db.session.execute(
+        select(_stats.c.id).where(_stats.c.stat_key == MEASUREMENT_COUNT)).first() is not None
+
+
+def read_stats():
+    """Statistics in the /api/stats response shape, from the counter rows alone."""
+    counters = dict(db.session.execute(select(_stats.c.stat_key, _stats.c.stat_value)).all())
+
+    def number(key, cast=int):
+        try:
+            return cast(float(counters.get(key) or 0))
+        except ValueError:
+            return cast(0)
+
+    accuracy_count = number(ACCURACY_COUNT)
+    last = counters.get(LAST_MEASUREMENT)
+    breakdown = {'solar': 0, 'gps': 0}
+    for key in counters:
+        if key.startswith(METHOD_PREFIX):
+            breakdown[key[len(METHOD_PREFIX):]] = number(key)
+    return {
+        "totalMeasurements": number(MEASUREMENT_COUNT),
+        "totalWeatherReadings": number(WEATHER_COUNT),
+        "totalSessions": number(SESSION_COUNT),
+        "averageAccuracy": number(ACCURACY_SUM, float) / accuracy_count if accuracy_count else 0,
+        "lastMeasurement": datetime.fromisoformat(last).isoformat() if last else None,
+        "methodBreakdown": breakdown
+    }
@@ -0,0 +1,235 @@
+# Accuracy and latency benchmark for the navigation solver
+#
+# Generates synthetic sun sightings from known positions across seasons,
+# times of day and latitudes, including near-horizon and near-zenith edge
+# cases, runs them through every solver path and writes a JSON report.
+# Runs are seeded, so two reports from the same machine can be compared:
+#
+#     python benchmark_solver.py --output before.json
+#     python benchmark_solver.py --output after.json --compare before.json
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+import warnings
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import scipy
+
+import solver
+from ephemeris_cache import ephemeris_cache
+from solar_ephemeris import solar_ephemeris, sun_position
+
+warnings.filterwarnings("ignore")
+
+EARTH_RADIUS_KM = solver.EARTH_RADIUS_M / 1000.0
+
+# Zenith-distance ranges (degrees) for each case category
+CATEGORIES = {
+    'general': (5.0, 85.0),
+    'near_horizon': (85.0, 89.5),
+    'near_zenith': (0.05, 5.0),
+}
+
+# Equinoxes and solstices; cases are spread over the whole UTC day
+SEASON_DATES = [(3, 20), (6, 21), (9, 22), (12, 21)]
+
+MULTI_SIGHTINGS = 5
+MULTI_INTERVAL_MIN = 5
+
+
+def great_circle_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = np.radians([lat1, lon1, lat2, lon2])
+    cos_angle = np.sin(lat1) * np.sin(lat2) + np.cos(lat1) * np.cos(lat2) * np.cos(lon1 - lon2)
+    return float(EARTH_RADIUS_KM * np.arccos(np.clip(cos_angle, -1.0, 1.0)))
+
+
+def _destination(lat, lon, bearing, distance):
+    """Point `distance` degrees from (lat, lon) along `bearing`, all in degrees."""
+    lat, lon, bearing, distance = np.radians([lat, lon, bearing, distance])
+    lat2 = np.arcsin(np.sin(lat) * np.cos(distance) + np.cos(lat) * np.sin(distance) * np.cos(bearing))
+    lon2 = lon + np.arctan2(np.sin(bearing) * np.sin(distance) * np.cos(lat),
+                            np.cos(distance) - np.sin(lat) * np.sin(lat2))
+    return float(np.degrees(lat2)), float((np.degrees(lon2) + 180) % 360 - 180)
+
+
+def _sighting(lat, lon, when, rng, noise_alt, noise_az):
+    """Observed (apparent altitude, azimuth) for an observer at (lat, lon)."""
+    altitude, azimuth = sun_position(solar_ephemeris(when), lat, lon)
+    return {
+        'utc_time': when,
+        'altitude': float(altitude + solver.atmospheric_refraction(altitude) + rng.normal(0, noise_alt)),
+        'azimuth': float((azimuth + rng.normal(0, noise_az)) % 360),
+        'elevation': 0.0,
+    }
+
+
+def generate_cases(year, cases_per_bucket, seed, noise_alt=0.0, noise_az=0.0):
+    """Synthetic cases: observers placed a chosen zenith distance from the sun's subpoint."""
+    rng = np.random.default_rng(seed)
+    cases = []
+    for category, (z_min, z_max) in CATEGORIES.items():
+        for month, day in SEASON_DATES:
+            midnight = datetime(year, month, day, tzinfo=timezone.utc)
+            for _ in range(cases_per_bucket):
+                when = midnight + timedelta(seconds=float(rng.uniform(0, 86400)))
+                ephemeris = solar_ephemeris(when)
+                subpoint_lon = (-ephemeris.gha + 180) % 360 - 180
+                lat, lon = _destination(ephemeris.declination, subpoint_lon,
+                                        rng.uniform(0, 360), rng.uniform(z_min, z_max))
+                sightings = [
+                    _sighting(lat, lon, when + timedelta(minutes=MULTI_INTERVAL_MIN * k), rng, noise_alt, noise_az)
+                    for k in range(MULTI_SIGHTINGS)
+                ]
+                cases.append({'category': category, 'season': f"{month:02d}-{day:02d}",
+                              'lat': lat, 'lon': lon, 'sightings': sightings})
+    return cases
+
+
+def _solve_direct(case):
+    info = {}
+    lat, lon = solver.estimate_location_api(case['sightings'][0], diagnostics=info, method='direct')
+    return lat, lon, info
+
+
+def _solve_optimize(case):
+    info = {}
+    lat, lon = solver.estimate_location_api(case['sightings'][0], diagnostics=info, method='optimize')
+    return lat, lon, info
+
+
+def _solve_multi(case):
+    info = {}
+    lat, lon, _ = solver.estimate_location_multi(case['sightings'], diagnostics=info)
+    return lat, lon, info
+
+
+SOLVERS = {
+    'direct': _solve_direct,
+    'optimize': _solve_optimize,
+    'multi': _solve_multi,
+}
+
+
+def _percentiles(values, keys=('p50', 'p99')):
+    values = np.asarray(values, dtype=float)
+    summary = {key: float(np.percentile(values, float(key[1:]))) for key in keys}
+    summary['mean'] = float(np.mean(values))
+    summary['max'] = float(np.max(values))
+    return summary
+
+
+def run_benchmark(cases, solvers, repeats=3):
+    """Solves every case with every solver; latency is the best of `repeats` cold runs."""
+    results = {}
+    for name in solvers:
+        solve = SOLVERS[name]
+        by_category = {}
+        for case in cases:
+            timings = []
+            for _ in range(repeats):
+                ephemeris_cache.clear()
+                started = time.perf_counter()
+                lat, lon, info = solve(case)
+                timings.append((time.perf_counter() - started) * 1000.0)
+            ephemeris_cache.clear()
+            solve(case)
+            started = time.perf_counter()
+            solve(case)
+            warm = (time.perf_counter() - started) * 1000.0
+
+            bucket = by_category.setdefault(case['category'], {
+                'latency': [], 'warm_latency': [], 'evaluations': [], 'error': [], 'fallbacks': 0})
+            bucket['latency'].append(min(timings))
+            bucket['warm_latency'].append(warm)
+            bucket['evaluations'].append(info.get('function_evaluations') or 0)
+            bucket['error'].append(great_circle_km(lat, lon, case['lat'], case['lon']))
+            bucket['fallbacks'] += int(bool(info.get('fallback')))
+
+        results[name] = {
+            category: {
+                'cases': len(bucket['error']),
+                'latency_ms': _percentiles(bucket['latency']),
+                'warm_latency_ms': _percentiles(bucket['warm_latency']),
+                'function_evaluations': _percentiles(bucket['evaluations']),
+                'error_km': _percentiles(bucket['error'], keys=('p50', 'p90', 'p99')),
+                'within_1km': float(np.mean(np.asarray(bucket['error']) < 1.0)),
+                'fallbacks': bucket['fallbacks'],
+            }
+            for category, bucket in by_category.items()
+        }
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, baseline):
+    """Prints p50/p99 latency and error changes against a previous report."""
+    for name, categories in current['results'].items():
+        for category, stats in categories.items():
+            before = baseline.get('results', {}).get(name, {}).get(category)
+            if before is None:
+                continue
+            for metric in ('latency_ms', 'error_km'):
+                for key in ('p50', 'p99'):
+                    old, new = before[metric][key], stats[metric][key]
+                    change = (new - old) / old * 100 if old else 0.0
+                    print(f"{name:9s} {category:13s} {metric:11s} {key}: {old:10.4f} -> {new:10.4f} ({change:+6.1f}%)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark solver accuracy and latency.')
+    parser.add_argument('--year', type=int, default=2025)
+    parser.add_argument('--cases', type=int, default=25, help='Cases per category and season.')
+    parser.add_argument('--seed', type=int, default=20250101)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--noise-alt', type=float, default=0.0, help='Altitude noise, deg (1 sigma).')
+    parser.add_argument('--noise-az', type=float, default=0.0, help='Azimuth noise, deg (1 sigma).')
+    parser.add_argument('--solvers', default=','.join(SOLVERS), help='Comma-separated solver paths.')
+    parser.add_argument('--output', help='Write the JSON report here instead of stdout.')
+    parser.add_argument('--compare', help='Previous JSON report to compare against.')
+    args = parser.parse_args(argv)
+
+    solvers = [name.strip() for name in args.solvers.split(',') if name.strip()]
+    unknown = set(solvers) - set(SOLVERS)
+    if unknown:
+        parser.error(f"Unknown solvers: {', '.join(sorted(unknown))}")
+
+    cases = generate_cases(args.year, args.cases, args.seed, args.noise_alt, args.noise_az)
+    report = {
+        'meta': {
+            'created': datetime.now(timezone.utc).isoformat(),
+            'commit': _git_commit(),
+            'python': sys.version.split()[0],
+            'numpy': np.__version__,
+            'scipy': scipy.__version__,
+            'platform': platform.platform(),
+            'processor': platform.processor(),
+        },
+        'config': {key: getattr(args, key) for key in ('year', 'cases', 'seed', 'repeats', 'noise_alt', 'noise_az')},
+        'results': run_benchmark(cases, solvers, args.repeats),
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+# Content-addressed file store for sky images
+#
+# Image bytes are stored once under their SHA-256 digest
+# (<root>/ab/cd/abcd...), so the same photo uploaded twice takes one file.
+# WeatherReading.sky_images keeps only references of the form
+#     {"north": {"sha256": "...", "contentType": "image/jpeg", "size": 12345}}
+# and the bytes are served by /api/sky-images/<digest>. Stored files never
+# change, which makes the digest a strong ETag.
+import base64
+import binascii
+import hashlib
+import os
+import re
+import tempfile
+
+_DIGEST = re.compile(r'^[0-9a-f]{64}$')
+_DATA_URL = re.compile(r'^data:([\w.+-]+/[\w.+-]+)?(?:;[\w=.-]+)*;base64,', re.ASCII)
+
+# Leading bytes of the image formats the camera page produces
+_SIGNATURES = [
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'GIF8', 'image/gif'),
+]
+
+
+def is_digest(value):
+    return isinstance(value, str) and _DIGEST.match(value) is not None
+
+
+def sniff_content_type(head):
+    """Content type from a file's first bytes; octet-stream if unrecognised."""
+    for signature, content_type in _SIGNATURES:
+        if head.startswith(signature):
+            return content_type
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    return 'application/octet-stream'
+
+
+def decode_data_url(value):
+    """(bytes, content type) of a base64 data: URL, or None if `value` is not one."""
+    if not isinstance(value, str):
+        return None
+    match = _DATA_URL.match(value)
+    if match is None:
+        return None
+    try:
+        data = base64.b64decode(value[match.end():], validate=True)
+    except (binascii.Error, ValueError):
+        return None
+    return data, match.group(1) or sniff_content_type(data[:12])
+
+
+class BlobStore:
+    """Write-once files keyed by the SHA-256 of their content."""
+
+    def __init__(self, root):
+        # Absolute, so the path stays valid whatever directory send_file resolves against
+        self.root = os.path.abspath(root)
+        self.writes = 0
+        self.deduplicated = 0
+
+    def path(self, digest):
+        return os.path.join(self.root, digest[:2], digest[2:4], digest)
+
+    def exists(self, digest):
+        return is_digest(digest) and os.path.exists(self.path(digest))
+
+    def put(self, data):
+        """Stores `data` unless an identical blob exists; returns its digest."""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path(digest)
+        if os.path.exists(path):
+            self.deduplicated += 1
+            return digest
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self.writes += 1
+        return digest
+
+    def store_images(self, images):
+        """Replaces data: URL payloads in a {direction: image} dict with references.
+
+        Values that are already references, or not data URLs, are kept as
+        they are. Returns (references, number of images moved into the store).
+        """
+        references = {}
+        moved = 0
+        for direction, value in (images or {}).items():
+            decoded = decode_data_url(value)
+            if decoded is None:
+                references[direction] = value
+                continue
+            data, content_type = decoded
+            references[direction] = {
+                'sha256': self.put(data),
+                'contentType': content_type,
+                'size': len(data),
+            }
+            moved += 1
+        return references, moved
+
+    def metrics(self):
+        return {
+            'root': self.root,
+            'writes': self.writes,
+            'deduplicated': self.deduplicated,
+        }
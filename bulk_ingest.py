@@ -0,0 +1,189 @@
+# Bulk measurement ingest for offline sync
+#
+# A client that was offline replays its queued measurements in one request.
+# Records carrying an idempotency key are stored at most once: keys already
+# in the table, or repeated earlier in the same request, are reported as
+# duplicates with the id of the stored row, so a retried sync is harmless.
+# New rows go in with one executemany INSERT .. RETURNING in a single
+# transaction. Users and sessions the records refer to are looked up first;
+# records naming one that does not exist are reported invalid rather than
+# failing the whole batch on the foreign key.
+from datetime import datetime, timezone
+
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+
+from database_models import db, Measurement, User, UserSession
+from pagination import parse_time
+
+MAX_KEY_LENGTH = 64
+MAX_METHOD_LENGTH = 10
+_KEY_LOOKUP_CHUNK = 500
+
+CREATED = 'created'
+DUPLICATE = 'duplicate'
+INVALID = 'invalid'
+
+
+def _parse_timestamp(value):
+    """ISO 8601 text or epoch milliseconds (JavaScript Date.now()) as naive UTC."""
+    if value is None:
+        return datetime.now(timezone.utc).replace(tzinfo=None)
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return datetime.fromtimestamp(value / 1000.0, tz=timezone.utc).replace(tzinfo=None)
+    return parse_time(value)
+
+
+def _optional_float(item, key, default=None):
+    value = item.get(key, default)
+    return None if value is None else float(value)
+
+
+def parse_record(item, user_id=None):
+    """Column values for one bulk record; raises ValueError with a client-facing message."""
+    if not isinstance(item, dict):
+        raise ValueError("Record must be an object.")
+    key = item.get('idempotencyKey')
+    if key is not None and (not isinstance(key, str) or not 0 < len(key) <= MAX_KEY_LENGTH):
+        raise ValueError(f"'idempotencyKey' must be a string of 1-{MAX_KEY_LENGTH} characters.")
+    try:
+        pitch = float(item['pitch'])
+        heading = float(item['heading'])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("Invalid or missing 'pitch' or 'heading'.")
+    try:
+        timestamp = _parse_timestamp(item.get('timestamp'))
+    except (TypeError, ValueError, OverflowError, OSError):
+        raise ValueError("Invalid 'timestamp' (ISO 8601 or epoch milliseconds expected).")
+    try:
+        row = {
+            'timestamp': timestamp,
+            'latitude': _optional_float(item, 'latitude'),
+            'longitude': _optional_float(item, 'longitude'),
+            'pitch': pitch,
+            'heading': heading,
+            'elevation': _optional_float(item, 'elevation', 0.0),
+            'pressure': _optional_float(item, 'pressure', 1013.25),
+            'temperature': _optional_float(item, 'temperature', 15.0),
+            'accuracy': _optional_float(item, 'accuracy'),
+        }
+    except (TypeError, ValueError):
+        raise ValueError("Numeric fields must be numbers.")
+    session_id = item.get('sessionId', item.get('session_id'))
+    if session_id is not None and not isinstance(session_id, int):
+        raise ValueError("'sessionId' must be an integer.")
+    method = item.get('calculationMethod', 'solar')
+    if not isinstance(method, str) or not 0 < len(method) <= MAX_METHOD_LENGTH:
+        raise ValueError(f"'calculationMethod' must be a string of 1-{MAX_METHOD_LENGTH} characters.")
+    record_user_id = item.get('user_id', user_id)
+    if record_user_id is not None and not isinstance(record_user_id, str):
+        raise ValueError("'user_id' must be a string.")
+    row.update(
+        calculation_method=method,
+        notes=item.get('notes'),
+        user_id=record_user_id,
+        session_id=session_id,
+        idempotency_key=key,
+    )
+    return row
+
+
+def _existing_keys(keys):
+    found = {}
+    keys = list(keys)
+    for first in range(0, len(keys), _KEY_LOOKUP_CHUNK):
+        chunk = keys[first:first + _KEY_LOOKUP_CHUNK]
+        found.update(db.session.execute(
+            select(Measurement.idempotency_key, Measurement.id).where(Measurement.idempotency_key.in_(chunk))
+        ).all())
+    return found
+
+
+def _existing_ids(column, values):
+    found = set()
+    values = list(values)
+    for first in range(0, len(values), _KEY_LOOKUP_CHUNK):
+        found.update(db.session.scalars(select(column).where(column.in_(values[first:first + _KEY_LOOKUP_CHUNK]))))
+    return found
+
+
+def _check_references(records):
+    """Splits parsed records into those whose user and session exist, and {index: message} for the rest."""
+    sessions = _existing_ids(UserSession.id, {row['session_id'] for _, row in records if row['session_id'] is not None})
+    users = _existing_ids(User.id, {row['user_id'] for _, row in records if row['user_id'] is not None})
+    valid, errors = [], {}
+    for index, row in records:
+        if row['session_id'] is not None and row['session_id'] not in sessions:
+            errors[index] = "Unknown 'sessionId'."
+        elif row['user_id'] is not None and row['user_id'] not in users:
+            errors[index] = "Unknown 'user_id'."
+        else:
+            valid.append((index, row))
+    return valid, errors
+
+
+def _insert(records):
+    """Dedupes parsed records against the table and inserts the rest; returns (statuses, ids)."""
+    statuses = [None] * len(records)
+    ids = [None] * len(records)
+    existing = _existing_keys({row['idempotency_key'] for _, row in records if row['idempotency_key']})
+
+    pending, first_seen = [], {}
+    for position, (_, row) in enumerate(records):
+        key = row['idempotency_key']
+        if key is not None and key in existing:
+            statuses[position], ids[position] = DUPLICATE, existing[key]
+        elif key is not None and key in first_seen:
+            statuses[position] = DUPLICATE
+        else:
+            if key is not None:
+                first_seen[key] = position
+            pending.append(position)
+
+    if pending:
+        new_ids = db.session.scalars(
+            db.insert(Measurement).returning(Measurement.id, sort_by_parameter_order=True),
+            [records[position][1] for position in pending]
+        ).all()
+        for position, new_id in zip(pending, new_ids):
+            statuses[position], ids[position] = CREATED, new_id
+    db.session.commit()
+
+    # Repeats within the request point at the row their first occurrence created
+    for position, (_, row) in enumerate(records):
+        if statuses[position] == DUPLICATE and ids[position] is None:
+            ids[position] = ids[first_seen[row['idempotency_key']]]
+    return statuses, ids
+
+
+def ingest_measurements(items, user_id=None):
+    """Validates and stores bulk records.
+
+    Returns (statuses, ids, errors): statuses and ids parallel to `items`,
+    errors mapping the index of each invalid record to its message.
+    """
+    statuses = [INVALID] * len(items)
+    ids = [None] * len(items)
+    errors = {}
+    records = []
+    for index, item in enumerate(items):
+        try:
+            records.append((index, parse_record(item, user_id)))
+        except ValueError as e:
+            errors[index] = str(e)
+
+    if records:
+        records, reference_errors = _check_references(records)
+        errors.update(reference_errors)
+    if records:
+        try:
+            stored = _insert(records)
+        except IntegrityError as e:
+            db.session.rollback()
+            if 'idempotency_key' not in str(e.orig):
+                raise
+            # A concurrent retry of the same sync committed some keys first
+            stored = _insert(records)
+        for (index, _), status, row_id in zip(records, *stored):
+            statuses[index], ids[index] = status, row_id
+    return statuses, ids, errors
@@ -3,6 +3,8 @@ from datetime import datetime
 import json
 import uuid
 
+from geohash import encode as geohash_encode
+
 db = SQLAlchemy()
 
 # User model for authentication - Required for Replit Auth integration
@@ -48,8 +50,62 @@ class AuthSession(db.Model):
             'expire': self.expire.isoformat() if self.expire else None
         }
 
+# Field selection helpers for the models' to_dict(fields=...)
+def _isoformat(value):
+    return value.isoformat() if value else None
+
+def _json_object(text):
+    return json.loads(text) if text else {}
+
+def _serialize(obj, fields=None):
+    """to_dict body for models with an API_FIELDS map."""
+    data = {}
+    for key in fields or obj.API_FIELDS:
+        attribute, encode = obj.API_FIELDS[key]
+        value = getattr(obj, attribute)
+        data[key] = value if encode is None else encode(value)
+    return data
+
+def parse_fields(model, text):
+    """Validated API field names from a comma-separated `fields` argument, or None for all."""
+    if not text:
+        return None
+    fields = [name.strip() for name in text.split(',') if name.strip()]
+    unknown = [name for name in fields if name not in model.API_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}. Available: {', '.join(model.API_FIELDS)}.")
+    return list(dict.fromkeys(fields))
+
+def field_columns(model, fields, always=('id', 'timestamp')):
+    """Mapped columns to load for `fields`, plus the keyset columns; for load_only()."""
+    attributes = dict.fromkeys(always)
+    attributes.update(dict.fromkeys(model.API_FIELDS[name][0] for name in fields))
+    return [getattr(model, attribute) for attribute in attributes]
+
+def _geohash_default(context):
+    """Column default: geohash of the inserted row's latitude/longitude (also for executemany)."""
+    parameters = context.get_current_parameters()
+    return geohash_encode(parameters.get('latitude'), parameters.get('longitude'))
+
+def _sky_image_references(sky_images):
+    """Decoded sky_images with a download URL on each blob store reference."""
+    images = json.loads(sky_images) if sky_images else {}
+    for reference in images.values():
+        if isinstance(reference, dict) and 'sha256' in reference:
+            reference['url'] = f"/api/sky-images/{reference['sha256']}"
+    return images
+
 class Measurement(db.Model):
     __tablename__ = 'measurements'
+    # Keyset pagination indexes: newest-first (timestamp, id) under each filter
+    __table_args__ = (
+        db.Index('ix_measurements_timestamp_id', 'timestamp', 'id'),
+        db.Index('ix_measurements_user_timestamp_id', 'user_id', 'timestamp', 'id'),
+        db.Index('ix_measurements_session_timestamp_id', 'session_id', 'timestamp', 'id'),
+        db.Index('ix_measurements_method_timestamp_id', 'calculation_method', 'timestamp', 'id'),
+        db.Index('ix_measurements_idempotency_key', 'idempotency_key', unique=True),
+        db.Index('ix_measurements_geohash', 'geohash'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
@@ -65,48 +121,64 @@ class Measurement(db.Model):
     notes = db.Column(db.Text, nullable=True)
     user_id = db.Column(db.String(100), db.ForeignKey('users.id'), nullable=True)
     session_id = db.Column(db.Integer, db.ForeignKey('user_sessions.id'), nullable=True)
+    idempotency_key = db.Column(db.String(64), nullable=True)  # Client-supplied, dedupes bulk sync retries
+    geohash = db.Column(db.String(12), nullable=True, default=_geohash_default)  # Spatial index key (see geohash.py)
     
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'timestamp': self.timestamp.isoformat() if self.timestamp else None,
-            'latitude': self.latitude,
-            'longitude': self.longitude,
-            'pitch': self.pitch,
-            'heading': self.heading,
-            'elevation': self.elevation,
-            'pressure': self.pressure,
-            'temperature': self.temperature,
-            'calculationMethod': self.calculation_method,
-            'accuracy': self.accuracy,
-            'notes': self.notes,
-            'sessionId': self.session_id
-        }
+    # API field name -> (attribute, encoder); see to_dict(fields=...)
+    API_FIELDS = {
+        'id': ('id', None),
+        'timestamp': ('timestamp', _isoformat),
+        'latitude': ('latitude', None),
+        'longitude': ('longitude', None),
+        'pitch': ('pitch', None),
+        'heading': ('heading', None),
+        'elevation': ('elevation', None),
+        'pressure': ('pressure', None),
+        'temperature': ('temperature', None),
+        'calculationMethod': ('calculation_method', None),
+        'accuracy': ('accuracy', None),
+        'notes': ('notes', None),
+        'sessionId': ('session_id', None),
+        'geohash': ('geohash', None)
+    }
+    
+    def to_dict(self, fields=None):
+        """Serializes every API field, or only `fields` (a sequence of API_FIELDS keys)."""
+        return _serialize(self, fields)
 
 class WeatherReading(db.Model):
     __tablename__ = 'weather_readings'
+    __table_args__ = (
+        db.Index('ix_weather_readings_timestamp_id', 'timestamp', 'id'),
+        db.Index('ix_weather_readings_user_timestamp_id', 'user_id', 'timestamp', 'id'),
+        db.Index('ix_weather_readings_session_timestamp_id', 'session_id', 'timestamp', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     latitude = db.Column(db.Float, nullable=True)
     longitude = db.Column(db.Float, nullable=True)
-    sky_images = db.Column(db.Text, nullable=True)  # JSON string
+    sky_images = db.Column(db.Text, nullable=True)  # JSON string of blob store references (see blob_store.py)
     conditions = db.Column(db.Text, nullable=True)  # JSON string
     ai_analysis = db.Column(db.Text, nullable=True)  # JSON string
     user_id = db.Column(db.String(100), db.ForeignKey('users.id'), nullable=True)
     session_id = db.Column(db.Integer, db.ForeignKey('user_sessions.id'), nullable=True)
     
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'timestamp': self.timestamp.isoformat() if self.timestamp else None,
-            'latitude': self.latitude,
-            'longitude': self.longitude,
-            'skyImages': json.loads(self.sky_images) if self.sky_images else {},
-            'conditions': json.loads(self.conditions) if self.conditions else {},
-            'aiAnalysis': json.loads(self.ai_analysis) if self.ai_analysis else {},
-            'sessionId': self.session_id
-        }
+    # JSON columns are decoded only when their field is requested
+    API_FIELDS = {
+        'id': ('id', None),
+        'timestamp': ('timestamp', _isoformat),
+        'latitude': ('latitude', None),
+        'longitude': ('longitude', None),
+        'skyImages': ('sky_images', _sky_image_references),
+        'conditions': ('conditions', _json_object),
+        'aiAnalysis': ('ai_analysis', _json_object),
+        'sessionId': ('session_id', None)
+    }
+    
+    def to_dict(self, fields=None):
+        """Serializes every API field, or only `fields` (a sequence of API_FIELDS keys)."""
+        return _serialize(self, fields)
 
 class UserSession(db.Model):
     __tablename__ = 'user_sessions'
@@ -125,7 +197,12 @@ class UserSession(db.Model):
     measurements = db.relationship('Measurement', backref='session', lazy=True)
     weather_readings = db.relationship('WeatherReading', backref='session', lazy=True)
     
-    def to_dict(self):
+    def to_dict(self, measurement_count=None, weather_reading_count=None):
+        """Serializes the session; pass precomputed counts to skip the per-session COUNT queries."""
+        if measurement_count is None:
+            measurement_count = db.session.query(Measurement).filter_by(session_id=self.id).count()
+        if weather_reading_count is None:
+            weather_reading_count = db.session.query(WeatherReading).filter_by(session_id=self.id).count()
         return {
             'id': self.id,
             'sessionToken': self.session_token,
@@ -137,8 +214,8 @@ class UserSession(db.Model):
                 'accuracy': self.location_accuracy
             } if self.location_lat and self.location_lng else None,
             'deviceInfo': json.loads(self.device_info) if self.device_info else {},
-            'measurementCount': db.session.query(Measurement).filter_by(session_id=self.id).count(),
-            'weatherReadingCount': db.session.query(WeatherReading).filter_by(session_id=self.id).count()
+            'measurementCount': measurement_count,
+            'weatherReadingCount': weather_reading_count
         }
 
 class AppStats(db.Model):
@@ -154,4 +231,25 @@ class AppStats(db.Model):
             'key': self.stat_key,
             'value': self.stat_value,
             'updatedAt': self.updated_at.isoformat() if self.updated_at else None
-        }
\ No newline at end of file
+        }
+
+class MeasurementRollup(db.Model):
+    """Measurement totals per hour or day bucket, user and calculation method (see rollups.py)."""
+    __tablename__ = 'measurement_rollups'
+    __table_args__ = (
+        db.UniqueConstraint('granularity', 'bucket_start', 'user_key', 'calculation_method',
+                            name='uq_measurement_rollups_bucket'),
+        db.Index('ix_measurement_rollups_user_bucket', 'granularity', 'user_key', 'bucket_start'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    granularity = db.Column(db.String(4), nullable=False)  # 'hour' or 'day'
+    bucket_start = db.Column(db.DateTime, nullable=False)  # Naive UTC
+    user_key = db.Column(db.String(100), nullable=False, default='')  # user_id, '' for anonymous
+    calculation_method = db.Column(db.String(10), nullable=False)
+    measurement_count = db.Column(db.Integer, nullable=False, default=0)
+    accuracy_sum = db.Column(db.Float, nullable=False, default=0.0)
+    accuracy_count = db.Column(db.Integer, nullable=False, default=0)
+    latitude_sum = db.Column(db.Float, nullable=False, default=0.0)
+    longitude_sum = db.Column(db.Float, nullable=False, default=0.0)
+    position_count = db.Column(db.Integer, nullable=False, default=0)
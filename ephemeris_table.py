@@ -0,0 +1,95 @@
+# Precomputed, memory-mapped solar ephemeris table
+#
+# `flask --app main build-ephemeris-table` writes SolarEphemeris fields at a
+# fixed time step to a flat binary file. Workers map it read-only, so every
+# gunicorn worker and solver pool process shares one page-cache copy instead
+# of evaluating the SPA series itself.
+#
+# File layout (little-endian): a 64-byte header
+#     magic b'CNEPHEM1', start (float64, unix seconds), step (float64,
+#     seconds), rows (int64), fields (int64), zero padding
+# followed by a rows x fields float64 array in SolarEphemeris field order.
+#
+# Accuracy: values are linearly interpolated between rows. With the default
+# 600 s step the interpolation error is below 0.001 arc-seconds. In a step
+# that spans a month boundary, pysolar's monthly delta-T table steps by up
+# to ~0.1 s, which shows up as at most ~1.5 arc-seconds of GHA. Times
+# outside the table fall back to live computation.
+import os
+import struct
+from datetime import datetime, timezone
+
+import numpy as np
+
+from solar_ephemeris import SolarEphemeris, solar_ephemeris
+
+MAGIC = b'CNEPHEM1'
+HEADER = struct.Struct('<8sddqq')
+HEADER_SIZE = 64
+DEFAULT_STEP_S = 600
+
+_FIELDS = SolarEphemeris._fields
+_ANGULAR = np.array([name in ('right_ascension', 'gha') for name in _FIELDS])
+
+
+def build_table(path, start_year, end_year, step_s=DEFAULT_STEP_S, chunk_rows=20000):
+    """Writes a table covering 1 Jan start_year through 1 Jan end_year + 1 (UTC)."""
+    start = datetime(start_year, 1, 1, tzinfo=timezone.utc).timestamp()
+    end = datetime(end_year + 1, 1, 1, tzinfo=timezone.utc).timestamp()
+    rows = int((end - start) // step_s) + 1
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, start, float(step_s), rows, len(_FIELDS)).ljust(HEADER_SIZE, b'\0'))
+        for first in range(0, rows, chunk_rows):
+            count = min(chunk_rows, rows - first)
+            times = [datetime.fromtimestamp(start + (first + i) * step_s, tz=timezone.utc) for i in range(count)]
+            ephemeris = solar_ephemeris(times)
+            f.write(np.column_stack(ephemeris).astype('<f8').tobytes())
+    os.replace(tmp_path, path)
+    return rows
+
+
+class EphemerisTable:
+    """Read-only memory map of a table written by build_table."""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            magic, start, step, rows, fields = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC or fields != len(_FIELDS):
+            raise ValueError(f"{path} is not a CelestiNav ephemeris table")
+        self.path = path
+        self.start = start
+        self.step = step
+        self.rows = rows
+        self.data = np.memmap(path, dtype='<f8', mode='r', offset=HEADER_SIZE, shape=(rows, fields))
+
+    @property
+    def end(self):
+        return self.start + (self.rows - 1) * self.step
+
+    def covers(self, timestamp):
+        return self.start <= timestamp <= self.end
+
+    def lookup(self, timestamps):
+        """SolarEphemeris arrays for unix timestamps, all of which must be covered."""
+        position = (np.asarray(timestamps, dtype=float) - self.start) / self.step
+        index = np.clip(np.floor(position).astype(int), 0, self.rows - 2)
+        fraction = (position - index)[:, None]
+
+        before = self.data[index]
+        after = self.data[index + 1]
+        delta = after - before
+        delta[:, _ANGULAR] = (delta[:, _ANGULAR] + 180.0) % 360.0 - 180.0
+        values = before + fraction * delta
+        values[:, _ANGULAR] %= 360.0
+        return SolarEphemeris(*values.T)
+
+    def metrics(self):
+        return {
+            'path': self.path,
+            'start': datetime.fromtimestamp(self.start, tz=timezone.utc).isoformat(),
+            'end': datetime.fromtimestamp(self.end, tz=timezone.utc).isoformat(),
+            'stepSeconds': self.step,
+            'rows': self.rows,
+        }
@@ -0,0 +1,129 @@
+# Memoized single-sight fixes for /calculate_latlon
+#
+# Retries and bursts (the SOS page fires several identical requests) send
+# the same pitch/heading within the same second. Results are kept in a
+# bounded LRU keyed by the solver method and the sighting quantized to
+# configurable steps: pitch, heading, elevation, pressure, temperature and
+# the UTC time bucket. Concurrent misses on one key are coalesced: the first
+# request solves, the others wait for its result (single-flight). Keys
+# carry their time bucket, so stale entries are never hit again and age
+# out of the LRU.
+import threading
+from collections import OrderedDict
+
+
+def _quantize(value, step):
+    return round(value / step) if step > 0 else value
+
+
+class _Flight:
+    __slots__ = ('done', 'value', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class FixCache:
+    """LRU of solver results keyed by quantized sightings, with single-flight misses."""
+
+    def __init__(self, max_entries=4096, pitch_step_deg=0.01, heading_step_deg=0.01, elevation_step_m=1.0,
+                 pressure_step_hpa=0.1, temperature_step_c=0.1, time_step_s=1.0):
+        self.max_entries = max_entries
+        self.steps = {
+            'altitude': pitch_step_deg,
+            'azimuth': heading_step_deg,
+            'elevation': elevation_step_m,
+            'pressure': pressure_step_hpa,
+            'temperature': temperature_step_c,
+        }
+        self.time_step_s = time_step_s
+        self._entries = OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def key(self, obs_data, method):
+        time_bucket = obs_data['utc_time'].timestamp()
+        if self.time_step_s > 0:
+            time_bucket = int(time_bucket // self.time_step_s)
+        return (method, time_bucket) + tuple(
+            _quantize(obs_data[name], step) for name, step in self.steps.items())
+
+    def get_or_compute(self, key, compute, cacheable=None):
+        """(value, source) for `key`, source being 'hit', 'coalesced' or 'miss'.
+
+        On a miss compute() runs once, however many callers ask for the key
+        meanwhile; its result is stored unless cacheable(result) is false.
+        An exception from compute() reaches every waiting caller.
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key], 'hit'
+            flight = self._in_flight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._in_flight[key] = _Flight()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value, 'coalesced'
+
+        try:
+            flight.value = compute()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+                if flight.error is None and (cacheable is None or cacheable(flight.value)):
+                    self._entries[key] = flight.value
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+                        self.evictions += 1
+            flight.done.set()
+        return flight.value, 'miss'
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def metrics(self):
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                'enabled': self.enabled,
+                'entries': len(self._entries),
+                'maxEntries': self.max_entries,
+                'steps': {
+                    'pitchDeg': self.steps['altitude'],
+                    'headingDeg': self.steps['azimuth'],
+                    'elevationM': self.steps['elevation'],
+                    'pressureHpa': self.steps['pressure'],
+                    'temperatureC': self.steps['temperature'],
+                    'utcSeconds': self.time_step_s,
+                },
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'evictions': self.evictions,
+                'inFlight': len(self._in_flight),
+                # Requests answered without a solve of their own
+                'hitRatio': (self.hits + self.coalesced) / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,142 @@
+# Streaming fixes over server-sent events
+#
+# A client opens one long-lived event stream (GET /calculate_latlon/stream)
+# and pushes sensor samples to it with small POSTs; fixes come back as
+# `fix` events on the open stream. Each stream holds a single pending
+# sample slot: a new sample replaces one that has not been solved yet, so
+# when the client sends faster than the solver keeps up, only the latest
+# sample is solved and the rest are counted as coalesced. The solve loop
+# runs in the request serving the event stream, so an idle stream costs a
+# waiting thread and no CPU.
+#
+# Streams live in the memory of the process that opened them. A sample POST
+# reaching another process finds no stream and gets 410 Gone, and the client
+# then opens a new stream. Serve the app from one process with threads
+# (`python3 main.py`, or gunicorn with `--workers 1 --threads N`), or route
+# each client to one worker with sticky sessions at the load balancer;
+# without either, a multi-worker deployment keeps dropping streams.
+import threading
+import time
+import uuid
+
+from json_provider import dumps
+
+
+def sse_event(event, data, event_id=None):
+    """One server-sent event frame with a JSON payload."""
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {dumps(data)}")
+    return "\n".join(lines) + "\n\n"
+
+
+def sse_comment(text):
+    return f": {text}\n\n"
+
+
+class FixStream:
+    """Latest-sample slot shared by the sample POSTs and the event stream."""
+
+    def __init__(self, stream_id, options):
+        self.stream_id = stream_id
+        self.options = options
+        self._condition = threading.Condition()
+        self._pending = None
+        self._closed = False
+        self.received = 0
+        self.coalesced = 0
+        self.solved = 0
+        self.last_activity = time.monotonic()
+
+    def push(self, sample):
+        """Makes `sample` the next one to solve.
+
+        Returns (sequence number, whether it replaced an unsolved sample).
+        """
+        with self._condition:
+            replaced = self._pending is not None
+            if replaced:
+                self.coalesced += 1
+            self.received += 1
+            self._pending = (self.received, sample)
+            self.last_activity = time.monotonic()
+            self._condition.notify()
+            return self.received, replaced
+
+    def take(self, timeout):
+        """Waits up to `timeout` seconds for a sample; returns (sequence, sample), or None."""
+        with self._condition:
+            if self._pending is None and not self._closed:
+                self._condition.wait(timeout)
+            sample, self._pending = self._pending, None
+            return sample
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+
+    @property
+    def closed(self):
+        return self._closed
+
+
+class StreamHub:
+    """Open fix streams by id, bounded in number."""
+
+    def __init__(self, max_streams=256):
+        self.max_streams = max_streams
+        self._streams = {}
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.rejected = 0
+        self.received = 0
+        self.coalesced = 0
+        self.solved = 0
+        self.persisted = 0
+
+    def open(self, options):
+        """Registers a new stream; returns it, or None when at capacity."""
+        with self._lock:
+            if len(self._streams) >= self.max_streams:
+                self.rejected += 1
+                return None
+            stream = FixStream(uuid.uuid4().hex, options)
+            self._streams[stream.stream_id] = stream
+            self.opened += 1
+            return stream
+
+    def get(self, stream_id):
+        with self._lock:
+            return self._streams.get(stream_id)
+
+    def release(self, stream):
+        """Closes a stream and folds its counters into the hub totals."""
+        stream.close()
+        with self._lock:
+            if self._streams.pop(stream.stream_id, None) is not None:
+                self.received += stream.received
+                self.coalesced += stream.coalesced
+                self.solved += stream.solved
+
+    def record_persisted(self):
+        with self._lock:
+            self.persisted += 1
+
+    def metrics(self):
+        with self._lock:
+            streams = list(self._streams.values())
+            received = self.received + sum(s.received for s in streams)
+            coalesced = self.coalesced + sum(s.coalesced for s in streams)
+            return {
+                'openStreams': len(streams),
+                'maxStreams': self.max_streams,
+                'opened': self.opened,
+                'rejected': self.rejected,
+                'samplesReceived': received,
+                'samplesCoalesced': coalesced,
+                'fixesSolved': self.solved + sum(s.solved for s in streams),
+                'fixesPersisted': self.persisted,
+                'coalescedRatio': coalesced / received if received else 0.0,
+            }
@@ -0,0 +1,167 @@
+# Geohash cells for spatial lookups over measurements
+#
+# A geohash interleaves longitude and latitude bits and writes them in
+# base 32, so every prefix names a rectangular cell and all points in a cell
+# share that prefix. With an ordinary B-tree index on the geohash column, a
+# cell becomes a range scan: geohash >= prefix AND geohash < next(prefix).
+# Bounding boxes are covered by a handful of cells, and nearest-neighbour
+# search widens a 3x3 block of cells until the k-th hit is provably closest.
+import math
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+_DECODE = {char: index for index, char in enumerate(BASE32)}
+
+PRECISION = 12
+EARTH_RADIUS_KM = 6371.0088
+
+
+def encode(lat, lon, precision=PRECISION):
+    """Geohash of a point; None if either coordinate is missing."""
+    if lat is None or lon is None:
+        return None
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+    while len(chars) < precision:
+        coordinate, bounds = (lon, lon_range) if even else (lat, lat_range)
+        mid = (bounds[0] + bounds[1]) / 2
+        if coordinate >= mid:
+            value = (value << 1) | 1
+            bounds[0] = mid
+        else:
+            value <<= 1
+            bounds[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits = value = 0
+    return ''.join(chars)
+
+
+def bounds(cell):
+    """(south, west, north, east) of a geohash cell."""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    even = True
+    for char in cell:
+        value = _DECODE[char]
+        for shift in range(4, -1, -1):
+            target = lon_range if even else lat_range
+            mid = (target[0] + target[1]) / 2
+            if (value >> shift) & 1:
+                target[0] = mid
+            else:
+                target[1] = mid
+            even = not even
+    return lat_range[0], lon_range[0], lat_range[1], lon_range[1]
+
+
+def cell_size(precision):
+    """(height, width) in degrees of cells at `precision`."""
+    lon_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def next_prefix(prefix):
+    """Smallest string greater than every geohash starting with `prefix`, or None."""
+    chars = list(prefix)
+    while chars:
+        index = _DECODE[chars[-1]]
+        if index < len(BASE32) - 1:
+            chars[-1] = BASE32[index + 1]
+            return ''.join(chars)
+        chars.pop()
+    return None
+
+
+def cell_ranges(cells):
+    """Merged [start, stop) string ranges covering the given cells (stop may be None)."""
+    ranges = []
+    for cell in sorted(set(cells)):
+        stop = next_prefix(cell)
+        if ranges and ranges[-1][1] == cell:
+            ranges[-1] = (ranges[-1][0], stop)
+        else:
+            ranges.append((cell, stop))
+    return ranges
+
+
+def _box_cells(south, west, north, east, precision):
+    height, width = cell_size(precision)
+    cells = set()
+    lat = south
+    while True:
+        lon = west
+        while True:
+            cells.add(encode(min(lat, 90.0), min(lon, 180.0 - 1e-12), precision))
+            if lon >= east:
+                break
+            lon = min(lon + width, east)
+        if lat >= north:
+            break
+        lat = min(lat + height, north)
+    return cells
+
+
+def covering_cells(south, west, north, east, max_cells=16):
+    """Geohash cells covering a bounding box, as fine as fits in `max_cells`.
+
+    A box with west > east crosses the antimeridian.
+    """
+    boxes = [(south, west, north, east)] if west <= east else [(south, west, north, 180.0), (south, -180.0, north, east)]
+    cells = {''}
+    for precision in range(1, PRECISION + 1):
+        height, width = cell_size(precision)
+        estimate = sum((math.floor((n - s) / height) + 2) * (math.floor((e - w) / width) + 2) for s, w, n, e in boxes)
+        if estimate > max_cells * 2:
+            break
+        candidate = set()
+        for box in boxes:
+            candidate |= _box_cells(*box, precision)
+        if len(candidate) > max_cells:
+            break
+        cells = candidate
+    return cells
+
+
+def neighbourhood(lat, lon, precision):
+    """The cell containing a point and its (up to) eight neighbours."""
+    height, width = cell_size(precision)
+    s, w, n, e = bounds(encode(lat, lon, precision))
+    center_lat, center_lon = (s + n) / 2, (w + e) / 2
+    cells = set()
+    for d_lat in (-1, 0, 1):
+        neighbour_lat = center_lat + d_lat * height
+        if not -90.0 < neighbour_lat < 90.0:
+            continue
+        for d_lon in (-1, 0, 1):
+            neighbour_lon = (center_lon + d_lon * width + 180.0) % 360.0 - 180.0
+            cells.add(encode(neighbour_lat, neighbour_lon, precision))
+    return cells
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def covered_radius_km(lat, lon, precision):
+    """Radius around a point guaranteed to lie inside its 3x3 cell neighbourhood."""
+    height, width = cell_size(precision)
+    s, w, n, e = bounds(encode(lat, lon, precision))
+    # Nearest edge of the 3x3 block, north-south and east-west
+    d_lat = min(lat - (s - height), (n + height) - lat)
+    d_lon = min(lon - (w - width), (e + width) - lon)
+    if s - height <= -90.0 or n + height >= 90.0:
+        d_lat = min(d_lat, 90.0 - abs(lat)) if abs(lat) < 90.0 else 0.0
+    lat_km = math.radians(d_lat) * EARTH_RADIUS_KM
+    # A degree of longitude shrinks towards the pole side of the block
+    widest_lat = min(89.999, max(abs(s - height), abs(n + height)))
+    lon_km = math.radians(d_lon) * EARTH_RADIUS_KM * math.cos(math.radians(widest_lat))
+    return max(0.0, min(lat_km, lon_km))
@@ -1,17 +1,47 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, request, jsonify, send_file, send_from_directory, stream_with_context
+import click
 from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
+from flask_migrate import Migrate, upgrade as migrate_upgrade
 import numpy as np
 from datetime import datetime, timezone
-from pysolar.solar import get_altitude, get_azimuth
-from scipy.optimize import minimize
-import warnings
 import os
 import json
 import uuid
+import atexit
+import time
+
+from solar_ephemeris import SolarEphemeris
+from solver import (
+    SOLVER_METHODS, SIGHT_SIGMA_ALTITUDE_DEG, SIGHT_SIGMA_AZIMUTH_DEG,
+    degraded_fix, estimate_location_multi, error_ellipse, solve_sight, solve_tracked
+)
+from solver_pool import SolverPool
+from ephemeris_cache import ephemeris_cache
+from ephemeris_table import EphemerisTable, build_table, DEFAULT_STEP_S
+from write_behind import WriteBehindQueue
+from tracking import TrackStore
+from fix_stream import StreamHub, sse_comment, sse_event
+from fix_cache import FixCache
+from app_stats import read_stats, rebuild_stats, register_stats_listeners, stats_seeded
+from pagination import apply_filters, keyset_page, page_size, parse_time
+from measurement_export import (
+    EXPORT_FORMATS, DEFAULT_CHUNK_ROWS, DEFAULT_ROW_GROUP_ROWS, export_query, stream_chunks, ndjson_lines, csv_lines,
+    columnar_query, write_npz_export, npz_export_chunks, npz_watermark
+)
+from bulk_ingest import CREATED, DUPLICATE, ingest_measurements
+from blob_store import BlobStore, is_digest, sniff_content_type
+from json_provider import FastJSONProvider
+from response_cache import ResponseCache, register_version_listeners
+from rollups import (
+    GRANULARITIES, GROUP_BY, bucket_start, bucket_step, read_rollup, rebuild_rollups,
+    register_rollup_listeners, rollups_seeded
+)
+from spatial import backfill_geohashes, bbox_query, cell_aggregates, nearest
+import geohash
+from sqlalchemy.orm import load_only
 
 # Import database models
-from database_models import db, User, AuthSession, Measurement, WeatherReading, UserSession, AppStats
+from database_models import db, User, AuthSession, Measurement, WeatherReading, UserSession, AppStats, field_columns, parse_fields
 # Import authentication - DISABLED for direct access
 # from auth import replit_auth, require_auth
 
@@ -20,22 +50,167 @@ from database_models import db, User, AuthSession, Measurement, WeatherReading,
 # ====================================================================
 # Flask instance must be named 'app'
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 
 # Database configuration - Use PostgreSQL from environment
 app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///celestinav.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'celestinav-secret-key-' + str(uuid.uuid4()))
 
+# Upper bound on sightings accepted by /calculate_latlon/batch
+app.config['BATCH_MAX_OBSERVATIONS'] = int(os.environ.get('BATCH_MAX_OBSERVATIONS', 1000))
+
+# Solver process pool: 0 workers solves inline in the request thread.
+# Requests that miss the deadline get the rough initial guess, flagged degraded.
+app.config['SOLVER_POOL_WORKERS'] = int(os.environ.get('SOLVER_POOL_WORKERS', 0))
+app.config['SOLVER_DEADLINE_MS'] = int(os.environ.get('SOLVER_DEADLINE_MS', 2000))
+app.config['SOLVER_POOL_START_METHOD'] = os.environ.get('SOLVER_POOL_START_METHOD', 'fork')
+
+# Solar ephemeris cache: knot spacing, LRU bound and optional TTL
+app.config['EPHEMERIS_CACHE_RESOLUTION_S'] = float(os.environ.get('EPHEMERIS_CACHE_RESOLUTION_S', 60))
+app.config['EPHEMERIS_CACHE_MAX_ENTRIES'] = int(os.environ.get('EPHEMERIS_CACHE_MAX_ENTRIES', 4096))
+app.config['EPHEMERIS_CACHE_TTL_S'] = float(os.environ['EPHEMERIS_CACHE_TTL_S']) if os.environ.get('EPHEMERIS_CACHE_TTL_S') else None
+
+# Precomputed ephemeris table shared read-only by all workers (see build-ephemeris-table)
+app.config['EPHEMERIS_TABLE_PATH'] = os.environ.get('EPHEMERIS_TABLE_PATH', 'ephemeris_table.bin')
+
+# Write-behind persistence for /calculate_latlon: fixes are queued and
+# bulk-inserted in the background; overflow spills to an append-only file
+app.config['MEASUREMENT_WRITE_BEHIND'] = os.environ.get('MEASUREMENT_WRITE_BEHIND', '').lower() in ('1', 'true', 'yes')
+app.config['MEASUREMENT_QUEUE_CAPACITY'] = int(os.environ.get('MEASUREMENT_QUEUE_CAPACITY', 10000))
+app.config['MEASUREMENT_FLUSH_BATCH'] = int(os.environ.get('MEASUREMENT_FLUSH_BATCH', 500))
+app.config['MEASUREMENT_FLUSH_INTERVAL_MS'] = int(os.environ.get('MEASUREMENT_FLUSH_INTERVAL_MS', 250))
+app.config['MEASUREMENT_SPILL_PATH'] = os.environ.get('MEASUREMENT_SPILL_PATH', 'measurement_spill.ndjson')
+
+# Tracking mode (/calculate_latlon?track=1): sessions whose state is kept,
+# how long an idle session's state survives, and the device speed (1-sigma)
+# that widens the prediction between sightings
+app.config['TRACK_MAX_SESSIONS'] = int(os.environ.get('TRACK_MAX_SESSIONS', 1024))
+app.config['TRACK_IDLE_TIMEOUT_S'] = float(os.environ.get('TRACK_IDLE_TIMEOUT_S', 900))
+app.config['TRACK_SPEED_MPS'] = float(os.environ.get('TRACK_SPEED_MPS', 5.0))
+
+# Fix streams (/calculate_latlon/stream): open streams allowed, fixes between
+# stored measurements (0 stores none), keepalive interval and idle timeout
+app.config['STREAM_MAX_STREAMS'] = int(os.environ.get('STREAM_MAX_STREAMS', 256))
+app.config['STREAM_PERSIST_EVERY'] = int(os.environ.get('STREAM_PERSIST_EVERY', 10))
+app.config['STREAM_HEARTBEAT_S'] = float(os.environ.get('STREAM_HEARTBEAT_S', 15))
+app.config['STREAM_IDLE_TIMEOUT_S'] = float(os.environ.get('STREAM_IDLE_TIMEOUT_S', 300))
+
+# Memoized /calculate_latlon fixes: LRU size (0 disables) and the steps
+# sightings are quantized to; identical keys within a step share one solve
+app.config['FIX_CACHE_MAX_ENTRIES'] = int(os.environ.get('FIX_CACHE_MAX_ENTRIES', 4096))
+app.config['FIX_CACHE_PITCH_STEP_DEG'] = float(os.environ.get('FIX_CACHE_PITCH_STEP_DEG', 0.01))
+app.config['FIX_CACHE_HEADING_STEP_DEG'] = float(os.environ.get('FIX_CACHE_HEADING_STEP_DEG', 0.01))
+app.config['FIX_CACHE_ELEVATION_STEP_M'] = float(os.environ.get('FIX_CACHE_ELEVATION_STEP_M', 1.0))
+app.config['FIX_CACHE_PRESSURE_STEP_HPA'] = float(os.environ.get('FIX_CACHE_PRESSURE_STEP_HPA', 0.1))
+app.config['FIX_CACHE_TEMPERATURE_STEP_C'] = float(os.environ.get('FIX_CACHE_TEMPERATURE_STEP_C', 0.1))
+app.config['FIX_CACHE_TIME_STEP_S'] = float(os.environ.get('FIX_CACHE_TIME_STEP_S', 1.0))
+
+# Largest page the listing endpoints return
+app.config['API_MAX_PAGE_SIZE'] = int(os.environ.get('API_MAX_PAGE_SIZE', 500))
+
+# Rows fetched from the server-side cursor per chunk of a streaming export
+app.config['EXPORT_CHUNK_ROWS'] = int(os.environ.get('EXPORT_CHUNK_ROWS', DEFAULT_CHUNK_ROWS))
+
+# Rows per row group in columnar (.npz) exports
+app.config['EXPORT_ROW_GROUP_ROWS'] = int(os.environ.get('EXPORT_ROW_GROUP_ROWS', DEFAULT_ROW_GROUP_ROWS))
+
+# Response cache for polled read endpoints: memory bound (0 disables) and
+# the longest an entry is trusted without a local write to invalidate it
+app.config['RESPONSE_CACHE_MAX_BYTES'] = int(os.environ.get('RESPONSE_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+app.config['RESPONSE_CACHE_TTL_S'] = float(os.environ.get('RESPONSE_CACHE_TTL_S', 30))
+
+# Content-addressed store for sky image bytes; weather rows keep references only
+app.config['SKY_IMAGE_STORE_PATH'] = os.environ.get('SKY_IMAGE_STORE_PATH', 'sky_images')
+
+# Apply pending Alembic migrations at startup. Off by default: every worker
+# would run the same upgrade concurrently. Deploys run `flask --app main db
+# upgrade` once before starting the server; enable only for a single process.
+app.config['AUTO_MIGRATE'] = os.environ.get('AUTO_MIGRATE', '').lower() in ('1', 'true', 'yes')
+
+# Upper bound on records accepted by /api/measurements/bulk
+app.config['BULK_MAX_RECORDS'] = int(os.environ.get('BULK_MAX_RECORDS', 5000))
+
+# Longest time range /api/measurements/rollup serves, in buckets
+app.config['ROLLUP_MAX_BUCKETS'] = int(os.environ.get('ROLLUP_MAX_BUCKETS', 2000))
+
 # Initialize database
 db.init_app(app)
-migrate = Migrate(app, db)
+migrate = Migrate(app, db, directory=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations'))
 
 # Initialize authentication - DISABLED for direct access
 # replit_auth.init_app(app)
 
-# Create tables
+response_cache = ResponseCache(
+    max_bytes=app.config['RESPONSE_CACHE_MAX_BYTES'],
+    ttl_s=app.config['RESPONSE_CACHE_TTL_S']
+)
+register_version_listeners(response_cache)
+
+# Create tables; AppStats counters and measurement rollups are seeded once,
+# then kept up to date on every write
+register_stats_listeners()
+register_rollup_listeners()
 with app.app_context():
     db.create_all()
+    if app.config['AUTO_MIGRATE']:
+        migrate_upgrade()
+    if not stats_seeded():
+        rebuild_stats()
+    if not rollups_seeded():
+        rebuild_rollups()
+
+ephemeris_cache.configure(
+    resolution_s=app.config['EPHEMERIS_CACHE_RESOLUTION_S'],
+    max_entries=app.config['EPHEMERIS_CACHE_MAX_ENTRIES'],
+    ttl_s=app.config['EPHEMERIS_CACHE_TTL_S']
+)
+if os.path.exists(app.config['EPHEMERIS_TABLE_PATH']):
+    try:
+        ephemeris_cache.attach_table(EphemerisTable(app.config['EPHEMERIS_TABLE_PATH']))
+    except (OSError, ValueError) as e:
+        print(f"Ephemeris table not loaded, using live computation: {e}")
+
+# Start solver workers before serving so they fork from a quiet process
+solver_pool = SolverPool(
+    workers=app.config['SOLVER_POOL_WORKERS'],
+    deadline_ms=app.config['SOLVER_DEADLINE_MS'],
+    start_method=app.config['SOLVER_POOL_START_METHOD']
+)
+solver_pool.start()
+atexit.register(solver_pool.shutdown)
+
+sky_image_store = BlobStore(app.config['SKY_IMAGE_STORE_PATH'])
+
+track_store = TrackStore(
+    max_sessions=app.config['TRACK_MAX_SESSIONS'],
+    idle_timeout_s=app.config['TRACK_IDLE_TIMEOUT_S'],
+    speed_mps=app.config['TRACK_SPEED_MPS']
+)
+
+stream_hub = StreamHub(max_streams=app.config['STREAM_MAX_STREAMS'])
+
+fix_cache = FixCache(
+    max_entries=app.config['FIX_CACHE_MAX_ENTRIES'],
+    pitch_step_deg=app.config['FIX_CACHE_PITCH_STEP_DEG'],
+    heading_step_deg=app.config['FIX_CACHE_HEADING_STEP_DEG'],
+    elevation_step_m=app.config['FIX_CACHE_ELEVATION_STEP_M'],
+    pressure_step_hpa=app.config['FIX_CACHE_PRESSURE_STEP_HPA'],
+    temperature_step_c=app.config['FIX_CACHE_TEMPERATURE_STEP_C'],
+    time_step_s=app.config['FIX_CACHE_TIME_STEP_S']
+)
+
+# The flusher thread starts with the first queued row, after any worker fork
+measurement_queue = WriteBehindQueue(
+    app, Measurement,
+    enabled=app.config['MEASUREMENT_WRITE_BEHIND'],
+    capacity=app.config['MEASUREMENT_QUEUE_CAPACITY'],
+    batch_size=app.config['MEASUREMENT_FLUSH_BATCH'],
+    flush_interval_ms=app.config['MEASUREMENT_FLUSH_INTERVAL_MS'],
+    spill_path=app.config['MEASUREMENT_SPILL_PATH'],
+    key_column='idempotency_key'
+)
+atexit.register(measurement_queue.shutdown)
 
 # Serve static HTML files from the root directory
 @app.route('/')
@@ -49,96 +224,23 @@ def health_check():
     """Health check endpoint for API monitoring."""
     return jsonify({"status": "healthy", "timestamp": datetime.now(timezone.utc).isoformat()})
 
-# ====================================================================
-# --- SOLAR CALCULATION LOGIC ---
-# ====================================================================
-
-# Ignore RuntimeWarning from numpy/scipy when invalid values occur near boundaries
-warnings.filterwarnings("ignore", category=RuntimeWarning)
-
-def atmospheric_refraction(true_altitude_deg, pressure=1013.25, temperature=15):
-    """Calculates atmospheric refraction correction."""
-    if true_altitude_deg < -5:
-        return 0.0
-    
-    R = 1.0 / (np.tan(np.radians(true_altitude_deg + 7.31 / (true_altitude_deg + 4.4))) + 0.0013519)
-    R *= (pressure / 1010.0) * (283.0 / (273.0 + temperature))
-    return R / 60.0
-
-def calculate_error(coords, obs_data):
-    """The objective function to minimize (weighted squared error)."""
-    lat, lon = coords
-    try:
-        true_alt = get_altitude(lat, lon, obs_data['utc_time'], obs_data.get('elevation', 0.0))
-        true_az = get_azimuth(lat, lon, obs_data['utc_time'])
-
-        refr_corr = atmospheric_refraction(true_alt)
-        apparent_alt = true_alt + refr_corr
-
-        alt_error = abs(apparent_alt - obs_data['altitude'])
-        diff = true_az - obs_data['azimuth']
-        az_error = min(abs(diff), 360 - abs(diff))
-
-        # Altitude error is weighted higher for stability
-        return alt_error**2 * 10 + az_error**2
-        
-    except Exception:
-        return float('inf')
-
-def estimate_location_api(obs_data):
-    """Estimates location via iterative optimization with a robust initial guess."""
-    
-    # --- 1. Robust Initial Guess ---
-    dt_utc = obs_data['utc_time']
-    alt_obs = obs_data['altitude']
-    az_obs = obs_data['azimuth']
-    
-    # 1.1. Calculate Solar Declination (Delta)
-    day_of_year = dt_utc.timetuple().tm_yday
-    declination = 23.45 * np.sin(np.radians(360 / 365 * (day_of_year - 81))) 
-
-    # 1.2. Rough Latitude Guess
-    rough_lat = np.clip(90 - alt_obs + declination, -89.9, 89.9)
-
-    # 1.3. Rough Longitude Guess (Hour Angle approximation)
-    sin_alt = np.sin(np.radians(alt_obs))
-    sin_lat_sin_dec = np.sin(np.radians(rough_lat)) * np.sin(np.radians(declination))
-    cos_lat_cos_dec = np.cos(np.radians(rough_lat)) * np.cos(np.radians(declination))
-    
-    H_deg = 0.0
-    if cos_lat_cos_dec != 0:
-        H_arg = (sin_alt - sin_lat_sin_dec) / cos_lat_cos_dec
-        H_arg = np.clip(H_arg, -1.0, 1.0)
-        
-        H_rad = np.arccos(H_arg)
-        H_deg = np.degrees(H_rad)
-        
-    if az_obs < 180:
-        H_deg = -H_deg
-
-    utc_hours = dt_utc.hour + dt_utc.minute / 60.0 + dt_utc.second / 3600.0
-    rough_lon = (utc_hours - 12.0) * 15 - H_deg
-    rough_lon = (rough_lon + 180) % 360 - 180
-    
-    initial_guess = (rough_lat, rough_lon)
-
-    # --- 2. Run Minimization ---
-    bounds = [(-90, 90), (-180, 180)]
-
-    result = minimize(
-        calculate_error,
-        initial_guess,
-        args=(obs_data,),
-        method='L-BFGS-B',
-        bounds=bounds,
-        options={'maxiter': 1000, 'ftol': 1e-6}
-    )
-
-    if result.success:
-        return result.x[0], result.x[1]
-    else:
-        print(f"Optimization failed. Returning initial guess: {initial_guess}")
-        return initial_guess 
+@app.route('/api/metrics')
+def get_metrics():
+    """Runtime metrics for the solver and its supporting caches and queues."""
+    return jsonify({
+        "status": "success",
+        "data": {
+            "solverPool": solver_pool.metrics(),
+            # Per process: pool workers keep their own caches
+            "ephemerisCache": ephemeris_cache.metrics(),
+            "measurementQueue": measurement_queue.metrics(),
+            "skyImageStore": sky_image_store.metrics(),
+            "responseCache": response_cache.metrics(),
+            "tracking": track_store.metrics(),
+            "fixStreams": stream_hub.metrics(),
+            "fixCache": fix_cache.metrics()
+        }
+    })
 
 # ====================================================================
 # --- FLASK API ENDPOINT ---
@@ -146,16 +248,31 @@ def estimate_location_api(obs_data):
 
 @app.route('/calculate_latlon', methods=['GET'])
 def calculate_latlon():
-    """API endpoint to receive pitch/heading and return lat/lon."""
+    """API endpoint to receive pitch/heading and return lat/lon.
+
+    With track=1 and a session_id the sighting is solved in tracking mode:
+    the session's previous fix, projected forward, seeds the solver and
+    acts as its prior, and the response carries the fix's error ellipse.
+    """
     
     try:
         # Note: obs_altitude here is the ADJUSTED value (Raw - 90) sent by camera.html
         obs_altitude = float(request.args.get('pitch'))
         obs_azimuth = float(request.args.get('heading'))
         elevation = float(request.args.get('elevation', 0.0))
+        pressure = float(request.args.get('pressure', 1013.25))
+        temperature = float(request.args.get('temperature', 15.0))
         user_id = request.args.get('user_id')  # Get user_id from request
+        session_id = request.args.get('session_id', type=int)  # Optional UserSession link
     except (TypeError, ValueError):
-        return jsonify({"error": "Invalid or missing 'pitch' or 'heading' parameters."}), 400
+        return jsonify({"error": "Invalid or missing 'pitch', 'heading', 'elevation', 'pressure' or 'temperature' parameters."}), 400
+
+    method = request.args.get('method', 'direct')
+    if method not in SOLVER_METHODS:
+        return jsonify({"error": f"Invalid 'method' parameter. Use one of: {', '.join(SOLVER_METHODS)}."}), 400
+    track = request.args.get('track', '').lower() in ('1', 'true', 'yes')
+    if track and session_id is None:
+        return jsonify({"error": "Tracking mode needs a 'session_id'."}), 400
 
     dt_utc = datetime.now(timezone.utc)
     
@@ -164,36 +281,385 @@ def calculate_latlon():
         'azimuth': obs_azimuth,
         'altitude': obs_altitude,
         'elevation': elevation,
+        'pressure': pressure,
+        'temperature': temperature,
     }
 
     try:
-        lat, lon = estimate_location_api(obs_data)
+        lat, lon, solver_info, accuracy, tracking = _solve_fix(obs_data, method, session_id if track else None)
     except Exception as e:
         print(f"--- FAILED CALCULATION TRACE ---")
         print(f"Internal Calculation Error: {e}")
         print(f"---------------------------------")
         return jsonify({"error": "Solar calculation failed on server. Internal error."}), 500
 
-    # Save measurement to database
+    measurement_id, provisional_id = _store_fix(
+        obs_data, lat, lon, accuracy, 'track' if track else 'solar', user_id, session_id)
+    return jsonify(dict(
+        {"status": "success"},
+        **_fix_payload(obs_data, lat, lon, accuracy, solver_info, tracking, measurement_id, provisional_id)
+    ))
+
+def _solve_fix(obs_data, method, track_session=None):
+    """Solves one sighting, against the session's track when track_session is set.
+
+    Returns (lat, lon, solver_info, accuracy_m, tracking), tracking being
+    None outside tracking mode.
+    """
+    covariance = None
+    if track_session is not None:
+        prior, prior_covariance = track_store.predict(track_session, obs_data['utc_time'])
+        fix, timed_out = solver_pool.run(solve_tracked, obs_data, prior, prior_covariance, method)
+        if not timed_out:
+            lat, lon, covariance, solver_info = fix
+        elif prior is not None:
+            # The predicted position is a better stand-in than the rough guess
+            (lat, lon), covariance = prior, prior_covariance
+            solver_info = {'method': 'predicted', 'degraded': True, 'success': False}
+        else:
+            lat, lon, solver_info = degraded_fix(obs_data)
+    elif fix_cache.enabled:
+        # Identical sightings share one solve; deadline misses are not cached
+        (fix, timed_out), source = fix_cache.get_or_compute(
+            fix_cache.key(obs_data, method),
+            lambda: solver_pool.run(solve_sight, obs_data, method),
+            cacheable=lambda result: not result[1]
+        )
+        if timed_out:
+            lat, lon, solver_info = degraded_fix(obs_data)
+        else:
+            lat, lon, solver_info = fix
+            solver_info = dict(solver_info, cache=source)
+    else:
+        fix, timed_out = solver_pool.run(solve_sight, obs_data, method)
+        lat, lon, solver_info = degraded_fix(obs_data) if timed_out else fix
+
+    accuracy = 1000.0  # Default accuracy in meters
+    tracking = None
+    if covariance is not None:
+        semi_major, semi_minor, orientation = error_ellipse(lat, covariance)
+        if np.isfinite(semi_major):
+            accuracy = float(np.hypot(semi_major, semi_minor))
+        fixes = None
+        if not solver_info.get('degraded'):
+            fixes = track_store.update(track_session, float(lat), float(lon), covariance,
+                                       obs_data['utc_time'], solver_info)
+        tracking = {
+            "session_id": track_session,
+            "fixes": fixes,
+            "warm_start": solver_info.get('warm_start', False),
+            "reset": solver_info.get('reset', False),
+            "chi2": solver_info.get('chi2'),
+            "error_ellipse": {
+                "semi_major_m": semi_major,
+                "semi_minor_m": semi_minor,
+                "orientation_deg": orientation
+            }
+        }
+    return float(lat), float(lon), solver_info, accuracy, tracking
+
+def _store_fix(obs_data, lat, lon, accuracy, calculation_method, user_id, session_id):
+    """Saves a fix as a measurement, or hands it to the write-behind flusher.
+
+    Returns (measurement_id, provisional_id); the unused one is None.
+    """
+    row = dict(
+        latitude=lat,
+        longitude=lon,
+        pitch=obs_data['altitude'],
+        heading=obs_data['azimuth'],
+        elevation=obs_data['elevation'],
+        pressure=obs_data['pressure'],
+        temperature=obs_data['temperature'],
+        calculation_method=calculation_method,
+        accuracy=accuracy,
+        timestamp=obs_data['utc_time'],
+        user_id=user_id,  # Associate measurement with user
+        session_id=session_id
+    )
+    if measurement_queue.enabled:
+        return None, measurement_queue.put(row)
     try:
-        measurement = Measurement(
+        measurement = Measurement(**row)
+        db.session.add(measurement)
+        db.session.commit()
+        return measurement.id, None
+    except Exception as e:
+        db.session.rollback()
+        print(f"Database save error: {e}")
+        return None, None
+
+def _fix_payload(obs_data, lat, lon, accuracy, solver_info, tracking, measurement_id=None, provisional_id=None):
+    """Fix fields shared by /calculate_latlon and the fix stream's events."""
+    payload = {
+        "lat": f"{lat:.6f}",
+        "lon": f"{lon:.6f}",
+        "captured_time_utc": obs_data['utc_time'].isoformat(),
+        "measurement_id": measurement_id,
+        "accuracy": accuracy,
+        "solver": _solver_summary(solver_info)
+    }
+    if provisional_id is not None:
+        payload["provisional_id"] = provisional_id
+    if tracking is not None:
+        payload["tracking"] = tracking
+    return payload
+
+def _solver_summary(solver_info):
+    """Solver diagnostics as returned by the calculate_latlon endpoints."""
+    return {
+        "method": solver_info.get('method'),
+        "fallback": solver_info.get('fallback', False),
+        "degraded": solver_info.get('degraded', False),
+        "iterations": solver_info.get('iterations'),
+        "function_evaluations": solver_info.get('function_evaluations'),
+        "cache": solver_info.get('cache')
+    }
+
+def _parse_observation(item):
+    """Validates one batch observation and returns its obs_data dict."""
+    if not isinstance(item, dict):
+        raise ValueError("Observation must be an object.")
+    try:
+        obs_altitude = float(item['pitch'])
+        obs_azimuth = float(item['heading'])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("Invalid or missing 'pitch' or 'heading'.")
+    try:
+        dt_utc = datetime.fromisoformat(str(item['timestamp']).replace('Z', '+00:00'))
+    except (KeyError, ValueError):
+        raise ValueError("Invalid or missing 'timestamp' (ISO 8601 expected).")
+    if dt_utc.tzinfo is None:
+        dt_utc = dt_utc.replace(tzinfo=timezone.utc)
+    try:
+        return {
+            'utc_time': dt_utc.astimezone(timezone.utc),
+            'azimuth': obs_azimuth,
+            'altitude': obs_altitude,
+            'elevation': float(item.get('elevation', 0.0)),
+            'pressure': float(item.get('pressure', 1013.25)),
+            'temperature': float(item.get('temperature', 15.0)),
+        }
+    except (TypeError, ValueError):
+        raise ValueError("Invalid 'elevation', 'pressure' or 'temperature'.")
+
+def _session_id_param(data):
+    """The optional 'session_id' of a JSON body as an int; raises ValueError."""
+    session_id = data.get('session_id')
+    if session_id is None:
+        return None
+    if isinstance(session_id, bool) or not isinstance(session_id, (int, str)):
+        raise ValueError("'session_id' must be an integer.")
+    try:
+        return int(session_id)
+    except ValueError:
+        raise ValueError("'session_id' must be an integer.")
+
+@app.route('/calculate_latlon/batch', methods=['POST'])
+def calculate_latlon_batch():
+    """Solve many buffered sightings in one request.
+
+    Expects {"observations": [{pitch, heading, timestamp, elevation,
+    pressure, temperature}, ...], "user_id", "session_id", "method"}. Results
+    come back in input order; invalid or unsolvable items carry an error
+    instead of failing the whole batch.
+    """
+    data = request.get_json(silent=True) or {}
+    observations = data.get('observations')
+    if not isinstance(observations, list) or not observations:
+        return jsonify({"error": "'observations' must be a non-empty list."}), 400
+    if len(observations) > app.config['BATCH_MAX_OBSERVATIONS']:
+        return jsonify({"error": f"At most {app.config['BATCH_MAX_OBSERVATIONS']} observations per batch."}), 400
+
+    method = data.get('method', 'direct')
+    if method not in SOLVER_METHODS:
+        return jsonify({"error": f"Invalid 'method' parameter. Use one of: {', '.join(SOLVER_METHODS)}."}), 400
+    user_id = data.get('user_id')
+    try:
+        session_id = _session_id_param(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if session_id is not None and db.session.get(UserSession, session_id) is None:
+        return jsonify({"error": "Session not found"}), 404
+
+    results = [None] * len(observations)
+    parsed = []
+    for index, item in enumerate(observations):
+        try:
+            parsed.append((index, _parse_observation(item)))
+        except ValueError as e:
+            results[index] = {"index": index, "status": "error", "error": str(e)}
+
+    # One vectorized ephemeris pass over every valid timestamp in the batch
+    if parsed:
+        ephemerides = ephemeris_cache.compute([obs['utc_time'] for _, obs in parsed])
+
+    for position, (index, obs_data) in enumerate(parsed):
+        obs_data['ephemeris'] = SolarEphemeris(*(float(field[position]) for field in ephemerides))
+
+    # Fan the sightings out across the solver pool under one shared deadline
+    deadline = time.monotonic() + app.config['SOLVER_DEADLINE_MS'] / 1000.0
+    if solver_pool.enabled:
+        pending = [(index, obs_data, solver_pool.submit(solve_sight, obs_data, method)) for index, obs_data in parsed]
+    else:
+        pending = [(index, obs_data, None) for index, obs_data in parsed]
+
+    solved = []
+    for index, obs_data, future in pending:
+        try:
+            if future is None:
+                fix, timed_out = solve_sight(obs_data, method), False
+            else:
+                fix, timed_out = solver_pool.wait(future, deadline)
+            lat, lon, solver_info = degraded_fix(obs_data) if timed_out else fix
+        except Exception as e:
+            print(f"Batch calculation error at index {index}: {e}")
+            results[index] = {"index": index, "status": "error", "error": "Solar calculation failed."}
+            continue
+        solved.append((index, obs_data, lat, lon, solver_info))
+
+    # Persist every fix with a single bulk insert
+    measurements = [
+        Measurement(
             latitude=float(lat),
             longitude=float(lon),
-            pitch=obs_altitude,
-            heading=obs_azimuth,
-            elevation=elevation,
-            pressure=float(request.args.get('pressure', 1013.25)),
-            temperature=float(request.args.get('temperature', 15.0)),
+            pitch=obs_data['altitude'],
+            heading=obs_data['azimuth'],
+            elevation=obs_data['elevation'],
+            pressure=obs_data['pressure'],
+            temperature=obs_data['temperature'],
             calculation_method='solar',
             accuracy=1000.0,  # Default accuracy in meters
-            timestamp=dt_utc,
-            user_id=user_id  # Associate measurement with user
+            timestamp=obs_data['utc_time'],
+            user_id=user_id,
+            session_id=session_id
+        )
+        for _, obs_data, lat, lon, _ in solved
+    ]
+    try:
+        db.session.add_all(measurements)
+        db.session.commit()
+        measurement_ids = [m.id for m in measurements]
+    except Exception as e:
+        db.session.rollback()
+        print(f"Database save error: {e}")
+        measurement_ids = [None] * len(measurements)
+
+    for (index, obs_data, lat, lon, solver_info), measurement_id in zip(solved, measurement_ids):
+        results[index] = {
+            "index": index,
+            "status": "success",
+            "lat": f"{lat:.6f}",
+            "lon": f"{lon:.6f}",
+            "captured_time_utc": obs_data['utc_time'].isoformat(),
+            "measurement_id": measurement_id,
+            "accuracy": 1000.0,
+            "solver": _solver_summary(solver_info)
+        }
+
+    return jsonify({
+        "status": "success",
+        "results": results,
+        "count": len(results),
+        "solved": len(solved)
+    })
+
+def _sighting_key(obs_data):
+    """(UTC time, pitch, heading) identifying a sighting across requests and stored rows."""
+    return (obs_data['utc_time'].astimezone(timezone.utc).replace(tzinfo=None),
+            obs_data['altitude'], obs_data['azimuth'])
+
+@app.route('/calculate_latlon/multi', methods=['POST'])
+def calculate_latlon_multi():
+    """Joint least-squares fix from several sightings taken over a session.
+
+    Expects {"observations": [...], "session_id": ..., "user_id": ...,
+    "sigma_altitude": ..., "sigma_azimuth": ...}. Observations use the batch
+    format. With a session_id, the session's recorded solar sightings are
+    included as well (those repeating a posted observation count once) and
+    the fix is stored against the session. Returns the
+    position with a 1-sigma error ellipse from the solution covariance.
+    """
+    data = request.get_json(silent=True) or {}
+    observations = data.get('observations') or []
+    if not isinstance(observations, list):
+        return jsonify({"error": "'observations' must be a list."}), 400
+    if len(observations) > app.config['BATCH_MAX_OBSERVATIONS']:
+        return jsonify({"error": f"At most {app.config['BATCH_MAX_OBSERVATIONS']} observations per request."}), 400
+
+    try:
+        sightings = [_parse_observation(item) for item in observations]
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        sigma_alt = float(data.get('sigma_altitude', SIGHT_SIGMA_ALTITUDE_DEG))
+        sigma_az = float(data.get('sigma_azimuth', SIGHT_SIGMA_AZIMUTH_DEG))
+    except (TypeError, ValueError):
+        return jsonify({"error": "'sigma_altitude' and 'sigma_azimuth' must be numbers."}), 400
+    if sigma_alt <= 0 or sigma_az <= 0:
+        return jsonify({"error": "'sigma_altitude' and 'sigma_azimuth' must be positive."}), 400
+
+    try:
+        session_id = _session_id_param(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    user_id = data.get('user_id')
+    if session_id is not None:
+        session = db.session.get(UserSession, session_id)
+        if session is None:
+            return jsonify({"error": "Session not found"}), 404
+        recorded = Measurement.query.filter_by(session_id=session_id, calculation_method='solar').all()
+        # Sightings already posted through /batch for this session are stored too; count each once
+        seen = {_sighting_key(obs) for obs in sightings}
+        for m in recorded:
+            obs = {
+                'utc_time': m.timestamp.replace(tzinfo=timezone.utc) if m.timestamp.tzinfo is None else m.timestamp,
+                'azimuth': m.heading,
+                'altitude': m.pitch,
+                'elevation': m.elevation or 0.0,
+                'pressure': m.pressure if m.pressure is not None else 1013.25,
+                'temperature': m.temperature if m.temperature is not None else 15.0,
+            }
+            if _sighting_key(obs) not in seen:
+                seen.add(_sighting_key(obs))
+                sightings.append(obs)
+
+    if len(sightings) < 2:
+        return jsonify({"error": "At least two sightings are required; use /calculate_latlon for one."}), 400
+
+    solver_info = {}
+    try:
+        lat, lon, covariance = estimate_location_multi(sightings, sigma_alt, sigma_az, diagnostics=solver_info)
+    except Exception as e:
+        print(f"Multi-sight calculation error: {e}")
+        return jsonify({"error": "Solar calculation failed on server. Internal error."}), 500
+
+    semi_major, semi_minor, orientation = error_ellipse(lat, covariance)
+    # Distance RMS of the ellipse, reported as the scalar accuracy
+    accuracy = float(np.hypot(semi_major, semi_minor))
+
+    latest = max(sightings, key=lambda obs: obs['utc_time'])
+    try:
+        measurement = Measurement(
+            latitude=lat,
+            longitude=lon,
+            pitch=latest['altitude'],
+            heading=latest['azimuth'],
+            elevation=latest['elevation'],
+            pressure=latest['pressure'],
+            temperature=latest['temperature'],
+            calculation_method='multi',
+            accuracy=accuracy if np.isfinite(accuracy) else None,
+            notes=f"Joint fix from {len(sightings)} sightings",
+            timestamp=latest['utc_time'],
+            user_id=user_id,
+            session_id=session_id
         )
         db.session.add(measurement)
         db.session.commit()
-        
         measurement_id = measurement.id
     except Exception as e:
+        db.session.rollback()
         print(f"Database save error: {e}")
         measurement_id = None
 
@@ -201,11 +667,121 @@ def calculate_latlon():
         "status": "success",
         "lat": f"{lat:.6f}",
         "lon": f"{lon:.6f}",
-        "captured_time_utc": dt_utc.isoformat(),
+        "captured_time_utc": latest['utc_time'].isoformat(),
         "measurement_id": measurement_id,
-        "accuracy": 1000.0
+        "accuracy": accuracy,
+        "error_ellipse": {
+            "semi_major_m": semi_major,
+            "semi_minor_m": semi_minor,
+            "orientation_deg": orientation
+        },
+        "sightings": len(sightings),
+        "solver": dict(_solver_summary(solver_info), rms_residual=solver_info.get('rms_residual'))
     })
 
+@app.route('/calculate_latlon/stream', methods=['GET'])
+def calculate_latlon_stream():
+    """Server-sent event stream of fixes for samples pushed to it.
+
+    Takes user_id, session_id, method and track as /calculate_latlon does,
+    plus persist_every (store every Nth fix; 0 stores none). The first
+    `ready` event names the stream; POST samples to its samples_url. Each
+    solved sample yields a `fix` event. Samples arriving while the solver
+    is busy replace each other, so only the latest one is solved. The
+    stream ends after STREAM_IDLE_TIMEOUT_S without samples.
+    """
+    user_id = request.args.get('user_id')
+    try:
+        session_id = request.args.get('session_id', type=int)
+        persist_every = int(request.args.get('persist_every', app.config['STREAM_PERSIST_EVERY']))
+    except (TypeError, ValueError):
+        return jsonify({"error": "Invalid 'session_id' or 'persist_every' parameter."}), 400
+    if persist_every < 0:
+        return jsonify({"error": "'persist_every' must not be negative."}), 400
+    method = request.args.get('method', 'direct')
+    if method not in SOLVER_METHODS:
+        return jsonify({"error": f"Invalid 'method' parameter. Use one of: {', '.join(SOLVER_METHODS)}."}), 400
+    track = request.args.get('track', '').lower() in ('1', 'true', 'yes')
+    if track and session_id is None:
+        return jsonify({"error": "Tracking mode needs a 'session_id'."}), 400
+
+    stream = stream_hub.open({'user_id': user_id, 'session_id': session_id, 'method': method,
+                              'track': track, 'persist_every': persist_every})
+    if stream is None:
+        return jsonify({"error": "Too many open fix streams; try again later."}), 503
+
+    heartbeat_s = app.config['STREAM_HEARTBEAT_S']
+    idle_timeout_s = app.config['STREAM_IDLE_TIMEOUT_S']
+
+    def events():
+        try:
+            yield sse_event('ready', {
+                "stream_id": stream.stream_id,
+                "samples_url": f"/calculate_latlon/stream/{stream.stream_id}",
+                "persist_every": persist_every
+            })
+            coalesced_before = 0
+            while True:
+                taken = stream.take(heartbeat_s)
+                if taken is None:
+                    if time.monotonic() - stream.last_activity > idle_timeout_s:
+                        yield sse_event('end', {"reason": "idle"})
+                        return
+                    yield sse_comment('keepalive')
+                    continue
+
+                sequence, obs_data = taken
+                try:
+                    lat, lon, solver_info, accuracy, tracking = _solve_fix(
+                        obs_data, method, session_id if track else None)
+                except Exception as e:
+                    print(f"Streamed calculation error: {e}")
+                    yield sse_event('error', {"sequence": sequence, "error": "Solar calculation failed on server."})
+                    continue
+                stream.solved += 1
+
+                measurement_id = provisional_id = None
+                if persist_every and stream.solved % persist_every == 0:
+                    measurement_id, provisional_id = _store_fix(
+                        obs_data, lat, lon, accuracy, 'track' if track else 'solar', user_id, session_id)
+                    stream_hub.record_persisted()
+
+                payload = _fix_payload(obs_data, lat, lon, accuracy, solver_info, tracking,
+                                       measurement_id, provisional_id)
+                payload["sequence"] = sequence
+                payload["coalesced"] = stream.coalesced - coalesced_before
+                coalesced_before = stream.coalesced
+                yield sse_event('fix', payload, event_id=sequence)
+        finally:
+            stream_hub.release(stream)
+
+    return Response(
+        stream_with_context(events()),
+        mimetype='text/event-stream',
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.route('/calculate_latlon/stream/<stream_id>', methods=['POST'])
+def push_stream_sample(stream_id):
+    """Queue a sensor sample {pitch, heading, elevation, pressure, temperature, timestamp} on a fix stream.
+
+    timestamp defaults to the time of receipt. Answers 202 at once; the fix
+    arrives on the event stream. 410 means the stream has ended or is held by
+    another server process (see fix_stream.py); open a new one.
+    """
+    stream = stream_hub.get(stream_id)
+    if stream is None:
+        return jsonify({"error": "Fix stream is not open on this server; open a new event stream."}), 410
+    item = request.get_json(silent=True)
+    if isinstance(item, dict) and item.get('timestamp') is None:
+        item = dict(item, timestamp=datetime.now(timezone.utc).isoformat())
+    try:
+        obs_data = _parse_observation(item)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    sequence, replaced = stream.push(obs_data)
+    return jsonify({"status": "accepted", "sequence": sequence, "replaced_pending": replaced}), 202
+
 # ====================================================================
 # --- USER MANAGEMENT API ENDPOINTS ---
 # ====================================================================
@@ -274,19 +850,73 @@ def delete_user_data(user_id):
 # ====================================================================
 
 @app.route('/api/measurements', methods=['GET'])
+@response_cache.cached('measurements')
 def get_measurements():
-    """Get recent measurements."""
+    """Get measurements, newest first.
+
+    Filters: user_id, session_id, start/end (ISO 8601), calculation_method.
+    `fields` (comma-separated) limits the columns loaded and returned. Pass
+    the returned nextCursor as `cursor` for the following page.
+    """
     try:
-        limit = request.args.get('limit', 50, type=int)
-        measurements = Measurement.query.order_by(Measurement.timestamp.desc()).limit(limit).all()
+        limit = page_size(request.args, default=50, maximum=app.config['API_MAX_PAGE_SIZE'])
+        fields = parse_fields(Measurement, request.args.get('fields'))
+        query = Measurement.query
+        if fields:
+            query = query.options(load_only(*field_columns(Measurement, fields)))
+        query = apply_filters(query, Measurement, request.args)
+        measurements, next_cursor = keyset_page(query, Measurement, request.args.get('cursor'), limit)
         return jsonify({
             "status": "success",
-            "data": [m.to_dict() for m in measurements],
-            "count": len(measurements)
+            "data": [m.to_dict(fields) for m in measurements],
+            "count": len(measurements),
+            "nextCursor": next_cursor
         })
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/measurements/export', methods=['GET'])
+def export_measurements():
+    """Export every matching measurement as NDJSON, CSV or a NumPy .npz archive.
+
+    Takes the /api/measurements filters plus format=ndjson|csv|npz. NDJSON
+    and CSV are streamed chunked, oldest first, as rows come off a
+    server-side cursor. npz holds the numeric columns in row groups, in id
+    order, streamed a group at a time; after_id resumes from a previous
+    export's watermark.
+    """
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({"error": f"Invalid 'format' parameter. Use one of: {', '.join(EXPORT_FORMATS)}."}), 400
+    try:
+        if export_format == 'npz':
+            query = columnar_query(request.args, after_id=request.args.get('after_id', type=int))
+        else:
+            query = export_query(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if export_format == 'npz':
+        body = npz_export_chunks(query, app.config['EXPORT_ROW_GROUP_ROWS'])
+        return Response(
+            stream_with_context(body),
+            mimetype='application/octet-stream',
+            headers={"Content-Disposition": "attachment; filename=measurements.npz"}
+        )
+
+    chunks = stream_chunks(query, app.config['EXPORT_CHUNK_ROWS'])
+    if export_format == 'csv':
+        body, mimetype = csv_lines(chunks), 'text/csv'
+    else:
+        body, mimetype = ndjson_lines(chunks), 'application/x-ndjson'
+    return Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename=measurements.{export_format}"}
+    )
+
 @app.route('/api/measurements', methods=['POST'])
 def create_measurement():
     """Create a new measurement."""
@@ -315,17 +945,205 @@ def create_measurement():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/measurements/bulk', methods=['POST'])
+def create_measurements_bulk():
+    """Store many measurements in one transaction, e.g. an offline sync.
+
+    Expects {"records": [{pitch, heading, timestamp, ..., idempotencyKey}],
+    "user_id"}. Records whose idempotencyKey is already stored are not
+    inserted again. The response lists a status and id per record, in input
+    order, with messages only for invalid records.
+    """
+    data = request.get_json(silent=True) or {}
+    records = data.get('records')
+    if not isinstance(records, list) or not records:
+        return jsonify({"error": "'records' must be a non-empty list."}), 400
+    if len(records) > app.config['BULK_MAX_RECORDS']:
+        return jsonify({"error": f"At most {app.config['BULK_MAX_RECORDS']} records per request."}), 400
+
+    try:
+        statuses, ids, errors = ingest_measurements(records, data.get('user_id'))
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+
+    return jsonify({
+        "status": "success",
+        "created": statuses.count(CREATED),
+        "duplicates": statuses.count(DUPLICATE),
+        "invalid": len(errors),
+        "statuses": statuses,
+        "ids": ids,
+        "errors": {str(index): message for index, message in errors.items()}
+    })
+
+def _float_arg(name, default=None):
+    value = request.args.get(name)
+    if value is None:
+        if default is None:
+            raise ValueError(f"Missing '{name}' parameter.")
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        raise ValueError(f"Invalid '{name}' parameter.")
+
+def _bbox_args(required=True):
+    names = ('south', 'west', 'north', 'east')
+    if not required and not any(name in request.args for name in names):
+        return None
+    return tuple(_float_arg(name) for name in names)
+
+@app.route('/api/measurements/bbox', methods=['GET'])
+@response_cache.cached('measurements')
+def get_measurements_in_bbox():
+    """Measurements inside south/west/north/east, newest first.
+
+    west > east selects a box across the antimeridian. Takes the
+    /api/measurements filters, `fields` and `cursor` as well.
+    """
+    try:
+        south, west, north, east = _bbox_args()
+        limit = page_size(request.args, default=50, maximum=app.config['API_MAX_PAGE_SIZE'])
+        fields = parse_fields(Measurement, request.args.get('fields'))
+        query = Measurement.query
+        if fields:
+            query = query.options(load_only(*field_columns(Measurement, fields)))
+        query = bbox_query(apply_filters(query, Measurement, request.args), south, west, north, east)
+        measurements, next_cursor = keyset_page(query, Measurement, request.args.get('cursor'), limit)
+        return jsonify({
+            "status": "success",
+            "data": [m.to_dict(fields) for m in measurements],
+            "count": len(measurements),
+            "nextCursor": next_cursor
+        })
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/measurements/nearest', methods=['GET'])
+@response_cache.cached('measurements')
+def get_nearest_measurements():
+    """The k measurements closest to lat/lon, nearest first, with distanceKm.
+
+    max_km drops anything farther away. Takes the /api/measurements filters.
+    """
+    try:
+        lat, lon = _float_arg('lat'), _float_arg('lon')
+        k = request.args.get('k', 10, type=int)
+        if not 1 <= k <= app.config['API_MAX_PAGE_SIZE']:
+            raise ValueError(f"'k' must be between 1 and {app.config['API_MAX_PAGE_SIZE']}.")
+        max_km = request.args.get('max_km')
+        max_km = _float_arg('max_km') if max_km is not None else None
+        if max_km is not None and max_km <= 0:
+            raise ValueError("'max_km' must be positive.")
+        fields = parse_fields(Measurement, request.args.get('fields'))
+        results = nearest(apply_filters(Measurement.query, Measurement, request.args), lat, lon, k, max_km)
+        return jsonify({
+            "status": "success",
+            "data": [dict(m.to_dict(fields), distanceKm=distance) for distance, m in results],
+            "count": len(results)
+        })
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/measurements/cells', methods=['GET'])
+@response_cache.cached('measurements')
+def get_measurement_cells():
+    """Measurement count, mean position and mean accuracy per geohash cell.
+
+    `precision` (1-12, default 5) sets the cell size; an optional
+    south/west/north/east box and the /api/measurements filters narrow
+    the rows aggregated.
+    """
+    try:
+        precision = request.args.get('precision', 5, type=int)
+        if not 1 <= precision <= geohash.PRECISION:
+            raise ValueError(f"'precision' must be between 1 and {geohash.PRECISION}.")
+        query = apply_filters(Measurement.query, Measurement, request.args)
+        cells = cell_aggregates(query, precision, _bbox_args(required=False))
+        return jsonify({
+            "status": "success",
+            "data": cells,
+            "count": len(cells),
+            "precision": precision
+        })
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/measurements/rollup', methods=['GET'])
+@response_cache.cached('measurements')
+def get_measurement_rollup():
+    """Measurement count, mean accuracy and mean position per hour or day.
+
+    granularity=hour|day (default hour); start/end (ISO 8601) default to
+    the last 48 hours or 30 days. Optional user_id and calculation_method
+    filters; group_by=calculation_method|user_id splits each bucket.
+    Served from the rollup table, never the raw measurements.
+    """
+    try:
+        granularity = request.args.get('granularity', 'hour')
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"Invalid 'granularity'. Use one of: {', '.join(GRANULARITIES)}.")
+        group_by = request.args.get('group_by') or None
+        if group_by is not None and group_by not in GROUP_BY:
+            raise ValueError(f"Invalid 'group_by'. Use one of: {', '.join(GROUP_BY)}.")
+        step = bucket_step(granularity)
+        try:
+            end = parse_time(request.args.get('end')) or bucket_start(datetime.utcnow(), granularity) + step
+            start = parse_time(request.args.get('start')) or end - step * (48 if granularity == 'hour' else 30)
+        except ValueError:
+            raise ValueError("Invalid 'start' or 'end' (ISO 8601 expected).")
+        if start >= end:
+            raise ValueError("'start' must be before 'end'.")
+        if (end - start) / step > app.config['ROLLUP_MAX_BUCKETS']:
+            raise ValueError(f"At most {app.config['ROLLUP_MAX_BUCKETS']} {granularity} buckets per request.")
+        points = read_rollup(granularity, bucket_start(start, granularity), end,
+                             request.args.get('user_id'), request.args.get('calculation_method'), group_by)
+        return jsonify({
+            "status": "success",
+            "data": points,
+            "count": len(points),
+            "granularity": granularity,
+            "start": bucket_start(start, granularity).isoformat(),
+            "end": end.isoformat()
+        })
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/api/weather', methods=['GET'])
+@response_cache.cached('weather_readings')
 def get_weather_readings():
-    """Get recent weather readings."""
+    """Get weather readings, newest first.
+
+    Filters: user_id, session_id, start/end (ISO 8601). `fields`
+    (comma-separated) limits the columns loaded and returned; JSON columns
+    not asked for are neither read nor decoded. Pass the returned
+    nextCursor as `cursor` for the following page.
+    """
     try:
-        limit = request.args.get('limit', 20, type=int)
-        readings = WeatherReading.query.order_by(WeatherReading.timestamp.desc()).limit(limit).all()
+        limit = page_size(request.args, default=20, maximum=app.config['API_MAX_PAGE_SIZE'])
+        fields = parse_fields(WeatherReading, request.args.get('fields'))
+        query = WeatherReading.query
+        if fields:
+            query = query.options(load_only(*field_columns(WeatherReading, fields)))
+        query = apply_filters(query, WeatherReading, request.args)
+        readings, next_cursor = keyset_page(query, WeatherReading, request.args.get('cursor'), limit)
         return jsonify({
             "status": "success",
-            "data": [r.to_dict() for r in readings],
-            "count": len(readings)
+            "data": [r.to_dict(fields) for r in readings],
+            "count": len(readings),
+            "nextCursor": next_cursor
         })
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -334,10 +1152,11 @@ def create_weather_reading():
     """Create a new weather reading."""
     try:
         data = request.get_json()
+        sky_images, _ = sky_image_store.store_images(data.get('skyImages', {}))
         reading = WeatherReading(
             latitude=data.get('latitude'),
             longitude=data.get('longitude'),
-            sky_images=json.dumps(data.get('skyImages', {})),
+            sky_images=json.dumps(sky_images),
             conditions=json.dumps(data.get('conditions', {})),
             ai_analysis=json.dumps(data.get('aiAnalysis', {}))
         )
@@ -351,6 +1170,80 @@ def create_weather_reading():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/sky-images/<digest>', methods=['GET'])
+def get_sky_image(digest):
+    """Serve a stored sky image by its SHA-256 digest.
+
+    Blobs never change, so the digest is the ETag and responses may be
+    cached indefinitely; If-None-Match gets a 304.
+    """
+    if not is_digest(digest) or not sky_image_store.exists(digest):
+        return jsonify({"error": "Image not found"}), 404
+    path = sky_image_store.path(digest)
+    with open(path, 'rb') as f:
+        mimetype = sniff_content_type(f.read(12))
+    response = send_file(path, mimetype=mimetype, etag=digest, conditional=True, max_age=31536000)
+    response.cache_control.immutable = True
+    return response
+
+@app.route('/api/sessions', methods=['GET'])
+@response_cache.cached('user_sessions', 'measurements', 'weather_readings')
+def get_sessions():
+    """List sessions, newest first, with measurement and weather counts.
+
+    Filters: user_id, start/end (ISO 8601, on the session start time) and
+    limit. Counts for the whole page come from one grouped query.
+    """
+    try:
+        start = parse_time(request.args.get('start'))
+        end = parse_time(request.args.get('end'))
+        limit = page_size(request.args, maximum=app.config['API_MAX_PAGE_SIZE'])
+    except ValueError:
+        return jsonify({"error": "Invalid 'start', 'end' (ISO 8601 expected) or 'limit'."}), 400
+    try:
+        page = db.session.query(UserSession.id)
+        user_id = request.args.get('user_id')
+        if user_id:
+            page = page.filter(UserSession.user_id == user_id)
+        if start is not None:
+            page = page.filter(UserSession.start_time >= start)
+        if end is not None:
+            page = page.filter(UserSession.start_time < end)
+        page = page.order_by(UserSession.start_time.desc(), UserSession.id.desc()).limit(limit).subquery()
+
+        # Counts are grouped over the page's sessions only, in the same round trip
+        page_ids = db.select(page.c.id)
+        measurement_counts = (
+            db.session.query(Measurement.session_id, db.func.count().label('count'))
+            .filter(Measurement.session_id.in_(page_ids))
+            .group_by(Measurement.session_id).subquery()
+        )
+        weather_counts = (
+            db.session.query(WeatherReading.session_id, db.func.count().label('count'))
+            .filter(WeatherReading.session_id.in_(page_ids))
+            .group_by(WeatherReading.session_id).subquery()
+        )
+        rows = (
+            db.session.query(
+                UserSession,
+                db.func.coalesce(measurement_counts.c.count, 0),
+                db.func.coalesce(weather_counts.c.count, 0)
+            )
+            .join(page, page.c.id == UserSession.id)
+            .outerjoin(measurement_counts, measurement_counts.c.session_id == UserSession.id)
+            .outerjoin(weather_counts, weather_counts.c.session_id == UserSession.id)
+            .order_by(UserSession.start_time.desc(), UserSession.id.desc())
+            .all()
+        )
+        return jsonify({
+            "status": "success",
+            "data": [session.to_dict(measurement_count, weather_count)
+                     for session, measurement_count, weather_count in rows],
+            "count": len(rows)
+        })
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/api/sessions', methods=['POST'])
 def create_session():
     """Create a new user session."""
@@ -382,6 +1275,7 @@ def update_session(session_id):
         
         if 'endTime' in data:
             session.end_time = datetime.fromisoformat(data['endTime'].replace('Z', '+00:00'))
+            track_store.discard(session_id)
         if 'location' in data:
             session.location_lat = data['location'].get('lat')
             session.location_lng = data['location'].get('lng')
@@ -397,40 +1291,101 @@ def update_session(session_id):
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/stats', methods=['GET'])
+@response_cache.cached('measurements', 'weather_readings', 'user_sessions')
 def get_stats():
     """Get application statistics."""
     try:
-        total_measurements = Measurement.query.count()
-        total_weather = WeatherReading.query.count()
-        total_sessions = UserSession.query.count()
-        
-        recent_measurement = Measurement.query.order_by(Measurement.timestamp.desc()).first()
-        
-        # Calculate average accuracy for measurements that have it
-        measurements_with_accuracy = Measurement.query.filter(Measurement.accuracy.isnot(None)).all()
-        avg_accuracy = sum(m.accuracy for m in measurements_with_accuracy) / len(measurements_with_accuracy) if measurements_with_accuracy else 0
-        
-        # Method breakdown
-        solar_count = Measurement.query.filter(Measurement.calculation_method == 'solar').count()
-        gps_count = Measurement.query.filter(Measurement.calculation_method == 'gps').count()
-        
+        # The response cache keys this on table versions; the counters are read fresh on a miss
         return jsonify({
             "status": "success",
-            "data": {
-                "totalMeasurements": total_measurements,
-                "totalWeatherReadings": total_weather,
-                "totalSessions": total_sessions,
-                "averageAccuracy": avg_accuracy,
-                "lastMeasurement": recent_measurement.timestamp.isoformat() if recent_measurement else None,
-                "methodBreakdown": {
-                    "solar": solar_count,
-                    "gps": gps_count
-                }
-            }
+            "data": read_stats()
         })
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+# ====================================================================
+# --- CLI COMMANDS ---
+# ====================================================================
+
+@app.cli.command('build-ephemeris-table')
+@click.option('--start-year', type=int, default=lambda: datetime.now(timezone.utc).year - 1, help='First year covered.')
+@click.option('--end-year', type=int, default=lambda: datetime.now(timezone.utc).year + 5, help='Last year covered.')
+@click.option('--step', type=int, default=DEFAULT_STEP_S, show_default=True, help='Seconds between rows.')
+@click.option('--output', default=None, help='Output path (defaults to EPHEMERIS_TABLE_PATH).')
+def build_ephemeris_table_command(start_year, end_year, step, output):
+    """Precompute the memory-mapped solar ephemeris table."""
+    if end_year < start_year or step <= 0:
+        raise click.BadParameter("Need start-year <= end-year and a positive step.")
+    path = output or app.config['EPHEMERIS_TABLE_PATH']
+    rows = build_table(path, start_year, end_year, step)
+    click.echo(f"Wrote {rows} rows ({start_year}-{end_year}, {step} s step) to {path}")
+
+@app.cli.command('export-measurements')
+@click.argument('output')
+@click.option('--incremental', is_flag=True, help='Append only rows past the id watermark already in OUTPUT.')
+@click.option('--row-group-rows', type=int, default=None, help='Rows per row group (defaults to EXPORT_ROW_GROUP_ROWS).')
+@click.option('--user-id', default=None, help='Only this user\'s measurements.')
+@click.option('--calculation-method', default=None, help='Only this calculation method.')
+def export_measurements_command(output, incremental, row_group_rows, user_id, calculation_method):
+    """Write numeric measurement columns to a NumPy .npz archive in row groups."""
+    row_group_rows = row_group_rows or app.config['EXPORT_ROW_GROUP_ROWS']
+    if row_group_rows <= 0:
+        raise click.BadParameter("--row-group-rows must be positive.")
+    watermark = npz_watermark(output) if incremental else None
+    filters = {'user_id': user_id, 'calculation_method': calculation_method}
+    rows = write_npz_export(output, columnar_query(filters, after_id=watermark), row_group_rows, append=incremental)
+    resumed = f" after id {watermark}" if watermark is not None else ""
+    click.echo(f"Wrote {rows} rows{resumed} to {output}")
+
+@app.cli.command('migrate-sky-images')
+@click.option('--batch-size', type=int, default=100, show_default=True, help='Weather readings per transaction.')
+def migrate_sky_images_command(batch_size):
+    """Move inline sky image payloads into the blob store, leaving references."""
+    last_id, readings, images = 0, 0, 0
+    while True:
+        batch = (
+            WeatherReading.query
+            .filter(WeatherReading.id > last_id, WeatherReading.sky_images.like('%data:%'))
+            .order_by(WeatherReading.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not batch:
+            break
+        for reading in batch:
+            references, moved = sky_image_store.store_images(json.loads(reading.sky_images))
+            if moved:
+                reading.sky_images = json.dumps(references)
+                readings += 1
+                images += moved
+        db.session.commit()
+        last_id = batch[-1].id
+        db.session.expunge_all()
+    click.echo(f"Moved {images} images from {readings} weather readings to {sky_image_store.root} "
+               f"({sky_image_store.deduplicated} already stored)")
+
+@app.cli.command('rebuild-stats')
+def rebuild_stats_command():
+    """Recompute the AppStats counters behind /api/stats from the tables."""
+    stats = rebuild_stats()
+    click.echo(f"Rebuilt statistics: {stats['totalMeasurements']} measurements, "
+               f"{stats['totalWeatherReadings']} weather readings, {stats['totalSessions']} sessions")
+
+@app.cli.command('rebuild-rollups')
+def rebuild_rollups_command():
+    """Recompute the hourly and daily measurement rollups from history."""
+    rows = rebuild_rollups()
+    click.echo(f"Rebuilt {rows} measurement rollup rows")
+
+@app.cli.command('backfill-geohash')
+@click.option('--batch-size', type=int, default=1000, show_default=True, help='Measurements per transaction.')
+def backfill_geohash_command(batch_size):
+    """Compute the geohash of measurements stored before the column existed."""
+    if batch_size <= 0:
+        raise click.BadParameter("--batch-size must be positive.")
+    updated = backfill_geohashes(batch_size)
+    click.echo(f"Set geohash on {updated} measurements")
+
 if __name__ == '__main__':
     print("Starting Flask server on port 8000...")
     print("Database: celestinav.db")
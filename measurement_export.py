@@ -0,0 +1,219 @@
+# Bulk export of the measurements table
+#
+# Rows are read through a server-side cursor (stream_results) on a dedicated
+# connection and encoded a chunk at a time, so memory stays flat however
+# many rows match. Text exports are ordered oldest first on (timestamp, id);
+# the columnar export is described in its own section below.
+import csv
+import io
+import os
+import re
+import zipfile
+
+import numpy as np
+from sqlalchemy import select
+
+from database_models import db, Measurement
+from json_provider import dumps
+from pagination import apply_filters
+
+DEFAULT_CHUNK_ROWS = 1000
+
+# Exported columns and their names in the output, matching Measurement.to_dict
+EXPORT_COLUMNS = [
+    ('id', 'id'),
+    ('timestamp', 'timestamp'),
+    ('latitude', 'latitude'),
+    ('longitude', 'longitude'),
+    ('pitch', 'pitch'),
+    ('heading', 'heading'),
+    ('elevation', 'elevation'),
+    ('pressure', 'pressure'),
+    ('temperature', 'temperature'),
+    ('calculation_method', 'calculationMethod'),
+    ('accuracy', 'accuracy'),
+    ('notes', 'notes'),
+    ('session_id', 'sessionId'),
+]
+EXPORT_FORMATS = ('ndjson', 'csv', 'npz')
+
+
+def export_query(args):
+    """Filtered, oldest-first SELECT of the export columns; raises ValueError on bad filters."""
+    query = select(*(getattr(Measurement, column) for column, _ in EXPORT_COLUMNS))
+    query = apply_filters(query, Measurement, args)
+    return query.order_by(Measurement.timestamp, Measurement.id)
+
+
+def stream_chunks(query, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Yields lists of result rows, fetched through a server-side cursor."""
+    with db.engine.connect() as connection:
+        result = connection.execution_options(stream_results=True, yield_per=chunk_rows).execute(query)
+        for partition in result.partitions():
+            yield partition
+
+
+def _record(row):
+    record = dict(zip((name for _, name in EXPORT_COLUMNS), row))
+    if record['timestamp'] is not None:
+        record['timestamp'] = record['timestamp'].isoformat()
+    return record
+
+
+def ndjson_lines(chunks):
+    """One JSON object per line; one yielded string per chunk."""
+    for chunk in chunks:
+        yield ''.join(dumps(_record(row)) + '\n' for row in chunk)
+
+
+def csv_lines(chunks):
+    """CSV with a header row; one yielded string per chunk."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([name for _, name in EXPORT_COLUMNS])
+    for chunk in chunks:
+        for row in chunk:
+            record = _record(row)
+            writer.writerow(['' if value is None else value for value in record.values()])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+# ====================================================================
+# --- COLUMNAR (.npz) EXPORT ---
+# ====================================================================
+# Numeric columns are written as NumPy arrays in fixed-size row groups: an
+# .npz archive holding one member per column per group, named
+# '<column>.<group>' (e.g. 'latitude.000003'), written one group at a time
+# so memory is bounded by the group size. NULLs become NaN; timestamps are
+# datetime64[us] UTC. Rows are in id (insertion) order, and the largest
+# exported id is the watermark an incremental export resumes from, so rows
+# stored late with old timestamps are still picked up. Load with
+# read_npz_export(). For HTTP, npz_export_chunks() yields the archive as
+# each group is written: members carry data descriptors instead of sizes
+# seeked back into their headers, so nothing is spooled.
+DEFAULT_ROW_GROUP_ROWS = 65536
+
+COLUMNAR_COLUMNS = [
+    ('id', np.int64),
+    ('timestamp', 'datetime64[us]'),
+    ('latitude', np.float64),
+    ('longitude', np.float64),
+    ('pitch', np.float64),
+    ('heading', np.float64),
+    ('elevation', np.float64),
+    ('pressure', np.float64),
+    ('temperature', np.float64),
+    ('accuracy', np.float64),
+]
+
+_MEMBER = re.compile(r'^(\w+)\.(\d{6})\.npy$')
+
+
+def columnar_query(args=None, after_id=None):
+    """Filtered SELECT of the numeric columns in id order, optionally past a watermark."""
+    query = select(*(getattr(Measurement, column) for column, _ in COLUMNAR_COLUMNS))
+    if args:
+        query = apply_filters(query, Measurement, args)
+    if after_id is not None:
+        query = query.where(Measurement.id > after_id)
+    return query.order_by(Measurement.id)
+
+
+def _group_arrays(rows):
+    columns = list(zip(*rows))
+    arrays = {}
+    for (name, dtype), values in zip(COLUMNAR_COLUMNS, columns):
+        if name == 'timestamp':
+            arrays[name] = np.array(values, dtype=dtype)
+        else:
+            arrays[name] = np.array([np.nan if v is None else v for v in values], dtype=dtype)
+    return arrays
+
+
+def _group_count(archive):
+    groups = {int(match.group(2)) for match in map(_MEMBER.match, archive.namelist()) if match}
+    return max(groups) + 1 if groups else 0
+
+
+def _write_group(archive, group, rows):
+    for name, array in _group_arrays(rows).items():
+        with archive.open(f"{name}.{group:06d}.npy", 'w', force_zip64=True) as member:
+            np.lib.format.write_array(member, array, allow_pickle=False)
+
+
+def write_npz_export(target, query, row_group_rows=DEFAULT_ROW_GROUP_ROWS, append=False):
+    """Writes query rows to `target` (path or binary file) in row groups; returns rows written.
+
+    With append=True an existing archive gets new groups after its last one.
+    """
+    mode = 'a' if append and isinstance(target, str) and os.path.exists(target) else 'w'
+    written = 0
+    with zipfile.ZipFile(target, mode, compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+        group = _group_count(archive) if mode == 'a' else 0
+        for chunk in stream_chunks(query, row_group_rows):
+            _write_group(archive, group, chunk)
+            group += 1
+            written += len(chunk)
+    return written
+
+
+class _ByteSink(io.RawIOBase):
+    """Unseekable sink collecting what the zip writer emits until take() hands it out."""
+
+    def __init__(self):
+        self._parts = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def take(self):
+        data = b''.join(self._parts)
+        self._parts.clear()
+        return data
+
+
+def npz_export_chunks(query, row_group_rows=DEFAULT_ROW_GROUP_ROWS):
+    """Yields the bytes of an .npz export of the query rows, one row group at a time."""
+    sink = _ByteSink()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+        group = 0
+        for chunk in stream_chunks(query, row_group_rows):
+            _write_group(archive, group, chunk)
+            group += 1
+            yield sink.take()
+    # The central directory, written on close
+    yield sink.take()
+
+
+def npz_watermark(path):
+    """Largest id in an existing export, or None if there is none."""
+    if not os.path.exists(path):
+        return None
+    with zipfile.ZipFile(path) as archive:
+        groups = _group_count(archive)
+        if not groups:
+            return None
+        with archive.open(f"id.{groups - 1:06d}.npy") as member:
+            ids = np.lib.format.read_array(member)
+    return int(ids.max()) if ids.size else None
+
+
+def read_npz_export(path):
+    """Dict of column name -> array, with the row groups concatenated."""
+    with np.load(path, allow_pickle=False) as archive:
+        groups = {}
+        for key in archive.files:
+            name, group = key.rsplit('.', 1)
+            groups.setdefault(name, []).append((int(group), key))
+        return {
+            name: np.concatenate([archive[key] for _, key in sorted(members)])
+            for name, members in groups.items()
+        }
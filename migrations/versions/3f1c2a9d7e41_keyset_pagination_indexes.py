@@ -0,0 +1,38 @@
+"""keyset pagination indexes on measurements and weather_readings
+
+Revision ID: 3f1c2a9d7e41
+Revises: 
+Create Date: 2026-10-17 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2a9d7e41'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+# Tables predate migrations (db.create_all), so this revision only adds
+# indexes, and tolerates ones create_all already made on a fresh database.
+INDEXES = [
+    ('ix_measurements_timestamp_id', 'measurements', ['timestamp', 'id']),
+    ('ix_measurements_user_timestamp_id', 'measurements', ['user_id', 'timestamp', 'id']),
+    ('ix_measurements_session_timestamp_id', 'measurements', ['session_id', 'timestamp', 'id']),
+    ('ix_measurements_method_timestamp_id', 'measurements', ['calculation_method', 'timestamp', 'id']),
+    ('ix_weather_readings_timestamp_id', 'weather_readings', ['timestamp', 'id']),
+    ('ix_weather_readings_user_timestamp_id', 'weather_readings', ['user_id', 'timestamp', 'id']),
+    ('ix_weather_readings_session_timestamp_id', 'weather_readings', ['session_id', 'timestamp', 'id']),
+]
+
+
+def upgrade():
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, unique=False, if_not_exists=True)
+
+
+def downgrade():
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table, if_exists=True)
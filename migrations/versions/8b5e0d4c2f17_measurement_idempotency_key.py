@@ -0,0 +1,32 @@
+"""idempotency key on measurements for bulk sync
+
+Revision ID: 8b5e0d4c2f17
+Revises: 3f1c2a9d7e41
+Create Date: 2026-10-17 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b5e0d4c2f17'
+down_revision = '3f1c2a9d7e41'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # db.create_all already adds the column on a fresh database
+    columns = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('measurements')}
+    if 'idempotency_key' not in columns:
+        with op.batch_alter_table('measurements') as batch_op:
+            batch_op.add_column(sa.Column('idempotency_key', sa.String(length=64), nullable=True))
+    op.create_index('ix_measurements_idempotency_key', 'measurements', ['idempotency_key'],
+                    unique=True, if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_measurements_idempotency_key', table_name='measurements', if_exists=True)
+    with op.batch_alter_table('measurements') as batch_op:
+        batch_op.drop_column('idempotency_key')
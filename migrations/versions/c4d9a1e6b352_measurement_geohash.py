@@ -0,0 +1,31 @@
+"""geohash column and index on measurements
+
+Revision ID: c4d9a1e6b352
+Revises: 8b5e0d4c2f17
+Create Date: 2026-10-17 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4d9a1e6b352'
+down_revision = '8b5e0d4c2f17'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing rows are filled in by `flask backfill-geohash`
+    columns = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('measurements')}
+    if 'geohash' not in columns:
+        with op.batch_alter_table('measurements') as batch_op:
+            batch_op.add_column(sa.Column('geohash', sa.String(length=12), nullable=True))
+    op.create_index('ix_measurements_geohash', 'measurements', ['geohash'], unique=False, if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_measurements_geohash', table_name='measurements', if_exists=True)
+    with op.batch_alter_table('measurements') as batch_op:
+        batch_op.drop_column('geohash')
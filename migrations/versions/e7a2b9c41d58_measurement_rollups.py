@@ -0,0 +1,45 @@
+"""hourly and daily measurement rollups
+
+Revision ID: e7a2b9c41d58
+Revises: c4d9a1e6b352
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7a2b9c41d58'
+down_revision = 'c4d9a1e6b352'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Filled from history at the next startup (or `flask rebuild-rollups`)
+    if not sa.inspect(op.get_bind()).has_table('measurement_rollups'):
+        op.create_table(
+            'measurement_rollups',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('granularity', sa.String(length=4), nullable=False),
+            sa.Column('bucket_start', sa.DateTime(), nullable=False),
+            sa.Column('user_key', sa.String(length=100), nullable=False),
+            sa.Column('calculation_method', sa.String(length=10), nullable=False),
+            sa.Column('measurement_count', sa.Integer(), nullable=False),
+            sa.Column('accuracy_sum', sa.Float(), nullable=False),
+            sa.Column('accuracy_count', sa.Integer(), nullable=False),
+            sa.Column('latitude_sum', sa.Float(), nullable=False),
+            sa.Column('longitude_sum', sa.Float(), nullable=False),
+            sa.Column('position_count', sa.Integer(), nullable=False),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('granularity', 'bucket_start', 'user_key', 'calculation_method',
+                                name='uq_measurement_rollups_bucket')
+        )
+    op.create_index('ix_measurement_rollups_user_bucket', 'measurement_rollups',
+                    ['granularity', 'user_key', 'bucket_start'], unique=False, if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_measurement_rollups_user_bucket', table_name='measurement_rollups', if_exists=True)
+    op.drop_table('measurement_rollups')
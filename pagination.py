@@ -0,0 +1,94 @@
+# Filtering and keyset pagination for the record listing endpoints
+#
+# Listings are ordered newest first on (timestamp, id). A page ends with an
+# opaque cursor holding the last row's (timestamp, id); the next page asks
+# for rows strictly before it with a row-value comparison, which the
+# composite (filter, timestamp, id) indexes answer with a range scan. Page N
+# therefore costs the same as page 1, unlike OFFSET.
+import base64
+from datetime import datetime, timezone
+
+from database_models import db
+
+DEFAULT_PAGE_SIZE = 50
+
+
+def parse_time(value):
+    """ISO 8601 text as a naive UTC datetime (the storage convention); None passes through."""
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def encode_cursor(timestamp, row_id):
+    text = f"{timestamp.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(text.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """(timestamp, id) from a cursor; raises ValueError if it was not made by encode_cursor."""
+    try:
+        text = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        timestamp, row_id = text.rsplit('|', 1)
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid 'cursor'.")
+
+
+def apply_filters(query, model, args):
+    """Applies user_id, session_id, start/end and calculation_method from request args.
+
+    Raises ValueError on malformed values. calculation_method only applies
+    to models that have the column.
+    """
+    user_id = args.get('user_id')
+    if user_id:
+        query = query.filter(model.user_id == user_id)
+
+    session_id = args.get('session_id')
+    if session_id not in (None, ''):
+        try:
+            query = query.filter(model.session_id == int(session_id))
+        except (TypeError, ValueError):
+            raise ValueError("Invalid 'session_id'.")
+
+    try:
+        start = parse_time(args.get('start'))
+        end = parse_time(args.get('end'))
+    except ValueError:
+        raise ValueError("Invalid 'start' or 'end' (ISO 8601 expected).")
+    if start is not None:
+        query = query.filter(model.timestamp >= start)
+    if end is not None:
+        query = query.filter(model.timestamp < end)
+
+    method = args.get('calculation_method')
+    if method:
+        if not hasattr(model, 'calculation_method'):
+            raise ValueError("'calculation_method' does not apply to this resource.")
+        query = query.filter(model.calculation_method == method)
+    return query
+
+
+def keyset_page(query, model, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """One newest-first page of `query`; returns (rows, next_cursor or None)."""
+    if cursor:
+        timestamp, row_id = decode_cursor(cursor)
+        query = query.filter(db.tuple_(model.timestamp, model.id) < db.tuple_(timestamp, row_id))
+    rows = query.order_by(model.timestamp.desc(), model.id.desc()).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1].timestamp, rows[-1].id)
+
+
+def page_size(args, default=DEFAULT_PAGE_SIZE, maximum=500):
+    """The `limit` argument clamped to 1..maximum."""
+    try:
+        limit = int(args.get('limit', default))
+    except (TypeError, ValueError):
+        raise ValueError("Invalid 'limit'.")
+    return max(1, min(limit, maximum))
@@ -0,0 +1,196 @@
+# Version-invalidated response cache for polled read endpoints
+#
+# Each cached response is stored against the versions of the tables it was
+# built from. Every committed write bumps the versions of the tables it
+# touched (tracked through session events), so a cached entry is served
+# only while none of its tables has changed. Entries carry a strong ETag;
+# a matching If-None-Match is answered 304 from memory without touching
+# the database.
+#
+# Versions live in this process. Writes made by another process (CLI
+# commands, a second server) are only picked up when an entry reaches its
+# TTL, which therefore bounds staleness in multi-process deployments.
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, make_response, request
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+
+class ResponseCache:
+    """Byte-bounded LRU of GET responses keyed by path, query args and table versions."""
+
+    def __init__(self, max_bytes=32 * 1024 * 1024, ttl_s=30.0):
+        self.max_bytes = max_bytes
+        self.ttl_s = ttl_s
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def bump(self, tables):
+        """Invalidates every entry built from any of `tables`."""
+        with self._lock:
+            for table in tables:
+                self._versions[table] = self._versions.get(table, 0) + 1
+
+    def _version_vector(self, tables):
+        with self._lock:
+            return tuple(self._versions.get(table, 0) for table in tables)
+
+    def _lookup(self, key, versions, now):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry['versions'] != versions or now - entry['stored_at'] > self.ttl_s:
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= len(entry['body'])
+
+    def _store(self, key, entry):
+        size = len(entry['body'])
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _respond(self, entry, response_class):
+        if entry['etag'] in request.if_none_match:
+            with self._lock:
+                self.not_modified += 1
+            response = response_class(status=304)
+        else:
+            response = response_class(entry['body'], status=200, mimetype=entry['mimetype'])
+        response.set_etag(entry['etag'])
+        response.cache_control.no_cache = True
+        return response
+
+    def cached(self, *tables):
+        """Decorator for GET views whose output depends only on `tables` and the query string."""
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if not self.enabled or request.method != 'GET':
+                    return view(*args, **kwargs)
+
+                key = (request.path, tuple(sorted((name, tuple(values)) for name, values in request.args.lists())))
+                # Versions are read before the view runs, so a result built
+                # from pre-commit data is stored under the superseded versions
+                versions = self._version_vector(tables)
+                now = time.monotonic()
+                entry = self._lookup(key, versions, now)
+                if entry is not None:
+                    response = self._respond(entry, current_app.response_class)
+                    response.headers['X-Cache'] = 'HIT'
+                    return response
+
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200 or response.direct_passthrough or response.is_streamed:
+                    return response
+                body = response.get_data()
+                entry = {
+                    'versions': versions,
+                    'etag': hashlib.sha256(body).hexdigest()[:32],
+                    'body': body,
+                    'mimetype': response.mimetype,
+                    'stored_at': now,
+                }
+                self._store(key, entry)
+                response = self._respond(entry, current_app.response_class)
+                response.headers['X-Cache'] = 'MISS'
+                return response
+            return wrapper
+        return decorator
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def metrics(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'maxBytes': self.max_bytes,
+                'ttlSeconds': self.ttl_s,
+                'hits': self.hits,
+                'misses': self.misses,
+                'notModified': self.not_modified,
+                'evictions': self.evictions,
+                'hitRatio': self.hits / lookups if lookups else 0.0,
+                'tableVersions': dict(self._versions),
+            }
+
+
+# ====================================================================
+# --- WRITE TRACKING ---
+# ====================================================================
+# Tables written in a session are collected in session.info and their
+# versions bumped only after the transaction commits.
+
+_TOUCHED = 'response_cache_touched_tables'
+
+
+def _touch(session, tables):
+    session.info.setdefault(_TOUCHED, set()).update(tables)
+
+
+def register_version_listeners(cache):
+    """Bumps `cache` table versions whenever an ORM session commits writes."""
+
+    def after_flush(session, flush_context):
+        _touch(session, {
+            obj.__table__.name
+            for objects in (session.new, session.dirty, session.deleted)
+            for obj in objects
+            if hasattr(obj, '__table__')
+        })
+
+    def on_orm_execute(orm_execute_state):
+        if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+            mapper = orm_execute_state.bind_mapper
+            if mapper is not None:
+                _touch(orm_execute_state.session, {table.name for table in mapper.tables})
+
+    def after_commit(session):
+        tables = session.info.pop(_TOUCHED, None)
+        if tables:
+            cache.bump(tables)
+
+    def after_rollback(session):
+        session.info.pop(_TOUCHED, None)
+
+    event.listen(Session, 'after_flush', after_flush)
+    event.listen(Session, 'do_orm_execute', on_orm_execute)
+    event.listen(Session, 'after_commit', after_commit)
+    event.listen(Session, 'after_rollback', after_rollback)
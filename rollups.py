@@ -0,0 +1,219 @@
+# Hourly and daily rollups of measurement activity
+#
+# MeasurementRollup keeps, per (granularity, bucket, user, method), the
+# measurement count and the sums behind mean accuracy and mean position.
+# Dashboards chart months of activity from a few hundred rollup rows
+# instead of scanning the measurement table. The rows are adjusted in the
+# same transaction as the measurements they describe, through the same
+# session events as app_stats:
+#   - objects added or deleted through the ORM session (after_flush)
+#   - bulk `db.insert(Measurement)` executemany and `Query.delete()`
+#     statements (do_orm_execute)
+# Updates to existing measurements are not tracked, as in app_stats.
+#
+# `rebuild_rollups` recomputes the table from history in one streaming pass;
+# `flask --app main rebuild-rollups` runs it.
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session
+
+from database_models import db, Measurement, MeasurementRollup
+from upsert import upsert
+
+GRANULARITIES = ('hour', 'day')
+GROUP_BY = ('calculation_method', 'user_id')
+
+_REBUILD_CHUNK_ROWS = 10000
+_rollups = MeasurementRollup.__table__
+
+_KEY_COLUMNS = ('granularity', 'bucket_start', 'user_key', 'calculation_method')
+# Sums kept per bucket, in the order _Delta stores them
+_SUM_COLUMNS = ('measurement_count', 'accuracy_sum', 'accuracy_count',
+                'latitude_sum', 'longitude_sum', 'position_count')
+
+
+def bucket_start(timestamp, granularity):
+    if granularity == 'hour':
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def bucket_step(granularity):
+    return timedelta(hours=1) if granularity == 'hour' else timedelta(days=1)
+
+
+class _Delta:
+    """Rollup adjustments accumulated for one flush or statement."""
+
+    def __init__(self):
+        self.sums = {}
+
+    def add(self, sign, timestamp, user_id, method, accuracy, latitude, longitude):
+        if timestamp is None:
+            timestamp = datetime.utcnow()
+        has_position = latitude is not None and longitude is not None
+        values = (
+            sign,
+            sign * (accuracy or 0.0),
+            sign * int(accuracy is not None),
+            sign * latitude if has_position else 0.0,
+            sign * longitude if has_position else 0.0,
+            sign * int(has_position),
+        )
+        for granularity in GRANULARITIES:
+            key = (granularity, bucket_start(timestamp, granularity), user_id or '', method or 'unknown')
+            current = self.sums.get(key)
+            self.sums[key] = values if current is None else tuple(a + b for a, b in zip(current, values))
+
+    def apply(self, connection):
+        emptied = False
+        for (granularity, start, user_key, method), values in self.sums.items():
+            increments = {name: _rollups.c[name] + value for name, value in zip(_SUM_COLUMNS, values)}
+            if values[0] > 0:
+                # Concurrent first writes to a bucket meet in the upsert, not the unique constraint
+                upsert(connection, _rollups, _KEY_COLUMNS,
+                       dict(zip(_KEY_COLUMNS, (granularity, start, user_key, method)), **dict(zip(_SUM_COLUMNS, values))),
+                       increments)
+            else:
+                # Removals only touch buckets that already hold the rows being removed
+                connection.execute(
+                    _rollups.update()
+                    .where(_rollups.c.granularity == granularity, _rollups.c.bucket_start == start,
+                           _rollups.c.user_key == user_key, _rollups.c.calculation_method == method)
+                    .values(increments)
+                )
+                emptied = True
+        if emptied:
+            connection.execute(_rollups.delete().where(_rollups.c.measurement_count <= 0))
+
+
+def _after_flush(session, flush_context):
+    delta = _Delta()
+    for sign, objects in ((1, session.new), (-1, session.deleted)):
+        for obj in objects:
+            if isinstance(obj, Measurement):
+                delta.add(sign, obj.timestamp, obj.user_id, obj.calculation_method,
+                          obj.accuracy, obj.latitude, obj.longitude)
+    if delta.sums:
+        delta.apply(session.connection())
+
+
+def _on_orm_execute(orm_execute_state):
+    if not (orm_execute_state.is_insert or orm_execute_state.is_delete):
+        return None
+    mapper = orm_execute_state.bind_mapper
+    if mapper is None or mapper.class_ is not Measurement:
+        return None
+
+    connection = orm_execute_state.session.connection()
+    delta = _Delta()
+    if orm_execute_state.is_insert:
+        rows = orm_execute_state.parameters
+        rows = rows if isinstance(rows, list) else [rows] if rows else []
+        if not rows:
+            # INSERT..SELECT or values() forms: rebuild_rollups() catches up
+            return None
+        default_method = Measurement.__table__.c.calculation_method.default.arg
+        for row in rows:
+            delta.add(1, row.get('timestamp'), row.get('user_id'), row.get('calculation_method', default_method),
+                      row.get('accuracy'), row.get('latitude'), row.get('longitude'))
+    else:
+        # The rows about to go are read once, grouped in Python: bucketing is portable that way
+        query = select(Measurement.timestamp, Measurement.user_id, Measurement.calculation_method,
+                       Measurement.accuracy, Measurement.latitude, Measurement.longitude)
+        where = orm_execute_state.statement.whereclause
+        if where is not None:
+            query = query.where(where)
+        for row in connection.execute(query):
+            delta.add(-1, *row)
+
+    result = orm_execute_state.invoke_statement()
+    if delta.sums:
+        delta.apply(connection)
+    return result
+
+
+def register_rollup_listeners():
+    """Keeps MeasurementRollup in step with every ORM session."""
+    if not event.contains(Session, 'after_flush', _after_flush):
+        event.listen(Session, 'after_flush', _after_flush)
+        event.listen(Session, 'do_orm_execute', _on_orm_execute)
+
+
+def rollups_seeded():
+    """False when measurements exist but no rollup row does (e.g. right after the migration)."""
+    has_rollups = db.session.execute(select(_rollups.c.id).limit(1)).first() is not None
+    return has_rollups or db.session.execute(select(Measurement.id).limit(1)).first() is None
+
+
+def rebuild_rollups():
+    """Recomputes every rollup row from the measurement table; returns rows written.
+
+    Measurements are streamed once in timestamp order and bucketed as they
+    come, so memory holds the rollup rows, not the history.
+    """
+    delta = _Delta()
+    rows = db.session.execute(
+        select(Measurement.timestamp, Measurement.user_id, Measurement.calculation_method,
+               Measurement.accuracy, Measurement.latitude, Measurement.longitude)
+        .execution_options(yield_per=_REBUILD_CHUNK_ROWS)
+    )
+    for row in rows:
+        delta.add(1, *row)
+
+    connection = db.session.connection()
+    connection.execute(_rollups.delete())
+    records = [
+        dict(granularity=granularity, bucket_start=start, user_key=user_key, calculation_method=method,
+             **dict(zip(_SUM_COLUMNS, values)))
+        for (granularity, start, user_key, method), values in delta.sums.items()
+    ]
+    for first in range(0, len(records), _REBUILD_CHUNK_ROWS):
+        connection.execute(_rollups.insert(), records[first:first + _REBUILD_CHUNK_ROWS])
+    db.session.commit()
+    return len(records)
+
+
+def read_rollup(granularity, start, end, user_id=None, calculation_method=None, group_by=None):
+    """Time series of rollup buckets in [start, end), oldest first.
+
+    Each point has the bucket start, measurement count, mean accuracy and
+    mean position; with group_by ('calculation_method' or 'user_id') there
+    is one point per bucket and group.
+    """
+    columns = [MeasurementRollup.bucket_start]
+    if group_by == 'calculation_method':
+        columns.append(MeasurementRollup.calculation_method)
+    elif group_by == 'user_id':
+        columns.append(MeasurementRollup.user_key)
+    query = (
+        select(*columns, *(func.sum(_rollups.c[name]) for name in _SUM_COLUMNS))
+        .where(MeasurementRollup.granularity == granularity,
+               MeasurementRollup.bucket_start >= start,
+               MeasurementRollup.bucket_start < end)
+        .group_by(*columns)
+        .order_by(*columns)
+    )
+    if user_id:
+        query = query.where(MeasurementRollup.user_key == user_id)
+    if calculation_method:
+        query = query.where(MeasurementRollup.calculation_method == calculation_method)
+
+    points = []
+    for row in db.session.execute(query):
+        bucket, group = row[0], row[1] if group_by else None
+        count, accuracy_sum, accuracy_count, latitude_sum, longitude_sum, position_count = row[-6:]
+        point = {
+            'bucket': bucket.isoformat(),
+            'count': count,
+            'averageAccuracy': accuracy_sum / accuracy_count if accuracy_count else None,
+            'latitude': latitude_sum / position_count if position_count else None,
+            'longitude': longitude_sum / position_count if position_count else None,
+        }
+        if group_by == 'calculation_method':
+            point['calculationMethod'] = group
+        elif group_by == 'user_id':
+            point['userId'] = group or None
+        points.append(point)
+    return points
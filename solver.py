@@ -0,0 +1,500 @@
+# Solar navigation solver for CelestiNav
+#
+# Kept free of Flask and database imports so solver pool worker processes
+# can import it without building the web app.
+import numpy as np
+from scipy.optimize import minimize, least_squares
+import warnings
+
+from ephemeris_cache import ephemeris_cache
+from solar_ephemeris import SolarEphemeris, sun_position, sun_position_with_partials
+
+# ====================================================================
+# --- SOLAR CALCULATION LOGIC ---
+# ====================================================================
+
+# Ignore RuntimeWarning from numpy/scipy when invalid values occur near boundaries
+warnings.filterwarnings("ignore", category=RuntimeWarning)
+
+def _refraction_formula(true_altitude_deg):
+    """Refraction in degrees at the reference conditions (1010 hPa, 10 C)."""
+    h = true_altitude_deg
+    return 1.0 / (np.tan(np.radians(h + 7.31 / (h + 4.4))) + 0.0013519) / 60.0
+
+def _refraction_formula_derivative(true_altitude_deg):
+    h = true_altitude_deg
+    u = np.radians(h + 7.31 / (h + 4.4))
+    du_dh = np.radians(1.0 - 7.31 / (h + 4.4) ** 2)
+    return -du_dh / (np.cos(u) ** 2 * (np.tan(u) + 0.0013519) ** 2) / 60.0
+
+# Altitude-indexed refraction table at reference conditions. Linear
+# interpolation on the 0.01 deg grid stays within 0.04 arc-seconds of the
+# formula. Below -2 deg the formula turns over towards its pole at -4.4 deg,
+# so the -2 deg value is held down to the -5 deg cutoff.
+REFRACTION_TABLE_MIN_DEG = -2.0
+REFRACTION_TABLE_STEP_DEG = 0.01
+_REFRACTION_GRID = np.arange(REFRACTION_TABLE_MIN_DEG, 90.0 + REFRACTION_TABLE_STEP_DEG / 2, REFRACTION_TABLE_STEP_DEG)
+_REFRACTION_TABLE = _refraction_formula(_REFRACTION_GRID)
+_REFRACTION_DERIVATIVE_TABLE = _refraction_formula_derivative(_REFRACTION_GRID)
+
+def _refraction_scale(pressure, temperature):
+    """Pressure (hPa) and temperature (C) scaling relative to the table's reference conditions."""
+    return (pressure / 1010.0) * (283.0 / (273.0 + temperature))
+
+def atmospheric_refraction(true_altitude_deg, pressure=1013.25, temperature=15):
+    """Calculates atmospheric refraction correction (scalar or array)."""
+    R = np.interp(true_altitude_deg, _REFRACTION_GRID, _REFRACTION_TABLE)
+    R = R * _refraction_scale(pressure, temperature)
+    return np.where(np.less(true_altitude_deg, -5), 0.0, R)[()]
+
+def atmospheric_refraction_derivative(true_altitude_deg, pressure=1013.25, temperature=15):
+    """Derivative of atmospheric_refraction with respect to true altitude (deg/deg)."""
+    dR = np.interp(true_altitude_deg, _REFRACTION_GRID, _REFRACTION_DERIVATIVE_TABLE)
+    dR = dR * _refraction_scale(pressure, temperature)
+    below_table = np.less(true_altitude_deg, REFRACTION_TABLE_MIN_DEG)
+    return np.where(below_table, 0.0, dR)[()]
+
+def _meteorology(obs_data):
+    """(pressure hPa, temperature C) of a sighting, defaulting to standard conditions."""
+    return obs_data.get('pressure', 1013.25), obs_data.get('temperature', 15.0)
+
+def calculate_error_and_gradient(coords, obs_data):
+    """Weighted squared error to minimize and its analytic gradient, for minimize(jac=True).
+
+    Altitude error is weighted 10:1 over azimuth for stability. The azimuth
+    residual is wrapped into [-180, 180) so its derivative stays continuous
+    across north, and the altitude residual is differentiated through the
+    refraction correction.
+    """
+    lat, lon = coords
+    try:
+        ephemeris = obs_data.get('ephemeris') or ephemeris_cache.get(obs_data['utc_time'])
+        elevation = obs_data.get('elevation', 0.0)
+        true_alt, true_az, partials = sun_position_with_partials(ephemeris, lat, lon, elevation)
+        d_alt_d_lat, d_alt_d_lon, d_az_d_lat, d_az_d_lon = partials
+
+        pressure, temperature = _meteorology(obs_data)
+        apparent_alt = true_alt + atmospheric_refraction(true_alt, pressure, temperature)
+        d_app_d_alt = 1.0 + atmospheric_refraction_derivative(true_alt, pressure, temperature)
+
+        alt_residual = apparent_alt - obs_data['altitude']
+        az_residual = (true_az - obs_data['azimuth'] + 180) % 360 - 180
+
+        value = alt_residual**2 * 10 + az_residual**2
+        gradient = np.array([
+            20 * alt_residual * d_app_d_alt * d_alt_d_lat + 2 * az_residual * d_az_d_lat,
+            20 * alt_residual * d_app_d_alt * d_alt_d_lon + 2 * az_residual * d_az_d_lon,
+        ])
+        return value, gradient
+
+    except Exception:
+        return float('inf'), np.zeros(2)
+
+def rough_initial_guess(obs_data):
+    """Crude (lat, lon) from the sun's declination and hour angle."""
+    ephemeris = obs_data.get('ephemeris') or ephemeris_cache.get(obs_data['utc_time'])
+    alt_obs = obs_data['altitude']
+    az_obs = obs_data['azimuth']
+    
+    # 1.1. Solar Declination (Delta)
+    declination = ephemeris.declination
+
+    # 1.2. Rough Latitude Guess
+    rough_lat = np.clip(90 - alt_obs + declination, -89.9, 89.9)
+
+    # 1.3. Rough Longitude Guess (Hour Angle approximation)
+    sin_alt = np.sin(np.radians(alt_obs))
+    sin_lat_sin_dec = np.sin(np.radians(rough_lat)) * np.sin(np.radians(declination))
+    cos_lat_cos_dec = np.cos(np.radians(rough_lat)) * np.cos(np.radians(declination))
+    
+    H_deg = 0.0
+    if cos_lat_cos_dec != 0:
+        H_arg = (sin_alt - sin_lat_sin_dec) / cos_lat_cos_dec
+        H_arg = np.clip(H_arg, -1.0, 1.0)
+        
+        H_rad = np.arccos(H_arg)
+        H_deg = np.degrees(H_rad)
+        
+    if az_obs < 180:
+        H_deg = -H_deg
+
+    # Local hour angle = GHA + longitude
+    rough_lon = H_deg - ephemeris.gha
+    rough_lon = (rough_lon + 180) % 360 - 180
+    
+    return (rough_lat, rough_lon)
+
+# Direct sight reduction settings
+SOLVER_METHODS = ('direct', 'optimize')
+NEWTON_MAX_ITERATIONS = 8
+NEWTON_TOLERANCE_DEG = 1e-9
+
+def _sight_candidates(obs_data):
+    """Closed-form positions consistent with one altitude/azimuth sight.
+
+    Solves the navigational triangle (pole, observer, sun subpoint) on a
+    sphere: with zenith distance z and azimuth A known,
+        sin(dec) = sin(lat) cos(z) + cos(lat) sin(z) cos(A)
+    has up to two latitude roots, and the hour angle follows from the sine
+    and cosine rules. Refraction is removed approximately from the observed
+    altitude; Newton refinement folds the exact model back in.
+    """
+    ephemeris = obs_data['ephemeris']
+    alt_obs = obs_data['altitude']
+    true_alt = alt_obs - atmospheric_refraction(alt_obs, *_meteorology(obs_data))
+
+    z = np.radians(90.0 - true_alt)
+    A = np.radians(obs_data['azimuth'])
+    dec = np.radians(ephemeris.declination)
+
+    a = np.cos(z)
+    b = np.sin(z) * np.cos(A)
+    c = np.sin(dec)
+    r = np.hypot(a, b)
+    if r == 0 or abs(c) > r:
+        return []
+
+    theta = np.arctan2(b, a)
+    root = np.arcsin(c / r)
+    candidates = []
+    for lat in (root - theta, np.pi - root - theta):
+        lat = (lat + np.pi) % (2 * np.pi) - np.pi
+        if abs(lat) >= np.pi / 2:
+            continue
+        sin_H = -np.sin(A) * np.sin(z) / np.cos(dec)
+        cos_H = (np.cos(z) - np.sin(lat) * c) / (np.cos(lat) * np.cos(dec))
+        lha = np.degrees(np.arctan2(sin_H, cos_H))
+        lon = (lha - ephemeris.gha + 180) % 360 - 180
+        candidates.append((float(np.degrees(lat)), float(lon)))
+    return candidates
+
+def _newton_refine(coords, obs_data):
+    """Newton iterations on the (altitude, azimuth) residuals.
+
+    Returns (lat, lon, iterations), or None if the Jacobian is singular or
+    the iteration does not converge.
+    """
+    ephemeris = obs_data['ephemeris']
+    elevation = obs_data.get('elevation', 0.0)
+    pressure, temperature = _meteorology(obs_data)
+    lat, lon = coords
+    for iteration in range(1, NEWTON_MAX_ITERATIONS + 1):
+        true_alt, true_az, partials = sun_position_with_partials(ephemeris, lat, lon, elevation)
+        d_alt_d_lat, d_alt_d_lon, d_az_d_lat, d_az_d_lon = partials
+        d_app_d_alt = 1.0 + atmospheric_refraction_derivative(true_alt, pressure, temperature)
+
+        residual = np.array([
+            true_alt + atmospheric_refraction(true_alt, pressure, temperature) - obs_data['altitude'],
+            (true_az - obs_data['azimuth'] + 180) % 360 - 180,
+        ])
+        jacobian = np.array([
+            [d_app_d_alt * d_alt_d_lat, d_app_d_alt * d_alt_d_lon],
+            [d_az_d_lat, d_az_d_lon],
+        ])
+        try:
+            step = np.linalg.solve(jacobian, -residual)
+        except np.linalg.LinAlgError:
+            return None
+        if not np.all(np.isfinite(step)):
+            return None
+
+        lat += step[0]
+        lon = (lon + step[1] + 180) % 360 - 180
+        if abs(lat) > 90:
+            return None
+        if np.max(np.abs(step)) < NEWTON_TOLERANCE_DEG:
+            return lat, lon, iteration
+    return None
+
+def reduce_sight_direct(obs_data, reference=None):
+    """Direct sight reduction: closed-form inversion plus Newton refinement.
+
+    A single sight can be consistent with two positions; the one nearest
+    `reference` (default: the rough initial guess) is returned. Returns
+    (lat, lon, iterations) or None when no candidate converges.
+    """
+    if reference is None:
+        reference = rough_initial_guess(obs_data)
+    ref_lat, ref_lon = np.radians(reference)
+
+    best = None
+    for candidate in _sight_candidates(obs_data):
+        fix = _newton_refine(candidate, obs_data)
+        if fix is None:
+            continue
+        lat, lon = np.radians(fix[:2])
+        # Angular distance to the reference point
+        distance = np.arccos(np.clip(
+            np.sin(lat) * np.sin(ref_lat) + np.cos(lat) * np.cos(ref_lat) * np.cos(lon - ref_lon), -1.0, 1.0))
+        if best is None or distance < best[0]:
+            best = (distance, fix)
+    return best[1] if best else None
+
+def estimate_location_api(obs_data, diagnostics=None, method='direct'):
+    """Estimates location from a single sun sight.
+
+    `method='direct'` inverts the sight in closed form and refines it with
+    Newton steps, falling back to iterative optimization if that does not
+    converge. `method='optimize'` always runs L-BFGS-B from a robust initial
+    guess. If `diagnostics` is a dict it is filled with the method used and
+    the solver's iteration and objective-evaluation counts.
+    """
+    if method not in SOLVER_METHODS:
+        raise ValueError(f"Unknown solver method: {method}")
+
+    # Solar quantities depend only on the timestamp; compute them once for all
+    # objective evaluations instead of once per call, served from the shared
+    # time-bucketed cache. Batch callers pass them in.
+    if 'ephemeris' not in obs_data:
+        obs_data = dict(obs_data, ephemeris=ephemeris_cache.get(obs_data['utc_time']))
+
+    # --- 1. Robust Initial Guess ---
+    initial_guess = rough_initial_guess(obs_data)
+
+    if method == 'direct':
+        fix = reduce_sight_direct(obs_data, reference=initial_guess)
+        if fix is not None:
+            lat, lon, iterations = fix
+            if diagnostics is not None:
+                diagnostics['method'] = 'direct'
+                diagnostics['fallback'] = False
+                diagnostics['iterations'] = iterations
+                diagnostics['function_evaluations'] = iterations
+                diagnostics['success'] = True
+            return lat, lon
+
+    # --- 2. Run Minimization ---
+    bounds = [(-90, 90), (-180, 180)]
+
+    result = minimize(
+        calculate_error_and_gradient,
+        initial_guess,
+        args=(obs_data,),
+        method='L-BFGS-B',
+        jac=True,
+        bounds=bounds,
+        options={'maxiter': 1000, 'ftol': 1e-6}
+    )
+
+    if diagnostics is not None:
+        diagnostics['method'] = 'optimize'
+        diagnostics['fallback'] = method != 'optimize'
+        diagnostics['iterations'] = int(result.nit)
+        diagnostics['function_evaluations'] = int(result.nfev)
+        diagnostics['success'] = bool(result.success)
+
+    if result.success:
+        return result.x[0], result.x[1]
+    else:
+        print(f"Optimization failed. Returning initial guess: {initial_guess}")
+        return initial_guess 
+
+def solve_sight(obs_data, method='direct'):
+    """estimate_location_api returning (lat, lon, diagnostics).
+
+    Picklable entry point for solver pool workers, which cannot fill a
+    diagnostics dict owned by the parent process.
+    """
+    diagnostics = {}
+    lat, lon = estimate_location_api(obs_data, diagnostics=diagnostics, method=method)
+    return float(lat), float(lon), diagnostics
+
+def degraded_fix(obs_data):
+    """Rough initial guess flagged as degraded, for when the solver misses its deadline."""
+    lat, lon = rough_initial_guess(obs_data)
+    return float(lat), float(lon), {'method': 'rough', 'degraded': True, 'success': False}
+
+# Default 1-sigma sensor noise for multi-sight fixes. The ratio matches the
+# 10:1 altitude/azimuth weighting of calculate_error_and_gradient.
+SIGHT_SIGMA_ALTITUDE_DEG = 0.5
+SIGHT_SIGMA_AZIMUTH_DEG = 0.5 * np.sqrt(10)
+EARTH_RADIUS_M = 6371008.8
+
+def _multi_sight_residuals(coords, sightings, ephemeris, sigma_alt, sigma_az):
+    """Whitened residual vector and Jacobian over all sightings in one pass."""
+    lat, lon = coords
+    true_alt, true_az, partials = sun_position_with_partials(ephemeris, lat, lon, sightings['elevation'])
+    d_alt_d_lat, d_alt_d_lon, d_az_d_lat, d_az_d_lon = partials
+    refraction = atmospheric_refraction(true_alt, sightings['pressure'], sightings['temperature'])
+    d_app_d_alt = 1.0 + atmospheric_refraction_derivative(true_alt, sightings['pressure'], sightings['temperature'])
+
+    alt_residual = (true_alt + refraction - sightings['altitude']) / sigma_alt
+    az_residual = ((true_az - sightings['azimuth'] + 180) % 360 - 180) / sigma_az
+    residuals = np.concatenate([alt_residual, az_residual])
+    jacobian = np.concatenate([
+        np.column_stack([d_app_d_alt * d_alt_d_lat, d_app_d_alt * d_alt_d_lon]) / sigma_alt,
+        np.column_stack([d_az_d_lat, d_az_d_lon]) / sigma_az,
+    ])
+    return residuals, jacobian
+
+def _sighting_arrays(observations):
+    """Per-field NumPy arrays over obs_data dicts, for _multi_sight_residuals."""
+    return {
+        key: np.array([obs.get(key, default) for obs in observations], dtype=float)
+        for key, default in (('altitude', None), ('azimuth', None), ('elevation', 0.0),
+                             ('pressure', 1013.25), ('temperature', 15.0))
+    }
+
+def estimate_location_multi(observations, sigma_alt=SIGHT_SIGMA_ALTITUDE_DEG,
+                            sigma_az=SIGHT_SIGMA_AZIMUTH_DEG, diagnostics=None):
+    """Joint weighted least-squares fix from several sightings.
+
+    `observations` is a list of obs_data dicts (utc_time, altitude, azimuth,
+    elevation, pressure, temperature). All sightings are solved together for
+    one position; the sun's motion between them is what constrains the
+    solution. Returns (lat, lon, covariance) with the 2x2 covariance in deg^2
+    (lat, lon), scaled up by the reduced chi-square when the residuals are
+    larger than the assumed sensor noise.
+    """
+    sightings = _sighting_arrays(observations)
+    ephemeris = ephemeris_cache.compute([obs['utc_time'] for obs in observations])
+
+    def residuals(coords):
+        return _multi_sight_residuals(coords, sightings, ephemeris, sigma_alt, sigma_az)[0]
+
+    def jacobian(coords):
+        return _multi_sight_residuals(coords, sightings, ephemeris, sigma_alt, sigma_az)[1]
+
+    # Start from every closed-form candidate of the first sighting, so the
+    # joint solution can reject the mirror position a single sight allows.
+    first = dict(observations[0], ephemeris=SolarEphemeris(*(float(f[0]) for f in ephemeris)))
+    starts = _sight_candidates(first) or [rough_initial_guess(first)]
+
+    best = None
+    for start in starts:
+        result = least_squares(residuals, start, jac=jacobian,
+                               bounds=([-90, -540], [90, 540]), x_scale=1.0)
+        if best is None or result.cost < best.cost:
+            best = result
+
+    lat, lon = best.x
+    lon = (lon + 180) % 360 - 180
+    dof = max(best.fun.size - 2, 1)
+    variance_factor = max(1.0, 2 * best.cost / dof)
+    try:
+        covariance = np.linalg.inv(best.jac.T @ best.jac) * variance_factor
+    except np.linalg.LinAlgError:
+        covariance = np.full((2, 2), np.inf)
+
+    if diagnostics is not None:
+        diagnostics['method'] = 'least_squares'
+        diagnostics['iterations'] = int(best.njev)
+        diagnostics['function_evaluations'] = int(best.nfev)
+        diagnostics['success'] = bool(best.success)
+        diagnostics['rms_residual'] = float(np.sqrt(np.mean(best.fun ** 2)))
+    return float(lat), float(lon), covariance
+
+def error_ellipse(lat, covariance):
+    """1-sigma error ellipse in metres from a (lat, lon) covariance in deg^2.
+
+    Returns (semi_major_m, semi_minor_m, orientation_deg), the orientation
+    being the bearing of the major axis clockwise from north in [0, 180).
+    """
+    scale = np.diag([np.radians(1.0) * EARTH_RADIUS_M,
+                     np.radians(1.0) * EARTH_RADIUS_M * np.cos(np.radians(lat))])
+    cov_m = scale @ covariance @ scale
+    if not np.all(np.isfinite(cov_m)):
+        return float('inf'), float('inf'), 0.0
+    eigenvalues, eigenvectors = np.linalg.eigh(cov_m)
+    north, east = eigenvectors[:, 1]
+    orientation = np.degrees(np.arctan2(east, north)) % 180
+    return (float(np.sqrt(max(eigenvalues[1], 0.0))),
+            float(np.sqrt(max(eigenvalues[0], 0.0))),
+            float(orientation))
+
+# ====================================================================
+# --- TRACKING MODE ---
+# ====================================================================
+# A device streaming sightings in one session is tracked with an iterated
+# Kalman update: the predicted position from the session's previous fix is
+# both the starting point of Gauss-Newton iterations and a prior that the
+# new sight is weighed against. Noisy compass headings then move the fix
+# only as far as their uncertainty allows.
+
+TRACK_MAX_ITERATIONS = 10
+TRACK_TOLERANCE_DEG = 1e-7
+# A sight whose combined misfit exceeds this (chi-square, 2 dof, p = 0.001)
+# disagrees with the track, and the session is re-initialised from it alone
+TRACK_GATE_CHI2 = 13.8
+
+def sight_covariance(obs_data, lat, lon, sigma_alt=SIGHT_SIGMA_ALTITUDE_DEG, sigma_az=SIGHT_SIGMA_AZIMUTH_DEG):
+    """(lat, lon) covariance in deg^2 of a fix from one sighting alone."""
+    _, jacobian = _multi_sight_residuals((lat, lon), _sighting_arrays([obs_data]),
+                                         obs_data['ephemeris'], sigma_alt, sigma_az)
+    try:
+        return np.linalg.inv(jacobian.T @ jacobian)
+    except np.linalg.LinAlgError:
+        return np.full((2, 2), np.inf)
+
+def track_update(obs_data, prior, prior_covariance, sigma_alt=SIGHT_SIGMA_ALTITUDE_DEG,
+                 sigma_az=SIGHT_SIGMA_AZIMUTH_DEG):
+    """Measurement update of a predicted (lat, lon) with one sighting.
+
+    Minimizes the whitened sight residuals plus the Mahalanobis distance
+    from `prior`, starting at `prior`. Returns (lat, lon, covariance,
+    chi2, iterations), or None if the iteration fails to converge.
+    """
+    sightings = _sighting_arrays([obs_data])
+    prior = np.asarray(prior, dtype=float)
+    try:
+        information = np.linalg.inv(prior_covariance)
+    except np.linalg.LinAlgError:
+        return None
+
+    coords = prior.copy()
+    for iteration in range(1, TRACK_MAX_ITERATIONS + 1):
+        residuals, jacobian = _multi_sight_residuals(coords, sightings, obs_data['ephemeris'], sigma_alt, sigma_az)
+        offset = np.array([coords[0] - prior[0], (coords[1] - prior[1] + 180) % 360 - 180])
+        hessian = jacobian.T @ jacobian + information
+        try:
+            step = -np.linalg.solve(hessian, jacobian.T @ residuals + information @ offset)
+        except np.linalg.LinAlgError:
+            return None
+        if not np.all(np.isfinite(step)):
+            return None
+        coords = coords + step
+        if abs(coords[0]) > 90:
+            return None
+        if np.max(np.abs(step)) < TRACK_TOLERANCE_DEG:
+            break
+    else:
+        return None
+
+    residuals, jacobian = _multi_sight_residuals(coords, sightings, obs_data['ephemeris'], sigma_alt, sigma_az)
+    offset = np.array([coords[0] - prior[0], (coords[1] - prior[1] + 180) % 360 - 180])
+    chi2 = float(residuals @ residuals + offset @ information @ offset)
+    covariance = np.linalg.inv(jacobian.T @ jacobian + information)
+    lon = (coords[1] + 180) % 360 - 180
+    return float(coords[0]), float(lon), covariance, chi2, iteration
+
+def solve_tracked(obs_data, prior=None, prior_covariance=None, method='direct',
+                  sigma_alt=SIGHT_SIGMA_ALTITUDE_DEG, sigma_az=SIGHT_SIGMA_AZIMUTH_DEG):
+    """Tracking-mode fix: (lat, lon, covariance, diagnostics).
+
+    With a predicted `prior` the sight is folded into it by track_update; a
+    session without one, or a sight failing the chi-square gate, is solved
+    cold by estimate_location_api and starts a new track. Picklable entry
+    point for solver pool workers, like solve_sight.
+    """
+    if 'ephemeris' not in obs_data:
+        obs_data = dict(obs_data, ephemeris=ephemeris_cache.get(obs_data['utc_time']))
+
+    reset = False
+    if prior is not None:
+        update = track_update(obs_data, prior, prior_covariance, sigma_alt, sigma_az)
+        if update is not None and update[3] <= TRACK_GATE_CHI2:
+            lat, lon, covariance, chi2, iterations = update
+            return lat, lon, covariance, {
+                'method': 'track',
+                'iterations': iterations,
+                'function_evaluations': iterations + 1,
+                'success': True,
+                'warm_start': True,
+                'reset': False,
+                'chi2': chi2,
+            }
+        reset = True
+
+    lat, lon, diagnostics = solve_sight(obs_data, method)
+    diagnostics.update(warm_start=False, reset=reset)
+    return lat, lon, sight_covariance(obs_data, lat, lon, sigma_alt, sigma_az), diagnostics
@@ -0,0 +1,171 @@
+# Process-pool executor for the navigation solver
+#
+# Solver work is CPU-bound NumPy/SciPy code that holds the GIL, so running it
+# in the Flask request thread neither spreads across cores nor bounds how long
+# a pathological sighting can hold a worker. SolverPool runs it in warm worker
+# processes and lets callers wait with a deadline.
+#
+# A worker killed by the OOM killer or a signal breaks the whole executor.
+# The pool then replaces it with a fresh one, and calls caught by the break
+# are solved in the calling thread instead of failing.
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timezone
+
+
+def _warm_worker():
+    """Pool initializer: import the solver and prime the ephemeris code paths."""
+    import solver
+    from solar_ephemeris import solar_ephemeris, sun_position
+    sun_position(solar_ephemeris(datetime.now(timezone.utc)), 0.0, 0.0)
+    solver.atmospheric_refraction(45.0)
+
+
+def _timed_call(fn, args):
+    """Runs fn(*args) in the worker and reports its busy time."""
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started
+
+
+class SolverPool:
+    """Bounded process pool with deadline-aware submission and load metrics.
+
+    With `workers=0` the pool is disabled and `run` executes inline in the
+    calling thread; deadlines are then not enforced.
+    """
+
+    def __init__(self, workers=0, deadline_ms=2000, start_method='fork'):
+        self.workers = workers
+        self.deadline_ms = deadline_ms
+        self.start_method = start_method
+        self._executor = None
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._in_flight = 0
+        self._completed = 0
+        self._timeouts = 0
+        self._restarts = 0
+        self._inline_fallbacks = 0
+        self._busy_seconds = 0.0
+        self._started_at = None
+
+    @property
+    def enabled(self):
+        return self.workers > 0
+
+    def start(self):
+        """Creates the executor and warms every worker before traffic arrives."""
+        with self._start_lock:
+            if not self.enabled or self._executor is not None:
+                return
+            context = multiprocessing.get_context(self.start_method)
+            executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=context, initializer=_warm_worker)
+            warmups = [executor.submit(_timed_call, abs, (0,)) for _ in range(self.workers)]
+            for future in warmups:
+                future.result()
+            if self._started_at is None:
+                self._started_at = time.monotonic()
+            self._executor = executor
+
+    def _restart(self, broken):
+        """Replaces `broken` with a fresh executor, unless another caller already has."""
+        with self._start_lock:
+            if self._executor is not broken:
+                return
+            self._executor = None
+            with self._lock:
+                self._restarts += 1
+        print(f"Solver pool broken (worker died); restarting {self.workers} workers")
+        broken.shutdown(wait=False, cancel_futures=True)
+        self.start()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def submit(self, fn, *args):
+        """Queues fn(*args) on a worker and returns its future."""
+        executor = self._executor
+        if executor is None:
+            self.start()
+            executor = self._executor
+        try:
+            future = executor.submit(_timed_call, fn, args)
+        except BrokenProcessPool:
+            self._restart(executor)
+            executor = self._executor
+            future = executor.submit(_timed_call, fn, args)
+        with self._lock:
+            self._in_flight += 1
+        # Kept for wait(): a call lost with a broken executor is rerun inline
+        future.call = (executor, fn, args)
+        future.add_done_callback(self._on_done)
+        return future
+
+    def _on_done(self, future):
+        with self._lock:
+            self._in_flight -= 1
+            self._completed += 1
+            if not future.cancelled() and future.exception() is None:
+                self._busy_seconds += future.result()[1]
+
+    def wait(self, future, deadline):
+        """Waits for a submitted call until `deadline` (time.monotonic()).
+
+        Returns (result, timed_out). A timed-out call is cancelled if it has
+        not started; one already running finishes in the background.
+        """
+        try:
+            result, _ = future.result(timeout=max(0.0, deadline - time.monotonic()))
+            return result, False
+        except FutureTimeoutError:
+            future.cancel()
+            with self._lock:
+                self._timeouts += 1
+            return None, True
+        except BrokenProcessPool:
+            executor, fn, args = future.call
+            self._restart(executor)
+            with self._lock:
+                self._inline_fallbacks += 1
+            return fn(*args), False
+
+    def run(self, fn, *args, deadline_ms=None):
+        """Runs fn(*args) within the deadline; returns (result, timed_out)."""
+        if not self.enabled:
+            return fn(*args), False
+        deadline = time.monotonic() + (deadline_ms or self.deadline_ms) / 1000.0
+        return self.wait(self.submit(fn, *args), deadline)
+
+    def metrics(self):
+        """Snapshot of queue depth and worker utilization."""
+        with self._lock:
+            in_flight = self._in_flight
+            busy_seconds = self._busy_seconds
+            completed = self._completed
+            timeouts = self._timeouts
+            restarts = self._restarts
+            inline_fallbacks = self._inline_fallbacks
+        if not self.enabled:
+            return {'enabled': False}
+        uptime = time.monotonic() - self._started_at if self._started_at else 0.0
+        return {
+            'enabled': True,
+            'workers': self.workers,
+            'deadlineMs': self.deadline_ms,
+            'inFlight': in_flight,
+            'queueDepth': max(0, in_flight - self.workers),
+            'busyWorkers': min(in_flight, self.workers),
+            'utilization': min(in_flight, self.workers) / self.workers,
+            'averageUtilization': busy_seconds / (uptime * self.workers) if uptime else 0.0,
+            'completed': completed,
+            'timeouts': timeouts,
+            'restarts': restarts,
+            'inlineFallbacks': inline_fallbacks,
+        }
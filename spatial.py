@@ -0,0 +1,170 @@
+# Spatial queries over measurements, backed by the geohash index
+#
+# Every query first narrows to a few geohash cells, which the index answers
+# with range scans, then applies the exact coordinate test to the rows in
+# those cells. Work is proportional to the rows near the area asked about,
+# not to the size of the table.
+import math
+
+from sqlalchemy import and_, case, func, or_
+
+import geohash
+from database_models import db, Measurement
+
+MAX_BBOX_CELLS = 16
+NEAREST_START_PRECISION = 8
+
+
+def cells_clause(cells):
+    """SQL condition matching rows whose geohash lies in any of the cells."""
+    ranges = []
+    for start, stop in geohash.cell_ranges(cells):
+        if start == '':
+            ranges.append(Measurement.geohash.isnot(None))
+        elif stop is None:
+            ranges.append(Measurement.geohash >= start)
+        else:
+            ranges.append(and_(Measurement.geohash >= start, Measurement.geohash < stop))
+    return or_(*ranges)
+
+
+def validate_bbox(south, west, north, east):
+    if not (-90.0 <= south <= north <= 90.0 and -180.0 <= west <= 180.0 and -180.0 <= east <= 180.0):
+        raise ValueError("Bounding box needs -90 <= south <= north <= 90 and longitudes in [-180, 180].")
+
+
+def _box_clause(south, west, north, east):
+    if west <= east:
+        longitude = Measurement.longitude.between(west, east)
+    else:
+        longitude = or_(Measurement.longitude >= west, Measurement.longitude <= east)
+    return and_(Measurement.latitude.between(south, north), longitude)
+
+
+def bbox_query(query, south, west, north, east):
+    """Restricts `query` to measurements inside a bounding box (west > east crosses 180)."""
+    validate_bbox(south, west, north, east)
+    cells = geohash.covering_cells(south, west, north, east, MAX_BBOX_CELLS)
+    return query.filter(cells_clause(cells), _box_clause(south, west, north, east))
+
+
+def _within_km_clause(lat, lon, km):
+    """Bounding box of the spherical cap of radius `km` around a point, as SQL."""
+    angle = km / geohash.EARTH_RADIUS_KM * (1 + 1e-9)
+    south, north = lat - math.degrees(angle), lat + math.degrees(angle)
+    if south <= -90.0 or north >= 90.0 or math.sin(angle) >= math.cos(math.radians(lat)):
+        # The cap holds a pole: every longitude
+        return Measurement.latitude.between(max(south, -90.0), min(north, 90.0))
+    d_lon = math.degrees(math.asin(math.sin(angle) / math.cos(math.radians(lat))))
+    west = (lon - d_lon + 180.0) % 360.0 - 180.0
+    east = (lon + d_lon + 180.0) % 360.0 - 180.0
+    return _box_clause(south, west, north, east)
+
+
+def _squared_degrees(lat, lon):
+    """SQL equirectangular distance² from (lat, lon), in degrees: orders rows near the point without trig."""
+    d_lon = func.abs(Measurement.longitude - lon)
+    d_lon = case((d_lon > 180.0, 360.0 - d_lon), else_=d_lon)
+    d_lat = Measurement.latitude - lat
+    scale = math.cos(math.radians(lat)) ** 2
+    return d_lat * d_lat + d_lon * d_lon * scale
+
+
+def nearest(query, lat, lon, k=10, max_km=None):
+    """The k measurements nearest (lat, lon) as [(distance_km, measurement)], closest first.
+
+    Each step asks the database for the k rows of the 3x3 block of geohash
+    cells around the point that are closest on a flat approximation
+    (ORDER BY .. LIMIT k), widening the block until the k-th lies within the
+    radius the block is guaranteed to cover. The rows of the block within
+    that k-th distance are then ranked exactly. The widest block is the
+    precision-1 one, thousands of km across; rows beyond it are not
+    searched. With max_km, stops once that radius is covered and drops
+    anything farther.
+    """
+    if not (-90.0 <= lat <= 90.0 and -180.0 <= lon <= 180.0):
+        raise ValueError("'lat' must be in [-90, 90] and 'lon' in [-180, 180].")
+    limit_km = float('inf') if max_km is None else max_km
+    for precision in range(NEAREST_START_PRECISION, 0, -1):
+        block = query.filter(cells_clause(geohash.neighbourhood(lat, lon, precision)))
+        radius = geohash.covered_radius_km(lat, lon, precision)
+        closest = (
+            block.with_entities(Measurement.latitude, Measurement.longitude)
+            .order_by(None)
+            .order_by(_squared_degrees(lat, lon))
+            .limit(k)
+            .all()
+        )
+        kth_km = max((geohash.haversine_km(lat, lon, row_lat, row_lon) for row_lat, row_lon in closest),
+                     default=None) if len(closest) == k else None
+        if radius >= limit_km or (kth_km is not None and kth_km <= radius):
+            break
+
+    # Only rows at most as far as the k-th found (or max_km) can make the cut
+    reach_km = min(limit_km, kth_km if kth_km is not None else float('inf'))
+    if reach_km != float('inf'):
+        block = block.filter(_within_km_clause(lat, lon, reach_km))
+    candidates = sorted(
+        (geohash.haversine_km(lat, lon, row_lat, row_lon), row_id)
+        for row_id, row_lat, row_lon in block.with_entities(
+            Measurement.id, Measurement.latitude, Measurement.longitude)
+    )
+    candidates = [c for c in candidates if c[0] <= limit_km][:k]
+    rows = {m.id: m for m in Measurement.query.filter(Measurement.id.in_([row_id for _, row_id in candidates]))}
+    return [(distance, rows[row_id]) for distance, row_id in candidates if row_id in rows]
+
+
+def cell_aggregates(query, precision, bbox=None):
+    """Per-cell count, mean position and mean accuracy at a geohash precision."""
+    if bbox is not None:
+        south, west, north, east = bbox
+        query = bbox_query(query, south, west, north, east)
+    else:
+        query = query.filter(Measurement.geohash.isnot(None))
+    cell = func.substr(Measurement.geohash, 1, precision).label('cell')
+    rows = (
+        query.with_entities(
+            cell,
+            func.count(),
+            func.avg(Measurement.latitude),
+            func.avg(Measurement.longitude),
+            func.avg(Measurement.accuracy)
+        )
+        .group_by(cell)
+        .order_by(cell)
+        .all()
+    )
+    return [
+        {
+            'cell': cell_id,
+            'count': count,
+            'latitude': avg_lat,
+            'longitude': avg_lon,
+            'averageAccuracy': avg_accuracy,
+            'bounds': dict(zip(('south', 'west', 'north', 'east'), geohash.bounds(cell_id)))
+        }
+        for cell_id, count, avg_lat, avg_lon, avg_accuracy in rows
+    ]
+
+
+def backfill_geohashes(batch_size=1000):
+    """Fills in geohash for rows stored before the column existed; returns rows updated."""
+    updated = 0
+    last_id = 0
+    while True:
+        batch = db.session.execute(
+            db.select(Measurement.id, Measurement.latitude, Measurement.longitude)
+            .where(Measurement.id > last_id, Measurement.geohash.is_(None),
+                   Measurement.latitude.isnot(None), Measurement.longitude.isnot(None))
+            .order_by(Measurement.id)
+            .limit(batch_size)
+        ).all()
+        if not batch:
+            return updated
+        db.session.execute(
+            db.update(Measurement),
+            [{'id': row_id, 'geohash': geohash.encode(lat, lon)} for row_id, lat, lon in batch]
+        )
+        db.session.commit()
+        updated += len(batch)
+        last_id = batch[-1][0]
@@ -18,7 +18,10 @@ const CelestiNavPage: React.FC = () => {
   const [showResult, setShowResult] = useState(false)
   const [showDatabase, setShowDatabase] = useState(false)
   const [selectedMeasurement, setSelectedMeasurement] = useState<any>(null)
+  const [isLive, setIsLive] = useState(false)
+  const [liveStreamEpoch, setLiveStreamEpoch] = useState(0)
   const videoRef = useRef<HTMLVideoElement>(null)
+  const fixStreamRef = useRef<ReturnType<typeof apiService.openFixStream> | null>(null)
 
   const { measurements } = useMeasurements()
   const { user } = useAuth()
@@ -118,6 +121,36 @@ const CelestiNavPage: React.FC = () => {
     }
   }, [])
 
+  // Live mode: fixes follow the device over one event stream. Live fixes are
+  // not stored; the shutter still saves a measurement.
+  useEffect(() => {
+    if (!isLive) return
+    const stream = apiService.openFixStream(
+      { userId: user?.id, persistEvery: 0 },
+      (fix) => {
+        setLastResult({ lat: fix.latitude, lng: fix.longitude })
+        setShowResult(true)
+      },
+      (error) => console.error('Fix stream error:', error),
+      // The server ended the stream or lost it: open a new one
+      () => setLiveStreamEpoch(epoch => epoch + 1)
+    )
+    fixStreamRef.current = stream
+    return () => {
+      stream.close()
+      fixStreamRef.current = null
+    }
+  }, [isLive, liveStreamEpoch, user?.id])
+
+  useEffect(() => {
+    fixStreamRef.current?.push({ pitch, heading, elevation, pressure, temperature })
+  }, [pitch, heading, elevation, pressure, temperature])
+
+  const toggleLive = () => {
+    if (isLive) setShowResult(false)
+    setIsLive(!isLive)
+  }
+
   const captureReading = async () => {
     setIsCalculating(true)
     setError(null)
@@ -141,10 +174,12 @@ const CelestiNavPage: React.FC = () => {
       setLastResult({ lat: result.latitude, lng: result.longitude })
       setShowResult(true)
 
-      // Auto-hide result after 5 seconds
-      setTimeout(() => {
-        setShowResult(false)
-      }, 5000)
+      // Auto-hide result after 5 seconds (live fixes keep it up)
+      if (!isLive) {
+        setTimeout(() => {
+          setShowResult(false)
+        }, 5000)
+      }
 
     } catch (err) {
       setError(err instanceof Error ? err.message : 'Calculation failed')
@@ -275,7 +310,7 @@ const CelestiNavPage: React.FC = () => {
       {showResult && lastResult && (
         <div className="absolute top-20 left-1/2 -translate-x-1/2 text-center text-white z-10">
           <div className="bg-green-600/90 backdrop-blur-sm rounded-lg px-4 py-3">
-            <div className="text-sm font-bold mb-1">Position Calculated</div>
+            <div className="text-sm font-bold mb-1">{isLive ? 'Live Position' : 'Position Calculated'}</div>
             <div className="text-xs font-mono">
               <div>Lat: {lastResult.lat.toFixed(6)}°</div>
               <div>Lng: {lastResult.lng.toFixed(6)}°</div>
@@ -330,8 +365,18 @@ const CelestiNavPage: React.FC = () => {
         </button>
       </div>
 
-      {/* Settings Button - Bottom Right - Mobile Optimized */}
-      <div className="absolute bottom-6 right-6 z-10">
+      {/* Settings and Live Buttons - Bottom Right - Mobile Optimized */}
+      <div className="absolute bottom-6 right-6 z-10 flex items-center gap-3">
+        <button
+          onClick={toggleLive}
+          disabled={!sensorPermission}
+          className={`h-14 px-4 backdrop-blur-sm rounded-full flex items-center justify-center text-white text-sm font-bold border-2 active:scale-90 transition-all duration-150 shadow-xl disabled:opacity-50 ${
+            isLive ? 'bg-green-600/80 border-green-300' : 'bg-black/60 border-white/40'
+          }`}
+          style={{ minHeight: '44px', minWidth: '44px' }}
+        >
+          LIVE
+        </button>
         <button
           onClick={() => {
             // Mobile-optimized prompt with better UX
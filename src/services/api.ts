@@ -132,6 +132,91 @@ class APIService {
     }
   }
 
+  // Continuous fixes over one event stream: push() sends a sensor sample and
+  // onFix receives each solved fix. One sample POST is in flight at a time and
+  // only the latest sample waits behind it, so pushing on every orientation
+  // event is fine. onClosed runs when the server ends the stream or no longer
+  // knows it (410); open a new stream to carry on.
+  openFixStream(
+    options: { userId?: string; sessionId?: number; track?: boolean; persistEvery?: number },
+    onFix: (fix: SolarCalculationResponse, raw: any) => void,
+    onError?: (error: any) => void,
+    onClosed?: () => void
+  ) {
+    const params = new URLSearchParams()
+    if (options.userId) params.set('user_id', options.userId)
+    if (options.sessionId !== undefined) params.set('session_id', options.sessionId.toString())
+    if (options.track) params.set('track', '1')
+    if (options.persistEvery !== undefined) params.set('persist_every', options.persistEvery.toString())
+
+    const source = new EventSource(`/calculate_latlon/stream?${params}`)
+    let samplesURL: string | null = null
+    let sending = false
+    let next: SolarCalculationRequest | null = null
+    let closed = false
+
+    const close = () => {
+      if (closed) return
+      closed = true
+      source.close()
+      onClosed?.()
+    }
+
+    const send = async () => {
+      sending = true
+      while (next && samplesURL && !closed) {
+        const sample = next
+        next = null
+        try {
+          const response = await fetch(samplesURL, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({
+              pitch: sample.pitch,
+              heading: sample.heading,
+              elevation: sample.elevation || 0,
+              pressure: sample.pressure || 1013.25,
+              temperature: sample.temperature || 15,
+              timestamp: new Date().toISOString()
+            })
+          })
+          if (response.status === 410) close()
+        } catch (error) {
+          onError?.(error)
+        }
+      }
+      sending = false
+    }
+
+    source.addEventListener('ready', (event) => {
+      samplesURL = JSON.parse((event as MessageEvent).data).samples_url
+      if (next && !sending) send()
+    })
+    source.addEventListener('fix', (event) => {
+      const result = JSON.parse((event as MessageEvent).data)
+      onFix({
+        latitude: parseFloat(result.lat),
+        longitude: parseFloat(result.lon),
+        accuracy: result.accuracy || 1000,
+        method: 'solar',
+        timestamp: Date.now()
+      }, result)
+    })
+    source.addEventListener('end', close)
+    source.onerror = (error) => onError?.(error)
+
+    return {
+      push: (sample: SolarCalculationRequest) => {
+        next = sample
+        if (!sending) send()
+      },
+      close: () => {
+        closed = true
+        source.close()
+      }
+    }
+  }
+
   // Measurements API
   async getMeasurements(limit = 50) {
     try {
@@ -164,6 +249,53 @@ class APIService {
     }
   }
 
+  // Replays measurements queued while offline; records with an idempotencyKey
+  // are stored at most once, so a retried sync is safe
+  async createMeasurementsBulk(records: any[], userId?: string) {
+    try {
+      const response = await fetch(`${this.baseURL}/measurements/bulk`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ records, user_id: userId })
+      })
+
+      if (!response.ok) throw new Error(`Failed to sync measurements: ${response.status}`)
+
+      return await response.json()
+    } catch (error) {
+      console.error('Bulk measurement sync error:', error)
+      throw new Error('Failed to sync measurements')
+    }
+  }
+
+  // Hourly or daily activity trend from the precomputed rollups
+  async getMeasurementRollup(params: {
+    granularity?: 'hour' | 'day'
+    start?: string
+    end?: string
+    userId?: string
+    calculationMethod?: string
+    groupBy?: 'calculation_method' | 'user_id'
+  } = {}) {
+    try {
+      const query = new URLSearchParams()
+      if (params.granularity) query.set('granularity', params.granularity)
+      if (params.start) query.set('start', params.start)
+      if (params.end) query.set('end', params.end)
+      if (params.userId) query.set('user_id', params.userId)
+      if (params.calculationMethod) query.set('calculation_method', params.calculationMethod)
+      if (params.groupBy) query.set('group_by', params.groupBy)
+      const response = await fetch(`${this.baseURL}/measurements/rollup?${query}`)
+      if (!response.ok) throw new Error(`Failed to fetch measurement rollup: ${response.status}`)
+
+      const result = await response.json()
+      return result.data
+    } catch (error) {
+      console.error('Get measurement rollup error:', error)
+      throw new Error('Failed to fetch measurement trends')
+    }
+  }
+
   // Convenience method for saving GPS and other measurements
   async saveMeasurement(data: {
     latitude: number
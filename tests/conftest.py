@@ -0,0 +1,45 @@
+# Shared fixtures for the endpoint tests
+#
+# main.py configures itself from the environment when first imported, so
+# the environment points it at a throwaway SQLite database and scratch
+# directories before any test imports it.
+import os
+import sys
+import tempfile
+import uuid
+
+import pytest
+
+_SCRATCH = tempfile.mkdtemp(prefix='celestinav-tests-')
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(_SCRATCH, 'celestinav.db')}")
+os.environ.setdefault('SKY_IMAGE_STORE_PATH', os.path.join(_SCRATCH, 'sky_images'))
+os.environ.setdefault('MEASUREMENT_SPILL_PATH', os.path.join(_SCRATCH, 'measurement_spill.ndjson'))
+os.environ.setdefault('EPHEMERIS_TABLE_PATH', os.path.join(_SCRATCH, 'ephemeris_table.bin'))
+os.environ.setdefault('SOLVER_POOL_WORKERS', '0')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='session')
+def main_module():
+    import main
+    return main
+
+
+@pytest.fixture
+def client(main_module):
+    main_module.response_cache.clear()
+    return main_module.app.test_client()
+
+
+@pytest.fixture
+def session_id(client):
+    response = client.post('/api/sessions', json={})
+    assert response.status_code == 201
+    return response.get_json()['data']['id']
+
+
+@pytest.fixture
+def user_id(client):
+    response = client.post('/api/users', json={'device_id': uuid.uuid4().hex})
+    assert response.status_code in (200, 201)
+    return response.get_json()['data']['id']
@@ -0,0 +1,43 @@
+import uuid
+
+from database_models import Measurement
+
+
+def _record(**fields):
+    return dict({'pitch': 30.0, 'heading': 120.0, 'timestamp': '2026-10-17T12:00:00Z'}, **fields)
+
+
+def test_retried_sync_reports_duplicates_with_stored_ids(client, user_id):
+    first_key, second_key = uuid.uuid4().hex, uuid.uuid4().hex
+    records = [_record(idempotencyKey=first_key), _record(idempotencyKey=second_key),
+               _record(idempotencyKey=first_key), _record()]
+
+    body = client.post('/api/measurements/bulk', json={'records': records, 'user_id': user_id}).get_json()
+    assert body['statuses'] == ['created', 'created', 'duplicate', 'created']
+    assert body['ids'][2] == body['ids'][0]
+
+    retry = client.post('/api/measurements/bulk', json={'records': records[:2], 'user_id': user_id}).get_json()
+    assert retry['statuses'] == ['duplicate', 'duplicate']
+    assert retry['ids'] == body['ids'][:2]
+
+
+def test_unknown_references_fail_only_their_records(client, main_module, session_id, user_id):
+    records = [
+        _record(sessionId=session_id),
+        _record(sessionId=session_id + 100000),
+        _record(user_id='no-such-user'),
+        _record(user_id=user_id),
+        _record(calculationMethod='much-too-long'),
+    ]
+    response = client.post('/api/measurements/bulk', json={'records': records})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['statuses'] == ['created', 'invalid', 'invalid', 'created', 'invalid']
+    assert body['errors'] == {
+        '1': "Unknown 'sessionId'.",
+        '2': "Unknown 'user_id'.",
+        '4': "'calculationMethod' must be a string of 1-10 characters.",
+    }
+
+    with main_module.app.app_context():
+        assert main_module.db.session.get(Measurement, body['ids'][0]).session_id == session_id
@@ -0,0 +1,92 @@
+# Concurrent first writes to counter rows
+#
+# Runs against TEST_DATABASE_URL when set (use a PostgreSQL URL to exercise
+# real concurrent transactions), otherwise against a temporary SQLite file.
+import os
+import threading
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, select
+
+from app_stats import METHOD_PREFIX, _Delta as StatsDelta
+from database_models import AppStats, MeasurementRollup
+from rollups import _Delta as RollupDelta
+
+_TABLES = [AppStats.__table__, MeasurementRollup.__table__]
+
+
+@pytest.fixture
+def engine(tmp_path):
+    url = os.environ.get('TEST_DATABASE_URL') or f"sqlite:///{tmp_path / 'counters.db'}"
+    engine = create_engine(url)
+    for table in _TABLES:
+        table.drop(engine, checkfirst=True)
+        table.create(engine)
+    yield engine
+    for table in _TABLES:
+        table.drop(engine, checkfirst=True)
+    engine.dispose()
+
+
+def _apply_concurrently(engine, first, second):
+    """Applies two deltas in overlapping transactions on separate connections.
+
+    The second transaction writes while the first is still open, so on
+    PostgreSQL both start without seeing the other's new row.
+    """
+    errors = []
+    with engine.connect() as connection:
+        transaction = connection.begin()
+        first.apply(connection)
+
+        def run_second():
+            try:
+                with engine.begin() as other:
+                    second.apply(other)
+            except Exception as e:
+                errors.append(e)
+
+        thread = threading.Thread(target=run_second)
+        thread.start()
+        thread.join(0.5)
+        transaction.commit()
+        thread.join()
+    return errors
+
+
+def _rollup_delta(accuracy):
+    delta = RollupDelta()
+    delta.add(1, datetime(2026, 10, 17, 12, 30), None, 'solar', accuracy, 10.0, 20.0)
+    return delta
+
+
+def test_rollup_deltas_for_a_new_bucket_from_two_connections(engine):
+    errors = _apply_concurrently(engine, _rollup_delta(4.0), _rollup_delta(6.0))
+    assert errors == []
+
+    with engine.connect() as connection:
+        rows = connection.execute(
+            select(MeasurementRollup.granularity, MeasurementRollup.measurement_count,
+                   MeasurementRollup.accuracy_sum, MeasurementRollup.position_count)
+            .order_by(MeasurementRollup.granularity)
+        ).all()
+    assert [tuple(row) for row in rows] == [('day', 2, 10.0, 2), ('hour', 2, 10.0, 2)]
+
+
+def _stats_delta(method):
+    delta = StatsDelta()
+    delta.inserted_measurement(method, 5.0, datetime(2026, 10, 17, 12, 30))
+    return delta
+
+
+def test_stats_deltas_for_a_new_key_from_two_connections(engine):
+    errors = _apply_concurrently(engine, _stats_delta('sextant'), _stats_delta('sextant'))
+    assert errors == []
+
+    with engine.connect() as connection:
+        counters = dict(connection.execute(select(AppStats.stat_key, AppStats.stat_value)).all())
+    assert int(counters[METHOD_PREFIX + 'sextant']) == 2
+    assert int(counters['measurements.count']) == 2
+    assert float(counters['measurements.accuracy.sum']) == 10.0
+    assert counters['measurements.last_timestamp'] == '2026-10-17T12:30:00.000000'
@@ -0,0 +1,49 @@
+import csv
+import io
+import json
+
+import pytest
+
+from measurement_export import read_npz_export
+
+
+@pytest.fixture
+def stored(client, user_id):
+    records = [{'pitch': 10.0 + k, 'heading': 100.0 + k, 'latitude': -30.0 + k, 'longitude': 150.0,
+                'timestamp': f'2026-10-17T12:0{k}:00Z'} for k in range(3)]
+    body = client.post('/api/measurements/bulk', json={'records': records, 'user_id': user_id}).get_json()
+    assert body['statuses'] == ['created'] * 3
+    return user_id, body['ids']
+
+
+def test_ndjson_and_csv_export_the_same_rows_oldest_first(client, stored):
+    user_id, ids = stored
+    response = client.get(f'/api/measurements/export?format=ndjson&user_id={user_id}')
+    assert response.mimetype == 'application/x-ndjson'
+    rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [row['id'] for row in rows] == ids
+    assert [row['pitch'] for row in rows] == [10.0, 11.0, 12.0]
+
+    response = client.get(f'/api/measurements/export?format=csv&user_id={user_id}')
+    assert response.mimetype == 'text/csv'
+    table = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    assert [int(row['id']) for row in table] == ids
+    assert [float(row['latitude']) for row in table] == [-30.0, -29.0, -28.0]
+
+
+def test_npz_export_round_trips_and_resumes_after_a_watermark(client, stored, tmp_path):
+    user_id, ids = stored
+    path = tmp_path / 'measurements.npz'
+    path.write_bytes(client.get(f'/api/measurements/export?format=npz&user_id={user_id}').get_data())
+    columns = read_npz_export(str(path))
+    assert columns['id'].tolist() == ids
+    assert columns['heading'].tolist() == [100.0, 101.0, 102.0]
+
+    path.write_bytes(client.get(
+        f'/api/measurements/export?format=npz&user_id={user_id}&after_id={ids[0]}').get_data())
+    assert read_npz_export(str(path))['id'].tolist() == ids[1:]
+
+
+def test_unknown_export_format_is_rejected(client):
+    response = client.get('/api/measurements/export?format=xml')
+    assert response.status_code == 400
@@ -0,0 +1,61 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import solver
+from solar_ephemeris import solar_ephemeris, sun_position
+
+LATITUDE, LONGITUDE = -30.0, 150.0
+
+
+class _Clock(datetime):
+    current = datetime(2025, 6, 1, 2, tzinfo=timezone.utc)
+
+    @classmethod
+    def now(cls, tz=None):
+        return cls.current
+
+
+@pytest.fixture
+def clock(main_module, monkeypatch):
+    monkeypatch.setattr(main_module, 'datetime', _Clock)
+    monkeypatch.setattr(_Clock, 'current', _Clock.current)
+    return _Clock
+
+
+def _sighting(when, **params):
+    altitude, azimuth = sun_position(solar_ephemeris(when), LATITUDE, LONGITUDE)
+    return dict({'pitch': altitude + solver.atmospheric_refraction(altitude), 'heading': azimuth}, **params)
+
+
+def test_repeated_sighting_is_served_from_the_fix_cache(client, main_module, clock):
+    before = main_module.fix_cache.metrics()['hits']
+    first = client.get('/calculate_latlon', query_string=_sighting(clock.current)).get_json()
+    second = client.get('/calculate_latlon', query_string=_sighting(clock.current)).get_json()
+
+    assert first['solver']['cache'] == 'miss'
+    assert second['solver']['cache'] == 'hit'
+    assert (second['lat'], second['lon']) == (first['lat'], first['lon'])
+    assert second['measurement_id'] != first['measurement_id']
+    assert main_module.fix_cache.metrics()['hits'] == before + 1
+
+
+def test_tracking_carries_the_fix_between_sightings(client, clock, session_id):
+    fixes = []
+    for _ in range(3):
+        body = client.get('/calculate_latlon', query_string=_sighting(
+            clock.current, track=1, session_id=session_id)).get_json()
+        fixes.append(body)
+        clock.current += timedelta(minutes=40)
+
+    assert [fix['tracking']['fixes'] for fix in fixes] == [1, 2, 3]
+    assert not fixes[0]['tracking']['warm_start']
+    assert fixes[2]['tracking']['warm_start']
+    assert float(fixes[2]['lat']) == pytest.approx(LATITUDE, abs=0.05)
+    assert float(fixes[2]['lon']) == pytest.approx(LONGITUDE, abs=0.05)
+    assert fixes[2]['tracking']['error_ellipse']['semi_major_m'] > 0
+
+
+def test_tracking_needs_a_session(client, clock):
+    response = client.get('/calculate_latlon', query_string=_sighting(clock.current, track=1))
+    assert response.status_code == 400
@@ -0,0 +1,39 @@
+import json
+from datetime import datetime, timezone
+
+import pytest
+
+import json_provider
+
+PAYLOAD = {
+    'status': 'success',
+    'data': [
+        {'id': 1, 'latitude': -30.123456, 'accuracy': float('nan'), 'notes': 'Zürich ☀'},
+        {'id': 2, 'latitude': float('inf'), 'longitude': float('-inf'), 'nested': {'b': [1.5, None], 'a': True}},
+    ],
+    'timestamp': datetime(2026, 10, 17, 12, 30, tzinfo=timezone.utc),
+    7: 'non-string key',
+}
+
+
+def test_fallback_writes_non_finite_floats_as_null():
+    text = json_provider._stdlib_dumps(PAYLOAD, json_provider.DefaultJSONProvider.default)
+    decoded = json.loads(text)
+    assert decoded['data'][0]['accuracy'] is None
+    assert decoded['data'][1]['latitude'] is None and decoded['data'][1]['longitude'] is None
+
+
+def test_fallback_matches_orjson_output():
+    pytest.importorskip('orjson')
+    fast = json_provider.dumps(PAYLOAD)
+    fallback = json_provider._stdlib_dumps(PAYLOAD, json_provider.DefaultJSONProvider.default)
+    assert fallback == fast
+
+
+def test_api_responses_match_without_orjson(client, main_module, monkeypatch):
+    client.post('/api/measurements', json={'pitch': 30, 'heading': 120, 'notes': 'Zürich'})
+    urls = ['/api/stats', '/api/measurements?limit=5', '/api/sessions']
+    fast = [client.get(url).data for url in urls]
+    main_module.response_cache.clear()
+    monkeypatch.setattr(json_provider, 'orjson', None)
+    assert [client.get(url).data for url in urls] == fast
@@ -0,0 +1,73 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import solver
+from solar_ephemeris import solar_ephemeris, sun_position
+
+LATITUDE, LONGITUDE = -30.0, 150.0
+
+
+def _observations(count, start=datetime(2025, 6, 1, 2, tzinfo=timezone.utc), step_minutes=40):
+    observations = []
+    for k in range(count):
+        when = start + timedelta(minutes=step_minutes * k)
+        altitude, azimuth = sun_position(solar_ephemeris(when), LATITUDE, LONGITUDE)
+        observations.append({
+            'pitch': altitude + solver.atmospheric_refraction(altitude),
+            'heading': azimuth,
+            'timestamp': when.isoformat().replace('+00:00', 'Z'),
+        })
+    return observations
+
+
+def test_batch_solves_in_input_order_and_reports_bad_items(client, session_id):
+    observations = _observations(3)
+    observations.insert(1, {'pitch': 'x', 'heading': 1, 'timestamp': '2025-06-01T00:00:00Z'})
+    body = client.post('/calculate_latlon/batch',
+                       json={'observations': observations, 'session_id': session_id}).get_json()
+
+    assert body['solved'] == 3
+    assert [result['status'] for result in body['results']] == ['success', 'error', 'success', 'success']
+    for result in (body['results'][0], body['results'][2], body['results'][3]):
+        assert float(result['lat']) == pytest.approx(LATITUDE, abs=0.01)
+        assert float(result['lon']) == pytest.approx(LONGITUDE, abs=0.01)
+        assert result['measurement_id'] is not None
+
+
+@pytest.mark.parametrize('endpoint', ['/calculate_latlon/batch', '/calculate_latlon/multi'])
+def test_session_id_is_validated_before_solving(client, endpoint):
+    observations = _observations(2)
+    for value in ('abc', [1], True):
+        response = client.post(endpoint, json={'observations': observations, 'session_id': value})
+        assert response.status_code == 400
+        assert response.get_json() == {'error': "'session_id' must be an integer."}
+    response = client.post(endpoint, json={'observations': observations, 'session_id': 10 ** 9})
+    assert response.status_code == 404
+
+
+def test_multi_counts_sightings_already_stored_for_the_session_once(client, session_id):
+    observations = _observations(2)
+    client.post('/calculate_latlon/batch', json={'observations': observations, 'session_id': session_id})
+
+    body = client.post('/calculate_latlon/multi',
+                       json={'observations': observations, 'session_id': session_id}).get_json()
+    assert body['sightings'] == 2
+    assert float(body['lat']) == pytest.approx(LATITUDE, abs=0.01)
+
+    body = client.post('/calculate_latlon/multi', json={'session_id': session_id}).get_json()
+    assert body['sightings'] == 2
+
+    extra = _observations(1, start=datetime(2025, 6, 1, 4, tzinfo=timezone.utc))
+    body = client.post('/calculate_latlon/multi',
+                       json={'observations': extra, 'session_id': session_id}).get_json()
+    assert body['sightings'] == 3
+
+
+def test_multi_rejects_bad_sigmas_with_a_readable_message(client):
+    observations = _observations(2)
+    response = client.post('/calculate_latlon/multi', json={'observations': observations, 'sigma_altitude': 'x'})
+    assert response.status_code == 400
+    assert response.get_json() == {'error': "'sigma_altitude' and 'sigma_azimuth' must be numbers."}
+    response = client.post('/calculate_latlon/multi', json={'observations': observations, 'sigma_azimuth': -1})
+    assert response.status_code == 400
@@ -0,0 +1,33 @@
+def _record():
+    return {'pitch': 30.0, 'heading': 120.0, 'timestamp': '2026-10-17T12:00:00Z'}
+
+
+def test_cached_read_is_invalidated_by_a_write(client, user_id):
+    url = f'/api/measurements?user_id={user_id}'
+    client.post('/api/measurements/bulk', json={'records': [_record()], 'user_id': user_id})
+
+    first = client.get(url)
+    assert first.headers['X-Cache'] == 'MISS'
+    assert first.get_json()['count'] == 1
+    second = client.get(url)
+    assert second.headers['X-Cache'] == 'HIT'
+    assert second.get_data() == first.get_data()
+
+    client.post('/api/measurements/bulk', json={'records': [_record()], 'user_id': user_id})
+    third = client.get(url)
+    assert third.headers['X-Cache'] == 'MISS'
+    assert third.get_json()['count'] == 2
+    assert third.headers['ETag'] != first.headers['ETag']
+
+
+def test_matching_etag_is_answered_not_modified(client, user_id):
+    url = f'/api/measurements?user_id={user_id}'
+    etag = client.get(url).headers['ETag']
+    response = client.get(url, headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.get_data() == b''
+
+    client.post('/api/measurements/bulk', json={'records': [_record()], 'user_id': user_id})
+    response = client.get(url, headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.get_json()['count'] == 1
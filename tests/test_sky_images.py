@@ -0,0 +1,31 @@
+import base64
+
+from blob_store import BlobStore
+
+_PNG = b'\x89PNG\r\n\x1a\n' + b'\x00' * 32
+
+
+def test_uploaded_sky_image_is_served_back(client, main_module, monkeypatch, tmp_path):
+    # A relative store path, resolved from a working directory that is not the app's
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(main_module, 'sky_image_store', BlobStore('sky_images'))
+
+    data_url = 'data:image/png;base64,' + base64.b64encode(_PNG).decode()
+    response = client.post('/api/weather', json={'skyImages': {'north': data_url}})
+    assert response.status_code == 201
+    reference = response.get_json()['data']['skyImages']['north']
+    assert reference['contentType'] == 'image/png'
+
+    response = client.get(f"/api/sky-images/{reference['sha256']}")
+    assert response.status_code == 200
+    assert response.data == _PNG
+    assert response.mimetype == 'image/png'
+
+    response = client.get(f"/api/sky-images/{reference['sha256']}",
+                          headers={'If-None-Match': f'"{reference["sha256"]}"'})
+    assert response.status_code == 304
+
+
+def test_unknown_sky_image_is_404(client):
+    assert client.get('/api/sky-images/' + '0' * 64).status_code == 404
+    assert client.get('/api/sky-images/not-a-digest').status_code == 404
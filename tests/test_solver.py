@@ -0,0 +1,33 @@
+from datetime import datetime, timezone
+
+import numpy as np
+import pytest
+
+import solver
+from solar_ephemeris import solar_ephemeris, sun_position
+
+
+def _sighting(lat, lon, when=datetime(2025, 6, 1, 2, tzinfo=timezone.utc)):
+    ephemeris = solar_ephemeris(when)
+    altitude, azimuth = sun_position(ephemeris, lat, lon)
+    return {'utc_time': when, 'ephemeris': ephemeris, 'elevation': 0.0,
+            'altitude': altitude + solver.atmospheric_refraction(altitude), 'azimuth': azimuth}
+
+
+@pytest.mark.parametrize('coords', [(-28.0, 148.0), (-31.5, 152.5), (-30.0, 150.0)])
+def test_objective_gradient_matches_finite_differences(coords):
+    obs_data = _sighting(-30.0, 150.0)
+    _, gradient = solver.calculate_error_and_gradient(np.array(coords), obs_data)
+    step = 1e-6
+    numeric = [
+        (solver.calculate_error_and_gradient(np.array(coords) + offset, obs_data)[0]
+         - solver.calculate_error_and_gradient(np.array(coords) - offset, obs_data)[0]) / (2 * step)
+        for offset in (np.array([step, 0.0]), np.array([0.0, step]))
+    ]
+    assert gradient == pytest.approx(numeric, rel=1e-4, abs=1e-6)
+
+
+def test_objective_is_zero_at_the_observer():
+    value, gradient = solver.calculate_error_and_gradient(np.array([-30.0, 150.0]), _sighting(-30.0, 150.0))
+    assert value == pytest.approx(0.0, abs=1e-12)
+    assert gradient == pytest.approx([0.0, 0.0], abs=1e-5)
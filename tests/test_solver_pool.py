@@ -0,0 +1,37 @@
+import multiprocessing
+import os
+
+import pytest
+
+from solver_pool import SolverPool
+
+
+def _double(x):
+    return 2 * x
+
+
+def _double_or_die_in_worker(x):
+    if multiprocessing.parent_process() is not None:
+        os._exit(1)
+    return 2 * x
+
+
+@pytest.fixture
+def pool():
+    pool = SolverPool(workers=1, deadline_ms=10000)
+    pool.start()
+    yield pool
+    pool.shutdown()
+
+
+def test_pool_recovers_from_a_dead_worker(pool):
+    assert pool.run(_double, 2) == (4, False)
+
+    # The worker exits mid-call: the call is solved inline and the executor replaced
+    assert pool.run(_double_or_die_in_worker, 5) == (10, False)
+    assert pool.run(_double, 3) == (6, False)
+
+    metrics = pool.metrics()
+    assert metrics['restarts'] == 1
+    assert metrics['inlineFallbacks'] == 1
+    assert metrics['inFlight'] == 0
@@ -0,0 +1,73 @@
+import random
+
+import pytest
+from sqlalchemy import event
+
+import geohash
+
+
+@pytest.fixture
+def points(client, user_id):
+    rng = random.Random(7)
+    points = [(rng.uniform(-85, 85), rng.uniform(-180, 180)) for _ in range(400)]
+    points += [(51.5 + rng.gauss(0, 0.05), -0.1 + rng.gauss(0, 0.05)) for _ in range(200)]
+    points += [(rng.uniform(-5, 5), rng.choice([rng.uniform(175, 180), rng.uniform(-180, -175)])) for _ in range(50)]
+    records = [{'pitch': 1, 'heading': 2, 'latitude': lat, 'longitude': lon} for lat, lon in points]
+    body = client.post('/api/measurements/bulk', json={'records': records, 'user_id': user_id}).get_json()
+    assert body['created'] == len(records)
+    return {row_id: point for row_id, point in zip(body['ids'], points)}
+
+
+def _nearest_ids(points, lat, lon, k, max_km=None):
+    ranked = sorted((geohash.haversine_km(lat, lon, *point), row_id) for row_id, point in points.items())
+    return [row_id for distance, row_id in ranked if max_km is None or distance <= max_km][:k]
+
+
+@pytest.mark.parametrize('lat, lon, k, max_km', [
+    (51.5, -0.1, 20, None),
+    (0.0, 179.9, 5, None),
+    (88.0, 0.0, 3, None),
+    (10.0, 10.0, 10, None),
+    (0.0, 0.0, 50, 800.0),
+])
+def test_nearest_matches_brute_force(client, points, user_id, lat, lon, k, max_km):
+    url = f'/api/measurements/nearest?lat={lat}&lon={lon}&k={k}&user_id={user_id}&fields=id'
+    if max_km is not None:
+        url += f'&max_km={max_km}'
+    body = client.get(url).get_json()
+    assert [row['id'] for row in body['data']] == _nearest_ids(points, lat, lon, k, max_km)
+
+
+def test_sparse_nearest_stays_bounded(client, main_module, points, user_id):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with main_module.app.app_context():
+        engine = main_module.db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        body = client.get(f'/api/measurements/nearest?lat=-89&lon=0&k=5&user_id={user_id}&fields=id').get_json()
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+    assert len(body['data']) <= 5
+    # One LIMIT k probe per precision, then the exact pass and the row fetch
+    assert len(statements) <= 8 + 2
+    assert all('geohash' in statement for statement in statements[:-1])
+
+
+def test_bbox_matches_brute_force_across_the_antimeridian(client, points, user_id):
+    south, west, north, east = -5.0, 178.0, 5.0, -178.0
+    expected = {row_id for row_id, (lat, lon) in points.items()
+                if south <= lat <= north and (lon >= west or lon <= east)}
+    found, cursor = set(), None
+    while True:
+        url = (f'/api/measurements/bbox?south={south}&west={west}&north={north}&east={east}'
+               f'&user_id={user_id}&fields=id&limit=100') + (f'&cursor={cursor}' if cursor else '')
+        body = client.get(url).get_json()
+        found |= {row['id'] for row in body['data']}
+        cursor = body['nextCursor']
+        if not cursor:
+            break
+    assert found == expected
@@ -0,0 +1,102 @@
+import json
+import os
+import time
+import uuid
+from datetime import datetime
+
+import pytest
+
+from database_models import Measurement
+from write_behind import WriteBehindQueue
+
+
+@pytest.fixture
+def queue(main_module, tmp_path):
+    queue = WriteBehindQueue(main_module.app, Measurement, enabled=True, batch_size=4, flush_interval_ms=20,
+                             spill_path=str(tmp_path / 'spill.ndjson'), replay_interval_s=3600,
+                             key_column='idempotency_key')
+    yield queue
+    queue.shutdown()
+
+
+def _row(tag, minute=0):
+    return dict(pitch=30.0, heading=120.0, timestamp=datetime(2026, 10, 17, 12, minute), user_id=tag)
+
+
+def _stored(main_module, tag):
+    with main_module.app.app_context():
+        return Measurement.query.filter_by(user_id=tag).count()
+
+
+def _spill_line(provisional_id, tag, minute=0):
+    row = dict(_row(tag, minute), idempotency_key=provisional_id)
+    row['timestamp'] = row['timestamp'].isoformat()
+    return json.dumps({'provisionalId': provisional_id, 'row': row}) + '\n'
+
+
+def test_replay_skips_repeated_and_already_stored_rows(main_module, queue):
+    tag = uuid.uuid4().hex
+    stored_id, spilled_id = uuid.uuid4().hex, uuid.uuid4().hex
+    with main_module.app.app_context():
+        main_module.db.session.add(Measurement(**_row(tag), idempotency_key=stored_id))
+        main_module.db.session.commit()
+
+    with open(queue.spill_path, 'w') as f:
+        f.write(_spill_line(stored_id, tag) + _spill_line(spilled_id, tag, 1) + _spill_line(spilled_id, tag, 1))
+
+    assert queue.replay_spill() == 1
+    assert _stored(main_module, tag) == 2
+    assert not os.listdir(os.path.dirname(queue.spill_path))
+
+
+def test_replay_quarantines_torn_lines(main_module, queue):
+    tag = uuid.uuid4().hex
+    good = _spill_line(uuid.uuid4().hex, tag)
+    with open(queue.spill_path, 'w') as f:
+        f.write(good + good[:len(good) // 2])
+
+    assert queue.replay_spill() == 1
+    assert _stored(main_module, tag) == 1
+    assert queue.metrics()['quarantined'] == 1
+    with open(queue.spill_path + '.bad') as f:
+        assert f.read() == good[:len(good) // 2] + '\n'
+
+
+def test_replay_leaves_claims_of_live_processes_alone(main_module, queue):
+    tag = uuid.uuid4().hex
+    live_claim = f"{queue.spill_path}.replay.{os.getppid()}"
+    dead_claim = queue.spill_path + '.replay'
+    with open(live_claim, 'w') as f:
+        f.write(_spill_line(uuid.uuid4().hex, tag))
+    with open(dead_claim, 'w') as f:
+        f.write(_spill_line(uuid.uuid4().hex, tag, 1))
+
+    assert queue.replay_spill() == 1
+    assert os.path.exists(live_claim)
+    assert not os.path.exists(dead_claim)
+    assert queue.replay_spill() == 0
+
+
+def test_flusher_survives_an_error(main_module, queue, monkeypatch):
+    tag = uuid.uuid4().hex
+    flush = queue._flush
+    calls = []
+
+    def failing_once(batch):
+        calls.append(len(batch))
+        if len(calls) == 1:
+            raise RuntimeError('boom')
+        flush(batch)
+
+    monkeypatch.setattr(queue, '_flush', failing_once)
+    queue.put(_row(tag))
+    deadline = time.monotonic() + 5
+    while len(calls) < 1 and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    provisional_id = queue.put(_row(tag, 1))
+    while _stored(main_module, tag) < 1 and time.monotonic() < deadline:
+        time.sleep(0.02)
+    with main_module.app.app_context():
+        assert Measurement.query.filter_by(user_id=tag).one().idempotency_key == provisional_id
+    assert queue._thread.is_alive()
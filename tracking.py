@@ -0,0 +1,117 @@
+# Per-session track state for tracking-mode /calculate_latlon requests
+#
+# Each tracked session keeps its last fix, the fix's (lat, lon) covariance
+# and the sighting time. The next sighting is solved against the predicted
+# state (solver.solve_tracked): the position carries over and the
+# covariance grows with the time elapsed, at a rate set by how fast the
+# device may be moving. The store is a bounded LRU; sessions idle for
+# longer than the timeout are dropped, so abandoned sessions cost nothing.
+#
+# State lives in this process. Behind several server processes without
+# sticky sessions a session's sightings may land on a process with no
+# state, which then starts the track afresh.
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from solver import EARTH_RADIUS_M
+
+_METRES_PER_DEGREE = np.radians(1.0) * EARTH_RADIUS_M
+
+
+class TrackState:
+    __slots__ = ('lat', 'lon', 'covariance', 'utc_time', 'updates', 'touched')
+
+    def __init__(self, lat, lon, covariance, utc_time, updates, touched):
+        self.lat = lat
+        self.lon = lon
+        self.covariance = covariance
+        self.utc_time = utc_time
+        self.updates = updates
+        self.touched = touched
+
+
+class TrackStore:
+    """Bounded map of session key -> TrackState with idle eviction."""
+
+    def __init__(self, max_sessions=1024, idle_timeout_s=900.0, speed_mps=5.0):
+        self.max_sessions = max_sessions
+        self.idle_timeout_s = idle_timeout_s
+        self.speed_mps = speed_mps
+        self._states = OrderedDict()
+        self._lock = threading.Lock()
+        self.warm_starts = 0
+        self.cold_starts = 0
+        self.resets = 0
+        self.evictions = 0
+
+    def _evict_idle(self, now):
+        while self._states:
+            key, state = next(iter(self._states.items()))
+            if now - state.touched <= self.idle_timeout_s:
+                break
+            del self._states[key]
+            self.evictions += 1
+
+    def predict(self, key, utc_time):
+        """(prior (lat, lon), covariance) for a sighting at `utc_time`, or (None, None).
+
+        Position is carried over; each axis of the covariance grows by the
+        squared distance the device could cover since the last fix.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._evict_idle(now)
+            state = self._states.get(key)
+            if state is None:
+                return None, None
+            self._states.move_to_end(key)
+            state.touched = now
+            lat, lon, covariance, last_time = state.lat, state.lon, state.covariance, state.utc_time
+
+        elapsed = max(0.0, (utc_time - last_time).total_seconds())
+        spread_deg = self.speed_mps * elapsed / _METRES_PER_DEGREE
+        cos_lat = max(np.cos(np.radians(lat)), 1e-6)
+        process_noise = np.diag([spread_deg ** 2, (spread_deg / cos_lat) ** 2])
+        return (lat, lon), covariance + process_noise
+
+    def update(self, key, lat, lon, covariance, utc_time, diagnostics):
+        """Stores the fix for `key`; returns the number of fixes in its current track."""
+        now = time.monotonic()
+        with self._lock:
+            previous = self._states.pop(key, None)
+            warm = diagnostics.get('warm_start', False)
+            updates = previous.updates + 1 if previous is not None and warm else 1
+            self._states[key] = TrackState(lat, lon, np.asarray(covariance, dtype=float), utc_time, updates, now)
+            if warm:
+                self.warm_starts += 1
+            else:
+                self.cold_starts += 1
+            if diagnostics.get('reset'):
+                self.resets += 1
+            while len(self._states) > self.max_sessions:
+                self._states.popitem(last=False)
+                self.evictions += 1
+            return updates
+
+    def discard(self, key):
+        with self._lock:
+            self._states.pop(key, None)
+
+    def metrics(self):
+        with self._lock:
+            self._evict_idle(time.monotonic())
+            fixes = self.warm_starts + self.cold_starts
+            return {
+                'sessions': len(self._states),
+                'maxSessions': self.max_sessions,
+                'idleTimeoutSeconds': self.idle_timeout_s,
+                'speedMps': self.speed_mps,
+                'warmStarts': self.warm_starts,
+                'coldStarts': self.cold_starts,
+                'resets': self.resets,
+                'evictions': self.evictions,
+                'warmStartRatio': self.warm_starts / fixes if fixes else 0.0,
+            }
@@ -0,0 +1,37 @@
+# Insert-or-update for counter rows
+#
+# Counter tables (AppStats, MeasurementRollup) are written inside the
+# transactions of the rows they count. An UPDATE followed by an INSERT when
+# no row matched is not safe there: two transactions creating the same key
+# both see no row, both insert, and the second fails on the unique
+# constraint, rolling back the write that triggered it. PostgreSQL and
+# SQLite settle this atomically with INSERT .. ON CONFLICT DO UPDATE; other
+# dialects keep the update-then-insert pair.
+from sqlalchemy import and_, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+_DIALECT_INSERTS = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}
+
+
+def upsert(connection, table, key_columns, values, update, where=None):
+    """Inserts `values` or, if a row with the same key columns exists, applies `update` to it.
+
+    `update` maps column names to expressions, which may refer to the
+    existing row's columns (e.g. table.c.count + 1). With `where`, a
+    conflicting row not matching it is left unchanged.
+    """
+    insert = _DIALECT_INSERTS.get(connection.dialect.name)
+    if insert is not None:
+        connection.execute(
+            insert(table).values(values).on_conflict_do_update(
+                index_elements=[table.c[name] for name in key_columns], set_=update, where=where)
+        )
+        return
+
+    key_clause = and_(*(table.c[name] == values[name] for name in key_columns))
+    statement = table.update().where(key_clause).values(update)
+    if where is not None:
+        statement = statement.where(where)
+    if connection.execute(statement).rowcount == 0 and \
+            connection.execute(select(table.c[key_columns[0]]).where(key_clause)).first() is None:
+        connection.execute(table.insert().values(values))
@@ -0,0 +1,307 @@
+# Write-behind persistence for computed fixes
+#
+# With write-behind enabled, /calculate_latlon answers as soon as the fix is
+# solved: the row is queued in memory and a background flusher bulk-inserts
+# queued rows once a batch fills up or the flush interval elapses, so
+# database latency stays off the request path. The response carries a
+# provisional id in place of the database id.
+#
+# When the queue is full, or a flush fails, rows are appended to a local
+# spill file (one JSON object per line) instead of being dropped. The
+# flusher replays the spill file into the database when it is idle.
+# Shutdown drains the queue; anything that cannot be written is spilled.
+#
+# Several processes may share one spill path. A replay first renames the
+# spill file to <spill>.replay.<pid>; the rename is atomic, so each spilled
+# row is claimed by one process. Claims left by processes that have exited
+# are adopted the same way. With `key_column`, rows carry their provisional
+# id in that (unique) column and a replay skips ids already in the table, so
+# a replay interrupted after its commit does not insert rows twice. Lines
+# that do not parse (e.g. torn by a crash mid-write) are moved to
+# <spill>.bad rather than blocking the rest.
+import glob
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+
+from database_models import db
+
+_KEY_LOOKUP_CHUNK = 500
+
+
+def _encode(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class WriteBehindQueue:
+    """Bounded in-process queue of rows bulk-inserted into `model` by a flusher thread.
+
+    With `enabled=False` nothing is queued; callers persist synchronously.
+    `key_column` names a unique column that stores each row's provisional id.
+    """
+
+    def __init__(self, app, model, enabled=False, capacity=10000, batch_size=500,
+                 flush_interval_ms=250, spill_path='write_behind_spill.ndjson', replay_interval_s=5.0,
+                 key_column=None):
+        self.app = app
+        self.model = model
+        self.key_column = key_column
+        self.enabled = enabled
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.flush_interval_ms = flush_interval_ms
+        self.spill_path = spill_path
+        self.replay_interval_s = replay_interval_s
+        self._datetime_columns = {
+            column.name for column in model.__table__.columns
+            if isinstance(column.type, db.DateTime)
+        }
+        self._spill_lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._rows = deque()
+        self._condition = threading.Condition()
+        self._thread = None
+        self._pid = os.getpid()
+        self._stopping = False
+        self._last_replay = 0.0
+        self.enqueued = 0
+        self.flushed = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.spilled = 0
+        self.replayed = 0
+        self.quarantined = 0
+        self.last_flush_ms = None
+        self.max_flush_ms = 0.0
+        self._flush_ms_total = 0.0
+
+    def _ensure_started(self):
+        if self._pid != os.getpid():
+            # Forked after start: rows queued in the parent are the parent's to flush
+            self._reset()
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='write-behind-flusher', daemon=True)
+            self._thread.start()
+
+    def put(self, row):
+        """Queues a dict of column values and returns its provisional id."""
+        provisional_id = uuid.uuid4().hex
+        if self.key_column is not None:
+            row = dict(row, **{self.key_column: provisional_id})
+        with self._condition:
+            if self._stopping or len(self._rows) >= self.capacity:
+                full = True
+            else:
+                full = False
+                self._ensure_started()
+                self._rows.append((provisional_id, row))
+                self.enqueued += 1
+                if len(self._rows) >= self.batch_size:
+                    self._condition.notify()
+        if full:
+            self._spill([(provisional_id, row)])
+        return provisional_id
+
+    def _run(self):
+        interval = self.flush_interval_ms / 1000.0
+        while True:
+            with self._condition:
+                self._condition.wait_for(
+                    lambda: self._stopping or len(self._rows) >= self.batch_size, timeout=interval)
+                batch = [self._rows.popleft() for _ in range(min(self.batch_size, len(self._rows)))]
+                stopping = self._stopping
+            try:
+                if batch:
+                    self._flush(batch)
+                elif stopping:
+                    return
+                elif time.monotonic() - self._last_replay >= self.replay_interval_s:
+                    self._last_replay = time.monotonic()
+                    self.replay_spill()
+            except Exception as e:
+                # Keep the flusher alive; a dead thread would strand every later row in the queue
+                print(f"Write-behind flusher error: {e}")
+                time.sleep(interval)
+
+    def _insert(self, rows):
+        with self.app.app_context():
+            try:
+                for first in range(0, len(rows), self.batch_size):
+                    db.session.execute(db.insert(self.model), rows[first:first + self.batch_size])
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+
+    def _flush(self, batch):
+        started = time.perf_counter()
+        try:
+            self._insert([row for _, row in batch])
+        except Exception as e:
+            print(f"Write-behind flush of {len(batch)} rows failed, spilling: {e}")
+            self.failed_flushes += 1
+            self._spill(batch)
+            return
+        elapsed_ms = (time.perf_counter() - started) * 1000.0
+        with self._condition:
+            self.flushes += 1
+            self.flushed += len(batch)
+            self.last_flush_ms = elapsed_ms
+            self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+            self._flush_ms_total += elapsed_ms
+
+    def _spill(self, batch):
+        lines = ''.join(
+            json.dumps({'provisionalId': provisional_id,
+                        'row': {key: _encode(value) for key, value in row.items()}}) + '\n'
+            for provisional_id, row in batch
+        )
+        with self._spill_lock:
+            with open(self.spill_path, 'a') as f:
+                f.write(lines)
+                f.flush()
+                os.fsync(f.fileno())
+            self.spilled += len(batch)
+
+    def _claim_path(self):
+        return f"{self.spill_path}.replay.{os.getpid()}"
+
+    def _claim_spill(self):
+        """Path of a spill file only this process replays, or None if there is nothing to replay."""
+        claimed = self._claim_path()
+        if os.path.exists(claimed):
+            # Left by a replay of ours that failed
+            return claimed
+        for orphan in glob.glob(glob.escape(self.spill_path) + '.replay*'):
+            pid = orphan.rsplit('.', 1)[1]
+            if pid.isdigit() and _pid_alive(int(pid)):
+                continue
+            try:
+                os.replace(orphan, claimed)
+                return claimed
+            except FileNotFoundError:
+                continue
+        try:
+            os.replace(self.spill_path, claimed)
+        except FileNotFoundError:
+            return None
+        return claimed
+
+    def _read_spill(self, path):
+        """(rows, unparsable lines) of a spill file, keeping the first row per provisional id."""
+        rows, bad, seen = [], [], set()
+        with open(path) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                    provisional_id, row = record['provisionalId'], record['row']
+                    for key in self._datetime_columns.intersection(row):
+                        if row[key] is not None:
+                            row[key] = datetime.fromisoformat(row[key])
+                except (ValueError, KeyError, TypeError):
+                    bad.append(line if line.endswith('\n') else line + '\n')
+                    continue
+                if provisional_id in seen:
+                    continue
+                seen.add(provisional_id)
+                rows.append(row)
+        return rows, bad
+
+    def _stored_keys(self, rows):
+        keys = [row[self.key_column] for row in rows if row.get(self.key_column) is not None]
+        column = self.model.__table__.c[self.key_column]
+        stored = set()
+        with self.app.app_context():
+            for first in range(0, len(keys), _KEY_LOOKUP_CHUNK):
+                stored.update(db.session.execute(
+                    db.select(column).where(column.in_(keys[first:first + _KEY_LOOKUP_CHUNK]))).scalars())
+        return stored
+
+    def replay_spill(self):
+        """Inserts spilled rows in one transaction; returns how many were written."""
+        with self._spill_lock:
+            claimed = self._claim_spill()
+        if claimed is None:
+            return 0
+
+        rows, bad = self._read_spill(claimed)
+        if bad:
+            with self._spill_lock:
+                with open(self.spill_path + '.bad', 'a') as f:
+                    f.writelines(bad)
+                self.quarantined += len(bad)
+            print(f"Write-behind spill replay moved {len(bad)} unreadable lines to {self.spill_path}.bad")
+        try:
+            if rows and self.key_column is not None:
+                stored = self._stored_keys(rows)
+                rows = [row for row in rows if row.get(self.key_column) not in stored]
+            if rows:
+                self._insert(rows)
+        except Exception as e:
+            print(f"Write-behind spill replay failed, will retry: {e}")
+            return 0
+        os.remove(claimed)
+        self.replayed += len(rows)
+        return len(rows)
+
+    def shutdown(self, timeout=10.0):
+        """Stops accepting rows, drains the queue and spills whatever is left."""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+            thread = self._thread
+        if thread is not None and self._pid == os.getpid():
+            thread.join(timeout)
+        with self._condition:
+            leftover = list(self._rows)
+            self._rows.clear()
+        if leftover:
+            self._spill(leftover)
+
+    def metrics(self):
+        if not self.enabled:
+            return {'enabled': False}
+        with self._condition:
+            depth = len(self._rows)
+            flushes = self.flushes
+            metrics = {
+                'enabled': True,
+                'queueDepth': depth,
+                'capacity': self.capacity,
+                'batchSize': self.batch_size,
+                'flushIntervalMs': self.flush_interval_ms,
+                'enqueued': self.enqueued,
+                'flushed': self.flushed,
+                'flushes': flushes,
+                'failedFlushes': self.failed_flushes,
+                'lastFlushMs': self.last_flush_ms,
+                'averageFlushMs': self._flush_ms_total / flushes if flushes else None,
+                'maxFlushMs': self.max_flush_ms,
+            }
+        with self._spill_lock:
+            metrics['spilled'] = self.spilled
+            metrics['replayed'] = self.replayed
+            metrics['quarantined'] = self.quarantined
+            metrics['spillBytes'] = sum(
+                os.path.getsize(path)
+                for path in [self.spill_path] + glob.glob(glob.escape(self.spill_path) + '.replay*')
+                if os.path.exists(path))
+        return metrics